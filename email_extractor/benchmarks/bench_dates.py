@@ -0,0 +1,61 @@
+# benchmarks/bench_dates.py
+"""
+Date normalization: dateutil on every call (the old _safe_parse_date) vs the
+fast-format path, with and without the LRU cache, on the dates that appear in
+test_filter.py, the HTML fixtures and the synthetic corpus.
+
+Run from email_extractor/:
+    python -m benchmarks.bench_dates
+"""
+import time
+
+from dateutil.parser import parse as parse_date
+
+from benchmarks.corpus import generate_corpus
+from extractors import dates
+from services.gmail_service import _parse_message
+
+FIXTURE_DATES = [
+    "December 25, 2025", "January 15, 2026", "January 18, 2026", "March 3, 2026 8:00 PM",
+]
+LABELS = ("Departure Date:", "Check-in:", "Check-out:", "Date:")
+
+
+def _corpus_dates(n=2000):
+    messages, _ = generate_corpus(n, seed=1)
+    found = []
+    for message in messages:
+        for line in _parse_message(message)['body'].splitlines():
+            for label in LABELS:
+                if line.startswith(label) and line[len(label):].strip():
+                    found.append(line[len(label):].strip())
+    return found
+
+
+def _time(fn, values, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in values:
+            fn(value)
+    return (time.perf_counter() - start) / (repeat * len(values)) * 1e6
+
+
+def main(repeat=20):
+    values = FIXTURE_DATES * 50 + _corpus_dates()
+    for value in set(values):
+        assert dates.parse_datetime(value) == parse_date(value), value
+
+    print(f"{len(values)} dates, {len(set(values))} distinct")
+    results = {
+        "dateutil": _time(parse_date, values, repeat),
+        "fast path": _time(dates._fast_parse, values, repeat),
+    }
+    dates._parse_cached.cache_clear()
+    results["fast path + LRU"] = _time(dates.parse_datetime, values, repeat)
+    for name, micros in results.items():
+        print(f"  {name:16} {micros:7.2f} us/date  ({results['dateutil'] / micros:5.1f}x)")
+    print(f"  cache: {dates.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_filter.py
+"""
+Compares the compiled EmailClassifier against the original per-pattern
+re.search loop on large HTML-derived bodies.
+
+Run from email_extractor/:
+    python -m benchmarks.bench_filter
+"""
+import time
+from bs4 import BeautifulSoup
+from filters import email_filter
+from filters.email_filter import (
+    KEYWORD_PATTERNS, contains_required_keywords, is_spam_or_promotion, is_trusted_sender,
+    should_process_email,
+)
+
+def legacy_should_process_email(sender, subject, body):
+    """The pre-compiled-classifier implementation, kept here as the baseline (test_email_filter.py checks they agree)."""
+    combined_text = f"{subject}\n{body}"
+    if not is_trusted_sender(sender):
+        return False, f"Untrusted sender: {sender}"
+    if is_spam_or_promotion(body, subject):
+        return False, "Detected as promotional/spam"
+    for email_type in KEYWORD_PATTERNS.keys():
+        if contains_required_keywords(combined_text, email_type):
+            return True, email_type
+    return False, "No matching booking patterns found"
+
+def _html_body(rows):
+    """A layout-table confirmation email, roughly the size of a real airline one."""
+    cells = "".join(
+        f"<tr><td style='padding:4px;font-family:Arial'>Segment {i}</td>"
+        f"<td>Depart: JFK</td><td>Arrive: LAX</td><td>Seat {i}A</td></tr>"
+        for i in range(rows)
+    )
+    html = (
+        "<html><head><style>td{color:#333}</style></head><body>"
+        "<h1>Your flight confirmation</h1><p>Thank you for choosing United airline.</p>"
+        f"<table>{cells}</table><p>Total: $450.00</p></body></html>"
+    )
+    return BeautifulSoup(html, 'html.parser').get_text(separator='\n')
+
+def _time(fn, emails, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sender, subject, body in emails:
+            fn(sender, subject, body)
+    return time.perf_counter() - start
+
+def main(repeat=20):
+    emails = [
+        ("noreply@united.com", "Your flight confirmation", _html_body(2000)),                  # ~200KB, accepted
+        ("noreply@united.com", "Your trip", _html_body(2000) + "\nunsubscribe"),                # spam at the very end
+        ("reservations@marriott.com", "Hotel reservation", "Check-in: Jan 15\nRoom: suite\n" * 5000),
+        ("someone@example.com", "Hi", _html_body(2000)),                                        # rejected on sender
+    ]
+    email_filter.reload_classifier()
+    legacy = _time(legacy_should_process_email, emails, repeat)
+    compiled = _time(should_process_email, emails, repeat)
+    total_mb = sum(len(b) for _, _, b in emails) * repeat / 1e6
+    print(f"legacy   : {legacy:.3f}s ({total_mb / legacy:.1f} MB/s)")
+    print(f"compiled : {compiled:.3f}s ({total_mb / compiled:.1f} MB/s)")
+    print(f"speedup  : {legacy / compiled:.1f}x")
+
+if __name__ == "__main__":
+    main()
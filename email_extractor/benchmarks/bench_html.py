@@ -0,0 +1,95 @@
+# benchmarks/bench_html.py
+"""
+Throughput and peak RSS of each services/html_text.py backend on the booking
+HTML fixtures, plus a check that every backend yields the same extracted fields.
+
+Run from email_extractor/:
+    python -m benchmarks.bench_html
+Each backend is measured in its own subprocess so peak RSS isn't shared; the
+"idle" row is the same subprocess without any parsing, for reference.
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.html_fixtures import FIXTURES
+from services.html_text import available_backends, html_to_text
+
+FIELDS = {
+    "flight": ["departure_airport", "arrival_airport", "airline", "departure_date", "booking_reference", "price_usd"],
+    "hotel": ["hotel_name", "check_in_date", "check_out_date", "address", "price_usd"],
+    "event": ["venue", "start_time", "price_usd"],
+}
+
+
+def _peak_rss_kb():
+    # ru_maxrss survives exec(), so a child spawned from a big parent would report the parent's peak.
+    # VmHWM belongs to the new address space; fall back to ru_maxrss off Linux.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(backend, repeat):
+    if backend == "idle":
+        return {"backend": backend, "docs_per_sec": 0.0, "mb_per_sec": 0.0,
+                "peak_rss_kb": _peak_rss_kb()}
+    docs = [(email_type, make()) for email_type, make in FIXTURES.items()]
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in docs:
+            html_to_text(html, backend=backend)
+            total_bytes += len(html)
+    elapsed = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "docs_per_sec": repeat * len(docs) / elapsed,
+        "mb_per_sec": total_bytes / elapsed / 1e6,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def _check_extraction(backends):
+    from extractors.booking_extractor import extract_booking_data
+    for email_type, make in FIXTURES.items():
+        html = make()
+        results = {}
+        for backend in backends:
+            data = extract_booking_data(html_to_text(html, backend=backend), email_type)
+            results[backend] = {f: data.get(f) for f in FIELDS[email_type]}
+        reference = results[backends[-1]]
+        for backend, fields in results.items():
+            status = "ok" if fields == reference else f"DIFFERS: {fields} vs {reference}"
+            print(f"  {email_type:6} {backend:10} {status}")
+
+
+def main(repeat=20):
+    backends = available_backends()
+    sizes = {email_type: len(make()) // 1024 for email_type, make in FIXTURES.items()}
+    print(f"fixtures (KB): {sizes}")
+    print("extraction parity (reference = bs4):")
+    _check_extraction(backends)
+    print("throughput:")
+    for backend in ["idle"] + backends:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_html", "--one", backend, str(repeat)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"  {r['backend']:10} {r['docs_per_sec']:8.1f} docs/s {r['mb_per_sec']:7.1f} MB/s  "
+              f"peak RSS {r['peak_rss_kb'] / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--one":
+        print(json.dumps(_measure(sys.argv[2], int(sys.argv[3]))))
+    else:
+        main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_ingest.py
+"""
+Offline ingest throughput (services/offline_ingest.py): the synthetic corpus is
+written out as one mbox (like a Takeout export), then ingested end to end, from
+finding the messages to the NDJSON bookings, with --workers processes.
+
+Run from email_extractor/:
+    python -m benchmarks.bench_ingest --messages 20000 --workers 8
+"""
+import argparse
+import base64
+import mailbox
+import os
+import tempfile
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.corpus import generate_corpus
+from services import offline_ingest
+
+
+def to_mime(message, received=None) -> EmailMessage:
+    """A corpus (Gmail resource) message as the RFC 822 message it would have been."""
+    headers = {h['name']: h['value'] for h in message['payload']['headers']}
+    mime = EmailMessage()
+    mime['From'] = headers['From']
+    mime['Subject'] = headers['Subject']
+    mime['Message-ID'] = f"<{message['id']}@example.com>"
+    mime['Date'] = format_datetime(received or datetime(2025, 12, 1, tzinfo=timezone.utc))
+    for part in message['payload']['parts']:
+        text = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+        subtype = part['mimeType'].split('/')[1]
+        if mime.get_content_type() == 'text/plain' and not mime.get_payload():
+            mime.set_content(text, subtype=subtype)
+        else:
+            mime.add_alternative(text, subtype=subtype)
+    return mime
+
+
+def write_mbox(path, messages):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    box = mailbox.mbox(path, create=True)
+    try:
+        box.lock()
+        for i, message in enumerate(messages):
+            box.add(to_mime(message, start + timedelta(minutes=i)))
+        box.flush()
+    finally:
+        box.unlock()
+        box.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    messages, _ = generate_corpus(args.messages, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        mbox_path = os.path.join(tmp, "All mail Including Spam and Trash.mbox")
+        write_mbox(mbox_path, messages)
+        size = os.path.getsize(mbox_path)
+        with open(os.path.join(tmp, "bookings.ndjson"), "wb") as output:
+            totals = offline_ingest.run([mbox_path], output, args.workers)
+    print(f"{args.messages} messages, {size / 1e6:.1f} MB mbox, {args.workers} workers, {os.cpu_count()} cores")
+    print(f"  {totals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# benchmarks/bench_pipeline.py
+"""
+Throughput, latency and memory of each stage of the pipeline on a synthetic corpus
+(benchmarks/corpus.py), served by the fake Gmail service so it runs fully offline.
+
+Stages, in the order a scan runs them:
+  fetch          messages.get over the fake service (GMAIL_FETCH_MODE), per page
+  parse          headers + get_email_body (base64 decode, HTML -> text), per email
+  filter         should_process_email, per email
+  extract_regex  the extractors without any NLP fallback, per accepted email
+  extract_nlp    extract_booking_batch (regex, then nlp.pipe where needed), per NLP_BATCH_SIZE
+                 batch; skipped when the spaCy model isn't available
+  validate       bulk validation of the page's extractions (BookingListAdapter), per page
+  pipeline       main._process_emails (filter -> extract -> validate) as the server runs it, per page
+
+Run from email_extractor/:
+    python -m benchmarks.bench_pipeline --messages 10000
+    python -m benchmarks.bench_pipeline --messages 100000 --mix flight=1,spam=3 --profile cprofile
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<earlier run>.json
+
+Results go to benchmarks/results/ as JSON. Latencies are per call of the stage
+(see "batch" for how many emails one call handles). The corpus is processed a page
+at a time, like /scan/stream, but the corpus itself is generated up front and held in
+memory (messages share a small pool of bodies, see benchmarks/corpus.py), so peak RSS
+still grows with --messages. Peak RSS is not reported where the resource module is
+missing (Windows).
+"""
+import argparse
+import cProfile
+import io
+import json
+import logging
+import os
+import platform
+import pstats
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is left out
+    resource = None
+
+from benchmarks.corpus import MIX, generate_corpus, parse_mix
+from services.fake_gmail_service import FakeGmailService
+from services.gmail_service import GMAIL_FETCH_MODE, _fetch_raw, _parse_message, list_message_ids
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+STAGES = ["fetch", "parse", "filter", "extract_regex", "extract_nlp", "validate", "pipeline"]
+
+
+def _peak_rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class _Stage:
+    def __init__(self, name, batch=1, profile=False):
+        self.name = name
+        self.batch = batch
+        self.emails = 0
+        self.seconds = 0.0
+        self.latencies = []
+        self.profiler = cProfile.Profile() if profile else None
+
+    def run(self, fn, *args, emails=1):
+        """Time one call of the stage that handles `emails` emails."""
+        if self.profiler:
+            self.profiler.enable()
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if self.profiler:
+            self.profiler.disable()
+        self.seconds += elapsed
+        self.emails += emails
+        self.latencies.append(elapsed)
+        return result
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            "emails": self.emails,
+            "calls": len(latencies),
+            "batch": self.batch,
+            "seconds": round(self.seconds, 4),
+            "emails_per_sec": round(self.emails / self.seconds, 1) if self.seconds else None,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 4),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 4),
+        }
+
+
+def _nlp_available():
+    from extractors.booking_extractor import get_nlp_model
+    return get_nlp_model() is not None
+
+
+def run(messages, page_size=500, profile=False):
+    # Imported here so corpus generation is measured without the app and spaCy loaded
+    import main
+    from extractors.booking_extractor import NLP_BATCH_SIZE, _extract_with_doc, extract_booking_batch
+    from filters.email_filter import should_process_email
+    from formats.schemas import BookingListAdapter
+
+    use_nlp = _nlp_available()
+    stages = {
+        "fetch": _Stage("fetch", page_size, profile),
+        "parse": _Stage("parse", 1, profile),
+        "filter": _Stage("filter", 1, profile),
+        "extract_regex": _Stage("extract_regex", 1, profile),
+        "extract_nlp": _Stage("extract_nlp", NLP_BATCH_SIZE, profile),
+        "validate": _Stage("validate", page_size, profile),
+        "pipeline": _Stage("pipeline", page_size, profile),
+    }
+
+    service = FakeGmailService(messages)
+    msg_ids = list_message_ids(service, max_results=len(messages))
+    accepted_total = 0
+    for start in range(0, len(msg_ids), page_size):
+        page = msg_ids[start:start + page_size]
+        raw = stages["fetch"].run(_fetch_raw, service, page, emails=len(page))
+
+        emails = [stages["parse"].run(_parse_message, raw[msg_id]) for msg_id in page if msg_id in raw]
+        emails = [email for email in emails if email]
+
+        accepted = []
+        for email in emails:
+            ok, email_type = stages["filter"].run(should_process_email, email['from'], email['subject'], email['body'])
+            if ok:
+                accepted.append((email, email_type))
+        accepted_total += len(accepted)
+
+        extracted = []
+        for email, email_type in accepted:
+            try:
+                data = stages["extract_regex"].run(_extract_with_doc, email['body'], email_type, None, email['from'])
+            except Exception:
+                continue
+            extracted.append((email, email_type, data))
+
+        if use_nlp:
+            items = [(email['body'], email_type, email['from']) for email, email_type in accepted]
+            for i in range(0, len(items), NLP_BATCH_SIZE):
+                chunk = items[i:i + NLP_BATCH_SIZE]
+                stages["extract_nlp"].run(extract_booking_batch, chunk, emails=len(chunk))
+
+        payloads = [{**data, 'id': email['id'], 'source_email_id': email['id'], 'title': email['subject']}
+                    for email, _, data in extracted]
+        if payloads:
+            stages["validate"].run(BookingListAdapter.validate_python, payloads, emails=len(payloads))
+
+        stages["pipeline"].run(main._process_emails, emails, emails=len(emails))
+
+    return stages, {"accepted": accepted_total, "nlp_available": use_nlp}
+
+
+def _print_profiles(stages, out_dir, stamp):
+    for stage in stages.values():
+        if not stage.profiler or not stage.emails:
+            continue
+        path = os.path.join(out_dir, f"{stamp}-{stage.name}.prof")
+        stage.profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(stage.profiler, stream=text).sort_stats("cumulative").print_stats(12)
+        print(f"\n--- {stage.name} (cProfile, {path}) ---")
+        print("\n".join(text.getvalue().strip().splitlines()[-14:]))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('git_commit')}, {baseline['meta']['messages']} messages):")
+    for name, stage in results["stages"].items():
+        before = baseline["stages"].get(name, {}).get("emails_per_sec")
+        now = stage["emails_per_sec"]
+        if before and now:
+            print(f"  {name:14} {before:12.1f} -> {now:12.1f} emails/s  ({now / before:5.2f}x)")
+
+
+def _print_table(results):
+    print(f"\n{'stage':14} {'emails':>8} {'emails/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'batch':>6}")
+    for name, s in results["stages"].items():
+        if not s["emails"]:
+            print(f"{name:14} {'skipped':>8}")
+            continue
+        print(f"{name:14} {s['emails']:8d} {s['emails_per_sec']:12.1f} {s['p50_ms']:10.3f} {s['p99_ms']:10.3f} {s['batch']:6d}")
+    meta = results["meta"]
+    rss = ""
+    if meta["peak_rss_kb"] is not None:
+        rss = f"peak RSS {meta['peak_rss_kb'] / 1024:.1f} MB (corpus alone {meta['corpus_rss_kb'] / 1024:.1f} MB), "
+    print(f"\n{rss}{meta['accepted']} of {meta['messages']} accepted by the filter")
+
+
+def _py_spy(argv, out_dir, stamp):
+    """Re-run this benchmark under py-spy and write a flamegraph."""
+    if not shutil.which("py-spy"):
+        sys.exit("py-spy not found on PATH (pip install py-spy)")
+    svg = os.path.join(out_dir, f"{stamp}-flame.svg")
+    args = [a for a in argv if a != "--profile" and a != "py-spy"]
+    subprocess.run(["py-spy", "record", "-o", svg, "--", sys.executable, "-m", "benchmarks.bench_pipeline", *args],
+                   check=True)
+    print(f"flamegraph: {svg}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=5000, help="corpus size (up to 100k and beyond)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help=f"kind=weight,... (default {','.join(f'{k}={v}' for k, v in MIX.items())})")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--profile", choices=["cprofile", "py-spy"], default=None)
+    parser.add_argument("--output", default=None, help="results JSON path (default: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--log-level", default="WARNING", help="the extractor logs every email at INFO")
+    args = parser.parse_args(argv)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    if args.profile == "py-spy":
+        return _py_spy(sys.argv[1:] if argv is None else argv, RESULTS_DIR, stamp)
+
+    start = time.perf_counter()
+    messages, _ = generate_corpus(args.messages, seed=args.seed, mix=args.mix)
+    corpus_seconds = time.perf_counter() - start
+    corpus_rss_kb = _peak_rss_kb()
+
+    import main as app_main  # noqa: F401  (configures logging at import; override it below)
+    logging.getLogger().setLevel(args.log_level)
+    for name in ("TrippExtractor", "BookingExtractor"):
+        logging.getLogger(name).setLevel(args.log_level)
+
+    stages, counts = run(messages, page_size=args.page_size, profile=args.profile == "cprofile")
+
+    from extractors.booking_extractor import NLP_MODE, get_nlp_stats
+    from services.html_text import HTML_TEXT_BACKEND, available_backends
+    results = {
+        "meta": {
+            "timestamp": stamp,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "messages": args.messages,
+            "seed": args.seed,
+            "mix": args.mix or MIX,
+            "page_size": args.page_size,
+            "fetch_mode": GMAIL_FETCH_MODE,
+            "html_backend": HTML_TEXT_BACKEND if HTML_TEXT_BACKEND != "auto" else available_backends()[0],
+            "nlp_mode": NLP_MODE,
+            "nlp_available": counts["nlp_available"],
+            "nlp_stats": get_nlp_stats(),
+            "accepted": counts["accepted"],
+            "corpus_seconds": round(corpus_seconds, 3),
+            "corpus_rss_kb": corpus_rss_kb,
+            "peak_rss_kb": _peak_rss_kb(),
+        },
+        "stages": {name: stage.summary() for name, stage in stages.items()},
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{args.messages}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    _print_table(results)
+    if args.profile == "cprofile":
+        _print_profiles(stages, RESULTS_DIR, stamp)
+    if args.compare:
+        _compare(results, args.compare)
+    print(f"\nresults: {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_rules.py
+"""
+Cost of the compiled rule scan (extractors/rules.py) as the rule table grows,
+against running each rule's own re.search over the body (the old approach).
+
+Run from email_extractor/:
+    python -m benchmarks.bench_rules
+"""
+import json
+import random
+import string
+import time
+
+from benchmarks.html_fixtures import FIXTURES
+from extractors.booking_extractor import EXTRACTION_RULES_PATH
+from extractors.rules import ExtractionRules
+from services.html_text import html_to_text
+
+
+def _with_extra_rules(config, count, seed=0):
+    """Adds `count` labeled rules for made-up fields, the way new airlines/chains would be added."""
+    rng = random.Random(seed)
+    config = json.loads(json.dumps(config))
+    for i in range(count):
+        label = "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(4, 12))) + " Number:"
+        config["types"]["flight"].append({"field": f"extra_{i}", "labels": [label], "value": "(.*?)\\n"})
+    return config
+
+
+def _time(fn, bodies, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            fn(body)
+    return (time.perf_counter() - start) / (repeat * len(bodies))
+
+
+def main(repeat=5):
+    with open(EXTRACTION_RULES_PATH) as f:
+        base = json.load(f)
+    bodies = [html_to_text(make()) for make in FIXTURES.values()]
+    print(f"bodies: {[len(b) // 1024 for b in bodies]} KB of text")
+    print(f"{'rules':>6} {'compiled scan':>15} {'re.search per rule':>20}")
+    for extra in (0, 50, 200, 500):
+        rules = ExtractionRules(_with_extra_rules(base, extra), transforms={"date": str.strip})
+        ruleset = rules.ruleset("flight")
+        ruleset.extract(bodies[0])  # compile the scanners
+        compiled = _time(ruleset.extract, bodies, repeat)
+        per_rule = _time(lambda body: [r.regex.search(body) for r in ruleset.rules], bodies, repeat)
+        print(f"{len(ruleset.rules):6d} {compiled * 1000:12.2f} ms {per_rule * 1000:17.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
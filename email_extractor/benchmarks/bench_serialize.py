@@ -0,0 +1,85 @@
+# benchmarks/bench_serialize.py
+"""
+Validating and serializing a response of N bookings, before and after the lean path:
+
+  before  one model constructor call per email, then FastAPI's response_model handling
+          (the list validated again against the plain union, jsonable_encoder, json.dumps)
+  after   one BookingListAdapter.validate_python call for the batch (discriminated on "type"),
+          then BookingListAdapter.dump_json straight to bytes
+
+Run from email_extractor/:
+    python -m benchmarks.bench_serialize --bookings 1000
+"""
+import argparse
+import json
+import random
+import time
+from typing import List, Union
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from formats.schemas import (
+    BookingListAdapter, EventBooking, FlightBooking, HotelBooking, UnknownBooking
+)
+
+MODELS = {'flight': FlightBooking, 'hotel': HotelBooking, 'event': EventBooking}
+# What response_model=List[BookingUnion] validated against before the discriminator
+_PLAIN_LIST = TypeAdapter(List[Union[FlightBooking, HotelBooking, EventBooking, UnknownBooking]])
+
+
+def _payloads(n, seed=0):
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(n):
+        kind = rng.choice(list(MODELS))
+        payload = {'type': kind, 'id': f'msg{i}', 'source_email_id': f'msg{i}', 'title': f'Your {kind} booking',
+                   'booking_reference': f'ABC{i:05d}', 'price_usd': round(rng.uniform(50, 2000), 2)}
+        if kind == 'flight':
+            payload.update(airline='Delta', departure_airport='JFK', arrival_airport='LAX',
+                           departure_date='2025-12-25T14:30:00')
+        elif kind == 'hotel':
+            payload.update(hotel_name='Marriott Downtown', check_in_date='2026-01-15T00:00:00',
+                           check_out_date='2026-01-18T00:00:00', address='1 Main St', nights=3)
+        else:
+            payload.update(venue='Madison Square Garden', start_time='2026-03-03T20:00:00')
+        payloads.append(payload)
+    return payloads
+
+
+def _before(payloads):
+    bookings = [MODELS[p['type']](**p) for p in payloads]
+    return json.dumps(jsonable_encoder(_PLAIN_LIST.validate_python(bookings))).encode('utf-8')
+
+
+def _after(payloads):
+    return BookingListAdapter.dump_json(BookingListAdapter.validate_python(payloads))
+
+
+def _time(fn, payloads, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        batch = [dict(p) for p in payloads]
+        start = time.perf_counter()
+        fn(batch)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bookings", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    payloads = _payloads(args.bookings)
+    assert json.loads(_before([dict(p) for p in payloads])) == json.loads(_after([dict(p) for p in payloads]))
+    before = _time(_before, payloads, args.repeat)
+    after = _time(_after, payloads, args.repeat)
+    print(f"{args.bookings} bookings, best of {args.repeat}")
+    print(f"  before  {before * 1000:8.2f} ms  {before / args.bookings * 1e6:6.2f} us/booking")
+    print(f"  after   {after * 1000:8.2f} ms  {after / args.bookings * 1e6:6.2f} us/booking  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_windowing.py
+"""
+Body windowing (extractors/windowing.py): accuracy and speed.
+
+For every email of the synthetic corpus, plus the HTML fixtures and variants of them
+buried in a marketing footer or quoted in a reply, compares the regex extraction on
+the whole body with the one on its window, for every email the filter accepts. Any
+difference is printed; the run fails (exit 1) if there is one.
+
+Run from email_extractor/:
+    python -m benchmarks.bench_windowing --messages 2000
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.html_fixtures import FIXTURES
+from extractors.booking_extractor import _extract_with_doc
+from extractors.windowing import get_windower
+from filters.email_filter import should_process_email
+from services.gmail_service import _parse_message
+from services.html_text import html_to_text
+
+FOOTER = ("You are receiving this email because you booked with us. Prices and fares are subject to change. "
+          "Unsubscribe | Manage preferences | Privacy policy\n") + "Lorem ipsum dolor sit amet, consectetur.\n" * 120
+
+
+def _variants(email):
+    """The email as sent, with a long footer, and quoted in a reply."""
+    yield email
+    yield {**email, 'body': email['body'] + "\n" + FOOTER}
+    quoted = "".join(f"> {line}\n" for line in email['body'].splitlines())
+    reply = ("Thanks, see you there!\n" + "Sent from my phone\n" * 3
+             + "\nOn Mon, Dec 1, 2025 at 9:00 AM Bookings <" + email['from'] + "> wrote:\n" + quoted + FOOTER)
+    yield {**email, 'body': reply}
+
+
+def fixture_emails(messages=2000, seed=0):
+    corpus, _ = generate_corpus(messages, seed=seed, variants=messages)
+    emails = [email for email in map(_parse_message, corpus) if email]
+    for kind, make in FIXTURES.items():
+        emails.append({'id': f'fixture-{kind}', 'from': 'bookings@united.com', 'subject': f'Your {kind} confirmation',
+                       'body': html_to_text(make())})
+    return [variant for email in emails for variant in _variants(email)]
+
+
+def _extract(email, email_type, body):
+    return _extract_with_doc(body, email_type, None, email['from'])
+
+
+def _normalized(fields):
+    return {k: " ".join(str(v).split()) for k, v in fields.items()}  # the window collapses whitespace
+
+
+def compare(emails, windower=None):
+    """Over accepted emails: (mismatches, chars in, chars kept, seconds whole, seconds windowed, seconds windowing)."""
+    windower = windower or get_windower()
+    mismatches = []
+    chars_in = chars_kept = 0
+    t_whole = t_window = t_windowing = 0.0
+    for email in emails:
+        ok, email_type = should_process_email(email['from'], email['subject'], email['body'])
+        if not ok:
+            continue
+        start = time.perf_counter()
+        whole = _extract(email, email_type, email['body'])
+        t_whole += time.perf_counter() - start
+
+        start = time.perf_counter()
+        window = windower.window(email['body'])
+        t_windowing += time.perf_counter() - start
+        windowed = _extract(email, email_type, window.text)
+        t_window += time.perf_counter() - start
+
+        chars_in += len(email['body'])
+        chars_kept += len(window.text)
+        if _normalized(whole) != _normalized(windowed):
+            mismatches.append((email['id'], whole, windowed))
+    return mismatches, chars_in, chars_kept, t_whole, t_window, t_windowing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    emails = fixture_emails(args.messages, args.seed)
+    mismatches, chars_in, chars_kept, t_whole, t_window, t_windowing = compare(emails)
+    print(f"{len(emails)} emails, accepted ones: {chars_in / 1e6:.1f} MB of body text, {chars_kept / chars_in:.1%} kept")
+    print(f"  regex extraction, whole bodies       {t_whole:8.3f} s")
+    print(f"  windowing + the same on windows      {t_window:8.3f} s  ({t_whole / t_window:.1f}x)"
+          f"  of which windowing {t_windowing:.3f} s")
+    print(f"  mismatches: {len(mismatches)}")
+    for email_id, whole, windowed in mismatches[:20]:
+        print(f"    {email_id}\n      whole:  {whole}\n      window: {windowed}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_workers.py
+"""
+Extraction throughput against the number of worker processes: one job of --messages
+emails split into JOB_CHUNK_SIZE chunks over a process pool of 1, 2, 4 ... workers,
+the way /jobs/extract runs it (services/extraction_jobs.py). With the spaCy model
+available each worker holds its own copy, loaded before timing starts.
+
+Run from email_extractor/:
+    python -m benchmarks.bench_workers --messages 5000 --workers 1,2,4,8
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.corpus import generate_corpus
+from services.extraction_jobs import JOB_CHUNK_SIZE
+from services.gmail_service import _parse_message
+
+
+def _warm_up():
+    logging.disable(logging.INFO)
+    from extractors.booking_extractor import warm_up
+    warm_up()
+
+
+def _noop(_):
+    return None
+
+
+def _process(chunk):
+    import main
+    return len(main._process_emails(chunk))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)) or "1")
+    parser.add_argument("--chunk-size", type=int, default=JOB_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    messages, _ = generate_corpus(args.messages, seed=0)
+    emails = [email for email in map(_parse_message, messages) if email]
+    chunks = [emails[i:i + args.chunk_size] for i in range(0, len(emails), args.chunk_size)]
+    print(f"{len(emails)} emails in {len(chunks)} chunks of {args.chunk_size}, {os.cpu_count()} cores")
+
+    baseline = None
+    for workers in (int(n) for n in args.workers.split(",")):
+        with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up) as pool:
+            list(pool.map(_noop, range(workers)))  # every worker started and warmed before timing
+            start = time.perf_counter()
+            assert sum(pool.map(_process, chunks)) == len(emails)
+            elapsed = time.perf_counter() - start
+        rate = len(emails) / elapsed
+        baseline = baseline or rate
+        print(f"  {workers:3d} workers  {rate:10.1f} emails/s  ({rate / baseline:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
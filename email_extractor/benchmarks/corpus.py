@@ -0,0 +1,135 @@
+# benchmarks/corpus.py
+"""
+Deterministic synthetic Gmail corpus for the pipeline benchmarks.
+
+Kinds (default mix in MIX):
+- "flight" / "hotel" / "event": short plain-text confirmations from trusted senders
+- "spam":  trusted-sender promotions and untrusted senders, rejected by the filter
+- "html":  HTML-only confirmations built from benchmarks/html_fixtures.py (100-300KB each)
+
+A small pool of distinct bodies is rendered per kind and shared between messages
+(only the id differs), so a 100k-message corpus fits comfortably in memory.
+The same (n, seed, mix) always gives the same corpus.
+"""
+import random
+
+from benchmarks.html_fixtures import airline_html, event_html, hotel_html
+from services.fake_gmail_service import make_message
+
+MIX = {"flight": 0.25, "hotel": 0.2, "event": 0.15, "spam": 0.3, "html": 0.1}
+
+_AIRLINES = [("United Airlines", "united.com", "UA"), ("Delta", "delta.com", "DL"),
+             ("American Airlines", "americanairlines.com", "AA")]
+_AIRPORTS = ["JFK", "LAX", "SFO", "ORD", "ATL", "SEA", "BOS", "MIA", "DEN", "CDG", "LHR"]
+_HOTELS = [("Marriott", "marriott.com"), ("Hilton", "hilton.com"), ("Booking.com", "booking.com")]
+_CITIES = ["Chicago", "New York", "Paris", "London", "Austin", "Denver"]
+_VENUES = ["Madison Square Garden", "Red Rocks Amphitheatre", "Wembley Stadium", "The Fillmore"]
+_MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+           "September", "October", "November", "December"]
+
+
+def _date(rng):
+    return f"{rng.choice(_MONTHS)} {rng.randint(1, 28)}, {rng.choice([2025, 2026])}"
+
+
+def _ref(rng):
+    return "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ23456789") for _ in range(6))
+
+
+def _flight(rng):
+    airline, domain, code = rng.choice(_AIRLINES)
+    dep, arr = rng.sample(_AIRPORTS, 2)
+    body = (
+        f"Thank you for flying with {airline}.\n"
+        f"Confirmation: Flight {code} {rng.randint(100, 9999)}\n"
+        f"Departure Date: {_date(rng)}\n"
+        f"Depart: {dep} at {rng.randint(1, 12)}:{rng.choice(['00', '15', '30', '45'])} PM\n"
+        f"Arrive: {arr}\n"
+        f"Passenger: Jane Doe\n"
+        f"Total: ${rng.randint(90, 2400)}.{rng.randint(0, 99):02d} USD\n"
+        f"Booking Reference: {_ref(rng)}\n"
+    )
+    return f"{airline} <reservations@{domain}>", "Your flight confirmation", body, "text/plain"
+
+
+def _hotel(rng):
+    hotel, domain = rng.choice(_HOTELS)
+    city = rng.choice(_CITIES)
+    nights = rng.randint(1, 9)
+    body = (
+        f"Hotel: {hotel} {city} Downtown\n"
+        f"Check-in: {_date(rng)}\n"
+        f"Check-out: {_date(rng)}\n"
+        f"{nights} nights, room: king suite\n"
+        f"Address: {rng.randint(1, 999)} Main St, {city}\n"
+        f"Confirmation Code: {_ref(rng)}\n"
+        f"Total: ${rng.randint(120, 3000)}.00 USD\n"
+    )
+    return f"{hotel} <noreply@{domain}>", "Your hotel reservation confirmation", body, "text/plain"
+
+
+def _event(rng):
+    venue = rng.choice(_VENUES)
+    body = (
+        f"Your tickets for the concert are ready.\n"
+        f"Venue: {venue}\n"
+        f"Date: {_date(rng)} 8:00 PM\n"
+        f"Ticket: Section {rng.randint(100, 330)}, Row {rng.choice('ABCDEFG')}\n"
+        f"Total: ${rng.randint(20, 400)}.00\n"
+    )
+    sender = rng.choice(["Ticketmaster <tickets@ticketmaster.com>", "Eventbrite <orders@eventbrite.com>"])
+    return sender, "Your event tickets", body, "text/plain"
+
+
+def _spam(rng):
+    if rng.random() < 0.5:
+        airline, domain, _ = rng.choice(_AIRLINES)
+        body = (f"Exclusive deal: fly to {rng.choice(_CITIES)} from ${rng.randint(49, 199)}!\n"
+                f"Book your flight today.\n" + "Fares are subject to change.\n" * rng.randint(5, 50)
+                + "Click here to unsubscribe.\n")
+        return f"{airline} <deals@{domain}>", "[PROMO] Flight deals for you", body, "text/plain"
+    body = "Hi,\nAre we still on for Thursday?\n" + "Lorem ipsum dolor sit amet.\n" * rng.randint(5, 200)
+    return "Friend <friend@example.com>", "Flight plans", body, "text/plain"
+
+
+def _html(rng):
+    kind, make, sender = rng.choice([
+        ("flight", airline_html, "United Airlines <noreply@united.com>"),
+        ("hotel", hotel_html, "Marriott <reservations@marriott.com>"),
+        ("event", event_html, "Ticketmaster <tickets@ticketmaster.com>"),
+    ])
+    subject = {"flight": "Your flight confirmation", "hotel": "Your hotel reservation confirmation",
+               "event": "Your event tickets"}[kind]
+    return sender, subject, make(footer_paragraphs=rng.randint(100, 300)), "text/html"
+
+
+GENERATORS = {"flight": _flight, "hotel": _hotel, "event": _event, "spam": _spam, "html": _html}
+
+
+def generate_corpus(n, seed=0, mix=None, variants=50):
+    """Returns (messages, kinds): n Gmail message resources and the kind each was generated as."""
+    mix = mix or MIX
+    rng = random.Random(seed)
+    templates = {
+        kind: [make_message("", *GENERATORS[kind](rng)) for _ in range(variants)]
+        for kind in mix
+    }
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=n)
+
+    messages = []
+    for i, kind in enumerate(kinds):
+        template = rng.choice(templates[kind])
+        msg_id = f"{kind}-{i:06d}"
+        messages.append({**template, 'id': msg_id, 'threadId': msg_id})
+    return messages, kinds
+
+
+def parse_mix(spec):
+    """"flight=0.3,spam=0.7" -> {"flight": 0.3, "spam": 0.7}"""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in GENERATORS:
+            raise ValueError(f"Unknown corpus kind: {kind} (choose from {', '.join(GENERATORS)})")
+        mix[kind] = float(weight or 1)
+    return mix
@@ -0,0 +1,93 @@
+# benchmarks/html_fixtures.py
+"""
+Synthetic but realistic booking confirmation HTML: layout tables, inline CSS,
+tracking pixels, a hidden preheader, <style>/<script> blocks and a long
+marketing/legal footer. Booking details are laid out as "Label:" / value cells,
+the way airline and hotel templates do it.
+"""
+
+_STYLE = "<style>" + "".join(
+    f".c{i}{{font-family:Arial,Helvetica,sans-serif;color:#{i:06x};padding:{i % 9}px;mso-line-height-rule:exactly}}"
+    for i in range(400)
+) + "</style>"
+
+_SCRIPT = "<script type='application/ld+json'>" + '{"@context":"http://schema.org","@type":"FlightReservation"}' * 20 + "</script>"
+
+_PREHEADER = "<div style='display:none;max-height:0;overflow:hidden'>Your trip is confirmed - unsubscribe anytime</div>"
+
+
+def _pixel(i):
+    return f"<img src='https://t.example.com/open/{i}.gif' width='1' height='1' style='display:block' alt=''>"
+
+
+def _row(label, value, i):
+    return (
+        f"<tr><td class='c{i % 400}' style='padding:4px 8px;border-bottom:1px solid #eee' width='40%'>"
+        f"<span style='font-weight:bold'>{label}</span></td>"
+        f"<td class='c{(i + 1) % 400}' style='padding:4px 8px'>{value}</td></tr>"
+    )
+
+
+def _footer(paragraphs):
+    legal = (
+        "This email was sent to you because you made a reservation. Fares are subject to change. "
+        "Baggage fees may apply. Please review the conditions of carriage and privacy policy. "
+    )
+    return "".join(
+        f"<table width='100%'><tr><td style='font-size:10px;color:#999' class='c{i % 400}'>"
+        f"<p>{legal * 3}</p>{_pixel(i)}</td></tr></table>"
+        for i in range(paragraphs)
+    )
+
+
+def _wrap(title, rows, footer_paragraphs):
+    body_rows = "".join(_row(label, value, i) for i, (label, value) in enumerate(rows))
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>{_STYLE}{_SCRIPT}</head>"
+        f"<body style='margin:0'>{_PREHEADER}"
+        f"<table width='100%' cellpadding='0' cellspacing='0'><tr><td align='center'>"
+        f"<table width='600'><tr><td><h1 style='font-size:22px'>{title}</h1></td></tr>"
+        f"<tr><td><table width='100%'>{body_rows}</table></td></tr></table>"
+        f"</td></tr></table>{_footer(footer_paragraphs)}</body></html>"
+    )
+
+
+def airline_html(footer_paragraphs=300):
+    return _wrap("Your flight confirmation", [
+        ("Airline:", "United Airlines"),
+        ("Flight:", "UA 1234"),
+        ("Depart:", "JFK Terminal 7 at 2:30 PM"),
+        ("Arrive:", "LAX Terminal 2 at 6:45 PM"),
+        ("Departure Date:", "December 25, 2025"),
+        ("Booking Reference:", "UA45B7N"),
+        ("Total:", "$450.00 USD"),
+    ], footer_paragraphs)
+
+
+def hotel_html(footer_paragraphs=300):
+    return _wrap("Your hotel reservation", [
+        ("Hotel:", "Marriott Downtown Chicago"),
+        ("Check-in:", "January 15, 2026"),
+        ("Check-out:", "January 18, 2026"),
+        ("Room:", "King suite, 3 nights"),
+        ("Address:", "350 W Mart Center Dr, Chicago, IL"),
+        ("Confirmation Code:", "MC78213"),
+        ("Total:", "$687.50 USD"),
+    ], footer_paragraphs)
+
+
+def event_html(footer_paragraphs=150):
+    return _wrap("Your tickets for the show", [
+        ("Event:", "Concert - The Band"),
+        ("Venue:", "Madison Square Garden"),
+        ("Date:", "March 3, 2026 8:00 PM"),
+        ("Ticket:", "Section 101, Row B"),
+        ("Total:", "$120.00"),
+    ], footer_paragraphs)
+
+
+FIXTURES = {
+    "flight": airline_html,
+    "hotel": hotel_html,
+    "event": event_html,
+}
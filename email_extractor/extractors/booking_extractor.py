@@ -1,96 +1,233 @@
-import re
+import os
+import threading
 import spacy
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Union
 import json 
-from dateutil.parser import parse as parse_date
+from datetime import datetime
 import logging
+import time
+from services.metrics import Counter, Histogram
+from extractors.rules import ExtractionRules
+from extractors.dates import parse_datetime
 
 # --- SETUP LOGGING ---
 logger = logging.getLogger("BookingExtractor")
 
-# --- GLOBAL VAR FOR LAZY LOADING ---
+REGEX_EXTRACT_SECONDS = Histogram(
+    "regex_extract_duration_seconds", "Regex-only extraction pass, per email", ["email_type"]
+)
+NLP_INFERENCE_SECONDS = Histogram(
+    "nlp_inference_duration_seconds", "nlp.pipe over the emails a regex missed, plus their re-extraction, per batch"
+)
+# How often regex alone was enough ("nlp_avoided") vs. a parse was needed ("nlp_used"), per type.
+# Counted in the CPU workers, merged into the server's /metrics with every result (services/metrics.py).
+NLP_OUTCOMES = Counter(
+    "nlp_outcomes", "Extractions done by regex alone (nlp_avoided) or with a spaCy parse (nlp_used)",
+    ["email_type", "outcome"]
+)
+
+# --- FIELD RULES ---
+# Labeled fields (Depart:, Check-in:, Venue: ...) per type and sender domain, see extractors/rules.py
+EXTRACTION_RULES_PATH = os.getenv(
+    "EXTRACTION_RULES_PATH", os.path.join(os.path.dirname(__file__), "extraction_rules.json")
+)
+_rules = ExtractionRules.from_file(
+    EXTRACTION_RULES_PATH, transforms={"date": lambda value: _safe_parse_date(value.strip())}
+)
+
+# Bump whenever filter/extraction output changes, so cached results (services/extraction_cache.py) are redone.
+# The rules file's hash is part of it: editing the rules redoes cached extractions too.
+EXTRACTOR_VERSION = f"4-{_rules.version}"
+
+def get_rules() -> ExtractionRules:
+    """The compiled rules of EXTRACTION_RULES_PATH that every extraction runs."""
+    return _rules
+
+# --- MODEL LOADING ---
+# "eager":    loaded and warmed at startup (main.lifespan), /ready waits for it
+# "lazy":     loaded by the first email that needs it
+# "disabled": never loaded, regex-only extraction
+NLP_MODE = os.getenv("NLP_MODE", "eager")
+
 _nlp_model = None
+_nlp_state = "disabled" if NLP_MODE == "disabled" else "not_loaded"  # -> loading -> ready | failed
+_nlp_error = None
+_nlp_lock = threading.Lock()
+
+# We only read doc.ents, so everything NER doesn't depend on is switched off.
+NLP_DISABLED_PIPES = ["parser", "tagger", "attribute_ruler", "lemmatizer"]
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", "32"))
+NLP_N_PROCESS = int(os.getenv("NLP_N_PROCESS", "1"))  # keep at 1 inside the CPU_POOL_SIZE process pool
+# Fallback NER only looks at the start of the body (its booking window, see extractors/windowing.py).
+NLP_WINDOW_CHARS = int(os.getenv("NLP_WINDOW_CHARS", "5000"))
+
+class _NeedsNlp(Exception):
+    """Raised by _DeferredDoc when an extractor falls back to doc.ents."""
+
+class _DeferredDoc:
+    """
+    Stands in for a spaCy Doc during the regex-only pass. It is truthy (the model
+    is available), but touching .ents means a fallback field is needed, so we
+    abort the pass and come back with a real Doc.
+    """
+    def __bool__(self):
+        return True
+
+    @property
+    def ents(self):
+        raise _NeedsNlp()
+
+_DEFERRED_DOC = _DeferredDoc()
+
+def get_nlp_stats() -> Dict[str, Dict[str, int]]:
+    """Returns {email_type: {"nlp_avoided": n, "nlp_used": n}} from NLP_OUTCOMES."""
+    stats = {}
+    for (email_type, outcome), count in NLP_OUTCOMES.values().items():
+        stats.setdefault(email_type, {"nlp_avoided": 0, "nlp_used": 0})[outcome] = int(count)
+    return stats
 
 def get_nlp_model():
-    """Lazy loads the SpaCy model only when needed."""
-    global _nlp_model
-    if _nlp_model is None:
-        try:
-            logger.info("⏳ Lazy-Loading AI Model (en_core_web_sm)...")
-            _nlp_model = spacy.load("en_core_web_sm")
-            logger.info("✅ AI Model Loaded.")
-        except OSError:
-            logger.error("❌ Spacy model not found. Run: python -m spacy download en_core_web_sm")
-            _nlp_model = False # Set to False so we don't try loading again
+    """Loads the SpaCy model on first use (unless NLP_MODE is "disabled")."""
+    global _nlp_model, _nlp_state, _nlp_error
+    if _nlp_model is None and NLP_MODE != "disabled":
+        with _nlp_lock:
+            if _nlp_model is None:
+                _nlp_state = "loading"
+                try:
+                    logger.info("⏳ Loading AI Model (en_core_web_sm)...")
+                    _nlp_model = spacy.load("en_core_web_sm", disable=NLP_DISABLED_PIPES)
+                    _nlp_state = "ready"
+                    logger.info("✅ AI Model Loaded.")
+                except OSError as e:
+                    logger.error("❌ Spacy model not found. Run: python -m spacy download en_core_web_sm")
+                    _nlp_model = False # Set to False so we don't try loading again
+                    _nlp_state = "failed"
+                    _nlp_error = str(e)
     return _nlp_model if _nlp_model else None
 
+def get_nlp_status() -> Dict[str, Any]:
+    """Model state for /health and /ready."""
+    return {"mode": NLP_MODE, "state": _nlp_state, "error": _nlp_error}
+
+_WARMUP_EMAILS = [
+    ("Airline: Warmup Air\nDepart: JFK\nArrive: LAX\nDeparture Date: December 25, 2025\nBooking reference: WARM01\nTotal: $1.00\n", "flight"),
+    ("Hotel: Warmup Inn\nCheck-in: January 15, 2026\nCheck-out: January 18, 2026\nAddress: 1 Main St\nTotal: $1.00\n", "hotel"),
+    ("Venue: Warmup Hall\nDate: March 3, 2026\nTotal: $1.00\n", "event"),
+]
+
+def warm_up():
+    """
+    Load the model (unless disabled), push one document through it, and run every
+    extractor once so their regexes are compiled before the first real request.
+    Also used as the CPU pool worker initializer.
+    """
+    nlp = get_nlp_model()
+    if nlp:
+        list(nlp.pipe(["Warm-up flight from New York to Paris on December 25, 2025 with Delta."]))
+    for email_body, email_type in _WARMUP_EMAILS:
+        _extract_with_doc(email_body, email_type, None)
+
 def _safe_parse_date(date_string):
+    """datetime for a parseable date, the raw string otherwise. Turned into ISO strings in _extract_with_doc."""
     if not date_string: return None
-    try:
-        dt = parse_date(date_string)
-        return dt.isoformat() 
-    except Exception:
-        return date_string
+    dt = parse_datetime(date_string)
+    return dt if dt is not None else date_string
 
 # --- MAIN ROUTER ---
 
-def extract_booking_data(email_body: str, email_type: str) -> Dict[str, Any]:
-    logger.info(f"Hybrid Extractor running for: {email_type}")
-    
-    # 1. Get NLP model (Lazy Load)
+def extract_booking_data(email_body: str, email_type: str, sender: Optional[str] = None) -> Dict[str, Any]:
+    logger.debug(f"Hybrid Extractor running for: {email_type}")
+    result = extract_booking_batch([(email_body, email_type, sender)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def extract_booking_batch(items: List[Tuple], batch_size: Optional[int] = None,
+                          n_process: Optional[int] = None) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Batch version of extract_booking_data for a list of (email_body, email_type) or
+    (email_body, email_type, sender); the sender picks up its domain's rules.
+    Regex runs first for every email; only the ones that still need a fallback
+    field are parsed, over the first NLP_WINDOW_CHARS of the body, and those are
+    streamed through nlp.pipe together.
+    Returns one result per item, in order; an item that fails yields its Exception
+    so one bad email doesn't sink the whole batch.
+    """
+    if not items:
+        return []
+
+    logger.debug(f"Hybrid Extractor running for a batch of {len(items)} emails")
     nlp = get_nlp_model()
-    doc = nlp(email_body) if nlp else None
+    results = [None] * len(items)
+    needs_nlp = []
 
+    # 1. Regex-only pass
+    for i, (email_body, email_type, *sender) in enumerate(items):
+        start = time.perf_counter()
+        try:
+            results[i] = _extract_with_doc(email_body, email_type, _DEFERRED_DOC if nlp else None, *sender)
+            if nlp: NLP_OUTCOMES.labels(email_type, "nlp_avoided").inc()
+        except _NeedsNlp:
+            needs_nlp.append(i)
+        except Exception as e:
+            results[i] = e
+        REGEX_EXTRACT_SECONDS.labels(email_type).observe(time.perf_counter() - start)
+
+    # 2. NLP pass, only for emails where a regex missed
+    if needs_nlp:
+        start = time.perf_counter()
+        windows = [items[i][0][:NLP_WINDOW_CHARS] for i in needs_nlp]
+        docs = nlp.pipe(windows, batch_size=batch_size or NLP_BATCH_SIZE, n_process=n_process or NLP_N_PROCESS)
+        for i, doc in zip(needs_nlp, docs):
+            email_body, email_type, *sender = items[i]
+            NLP_OUTCOMES.labels(email_type, "nlp_used").inc()
+            try:
+                results[i] = _extract_with_doc(email_body, email_type, doc, *sender)
+            except Exception as e:
+                results[i] = e
+        NLP_INFERENCE_SECONDS.observe(time.perf_counter() - start)
+
+    logger.debug(f"Batch of {len(items)}: NLP needed for {len(needs_nlp)}")
+    return results
+
+def _extract_with_doc(email_body: str, email_type: str, doc, sender: Optional[str] = None) -> Dict[str, Any]:
     results = {"type": email_type}
-    
-    # 2. Regex: Reference & Price
-    try:
-        ref_match = re.search(r'\b(?:booking\s+reference|confirmation\s+code)\s*:?\s*#?\s*([A-Z0-9]{5,12})\b', email_body, re.IGNORECASE)
-        if ref_match: results["booking_reference"] = ref_match.group(1).upper()
-        
-        price_match = re.search(r'(?:total|price).{0,30}?\$?(\d{1,5}(?:\.\d{2})?)', email_body, re.IGNORECASE)
-        if price_match: results["price_usd"] = float(price_match.group(1))
-    except Exception: pass
-    
-    # 3. Specific Extractor
+
+    # 2. Rules: reference, price and the type's labeled fields, in one scan of the body
+    results.update(_rules.extract(email_body, email_type, sender))
+
+    # 3. Specific Extractor: NLP fallbacks and safety nets
     if email_type == "flight":
-        results.update(_extract_flight(email_body, doc))
+        results.update(_extract_flight(results, doc))
     elif email_type == "hotel":
-        results.update(_extract_hotel(email_body, doc))
+        results.update(_extract_hotel(results, doc))
     elif email_type == "event":
-        results.update(_extract_event(email_body, doc))
+        results.update(_extract_event(results, doc))
+
+    # Dates stay datetime objects up to here (no string round trip for "nights")
+    for field, value in results.items():
+        if isinstance(value, datetime):
+            results[field] = value.isoformat()
     
     logger.debug(f"Extracted Data: {json.dumps(results, default=str)}")
     return results
 
 # --- SPECIFIC EXTRACTORS ---
+# `fields` is what the rules captured; each returns the fields it adds on top.
 
-def _extract_flight(email_body: str, doc=None) -> Dict[str, Any]:
+def _extract_flight(fields: Dict[str, Any], doc=None) -> Dict[str, Any]:
     details = {}
     warnings = []
-    
-    # Regex
-    depart_match = re.search(r'Depart:\s*([A-Z]{3})', email_body)
-    arrive_match = re.search(r'Arrive:\s*([A-Z]{3})', email_body)
-    if depart_match: details["departure_airport"] = depart_match.group(1)
-    if arrive_match: details["arrival_airport"] = arrive_match.group(1)
 
     # AI Fallback for Cities
-    if doc and ("departure_airport" not in details or "arrival_airport" not in details):
+    if doc and ("departure_airport" not in fields or "arrival_airport" not in fields):
         locations = [ent.text for ent in doc.ents if ent.label_ == "GPE"]
         if len(locations) >= 2:
-            if "departure_airport" not in details: details["departure_city_predicted"] = locations[0]
-            if "arrival_airport" not in details: details["arrival_city_predicted"] = locations[1]
-
-    # Regex Airline & Date
-    airline_match = re.search(r'Airline:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if airline_match: details["airline"] = airline_match.group(1).strip()
-
-    date_match = re.search(r'Departure Date:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if date_match: details["departure_date"] = _safe_parse_date(date_match.group(1).strip())
+            if "departure_airport" not in fields: details["departure_city_predicted"] = locations[0]
+            if "arrival_airport" not in fields: details["arrival_city_predicted"] = locations[1]
 
     # Safety Net
-    if "departure_date" not in details:
+    if "departure_date" not in fields:
         if doc:
             dates = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
             if dates:
@@ -104,75 +241,54 @@ def _extract_flight(email_body: str, doc=None) -> Dict[str, Any]:
     if warnings: details["warning"] = "; ".join(warnings)
     return details
 
-def _extract_hotel(email_body: str, doc=None) -> Dict[str, Any]:
+def _extract_hotel(fields: Dict[str, Any], doc=None) -> Dict[str, Any]:
     details = {}
     warnings = []
-    
-    # Regex Dates
-    check_in_match = re.search(r'Check-in:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if check_in_match: details["check_in_date"] = _safe_parse_date(check_in_match.group(1).strip())
-    
-    check_out_match = re.search(r'Check-out:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if check_out_match: details["check_out_date"] = _safe_parse_date(check_out_match.group(1).strip())
 
     # Calculate Nights (New Logic)
-    if "check_in_date" in details and "check_out_date" in details:
+    d1, d2 = fields.get("check_in_date"), fields.get("check_out_date")
+    if isinstance(d1, datetime) and isinstance(d2, datetime):
         try:
-            d1 = parse_date(details["check_in_date"])
-            d2 = parse_date(details["check_out_date"])
             details["nights"] = (d2 - d1).days
-        except: pass
+        except TypeError: pass  # one has a timezone, the other doesn't
 
     # Hotel Name
-    hotel_regex = re.search(r'Hotel:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if hotel_regex:
-        details["hotel_name"] = hotel_regex.group(1).strip()
-    elif doc:
+    if "hotel_name" not in fields and doc:
         potential_hotels = [ent.text for ent in doc.ents if ent.label_ in ["ORG", "FAC"] and any(w in ent.text.lower() for w in ['hotel', 'resort', 'inn', 'stay'])]
         if potential_hotels: details["hotel_name"] = potential_hotels[0]
 
     # Address
-    address_regex = re.search(r'Address:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if address_regex:
-        details["address"] = address_regex.group(1).strip()
-    elif doc:
+    if "address" not in fields and doc:
         cities = [ent.text for ent in doc.ents if ent.label_ == "GPE"]
         if cities: details["city_predicted"] = cities[-1]
 
     # Safety Net (Fixed Logic)
-    if "check_in_date" not in details:
+    if "check_in_date" not in fields:
         details["check_in_date"] = None
         warnings.append("MISSING_CHECK_IN")
     
-    if "hotel_name" not in details:
+    if "hotel_name" not in fields and "hotel_name" not in details:
         details["hotel_name"] = "Unknown Hotel"
         warnings.append("MISSING_NAME")
 
     if warnings: details["warning"] = "; ".join(warnings)
     return details
 
-def _extract_event(email_body: str, doc=None) -> Dict[str, Any]:
+def _extract_event(fields: Dict[str, Any], doc=None) -> Dict[str, Any]:
     details = {}
     warnings = []
 
-    venue_match = re.search(r'Venue:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if venue_match: 
-        details["venue"] = venue_match.group(1).strip()
-    elif doc:
+    if "venue" not in fields and doc:
         venues = [ent.text for ent in doc.ents if ent.label_ == "FAC"]
         if venues: details["venue_predicted"] = venues[0]
-    
-    event_date_match = re.search(r'Date:\s*(.*?)\n', email_body, re.IGNORECASE)
-    if event_date_match:
-        details["start_time"] = _safe_parse_date(event_date_match.group(1).strip())
 
-    if "start_time" not in details:
+    if "start_time" not in fields:
         if doc:
             dates = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
             if dates: details["start_time_raw"] = dates[0]
         
-        if "start_time" not in details and "start_time_raw" not in details:
+        if "start_time_raw" not in details:
              warnings.append("MISSING_DATE")
 
     if warnings: details["warning"] = "; ".join(warnings)
-    return details
\ No newline at end of file
+    return details
@@ -0,0 +1,92 @@
+# extractors/dates.py
+"""
+Date normalization for extracted fields.
+
+dateutil's parser is one of the slowest calls per email, yet booking emails use a
+handful of formats. parse_datetime() tries those exactly first:
+
+    2025-12-25, 2025-12-25T14:30:00Z             ISO 8601
+    December 25, 2025 / Dec 25 2025 / Dec. 25th, 2025
+    25 December 2025 / 25 Dec 2025
+    Thu, Dec 25, 2025 / Thursday, December 25, 2025
+    12/25/2025                                   month first, like dateutil's default
+each optionally followed by a time: "2:30 PM", "at 2:30 PM", "14:30", "14:30:00".
+
+Anything else goes to dateutil, with the same result as before. Results (including
+failures) are kept in an LRU cache of DATE_CACHE_SIZE raw strings. The cache key
+includes today's date because dateutil fills missing parts (the year of "Dec 25")
+from it.
+"""
+import os
+import re
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Optional
+
+from dateutil.parser import parse as parse_date
+
+DATE_CACHE_SIZE = int(os.getenv("DATE_CACHE_SIZE", "4096"))
+
+_MONTHS = {
+    'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3, 'apr': 4, 'april': 4,
+    'may': 5, 'jun': 6, 'june': 6, 'jul': 7, 'july': 7, 'aug': 8, 'august': 8,
+    'sep': 9, 'sept': 9, 'september': 9, 'oct': 10, 'october': 10, 'nov': 11, 'november': 11,
+    'dec': 12, 'december': 12,
+}
+_WEEKDAY = r'(?:(?:mon|tue|wed|thu|fri|sat|sun|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\.?,?\s+)?'
+_TIME = r'(?:\s+(?:at\s+)?(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?(?:\s*(?P<ampm>[ap]m))?)?'
+_DAY = r'(?P<day>\d{1,2})(?:st|nd|rd|th)?'
+
+_ISO = re.compile(r'\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?(?:Z|[+-]\d{2}:\d{2})?')
+_FAST_FORMATS = [
+    re.compile(_WEEKDAY + r'(?P<month>[a-z]+)\.?\s+' + _DAY + r',?\s+(?P<year>\d{4})' + _TIME, re.IGNORECASE),
+    re.compile(_WEEKDAY + _DAY + r'\s+(?P<month>[a-z]+)\.?,?\s+(?P<year>\d{4})' + _TIME, re.IGNORECASE),
+    re.compile(r'(?P<month>\d{1,2})/' + _DAY + r'/(?P<year>\d{4})' + _TIME, re.IGNORECASE),
+]
+
+
+def _fast_parse(raw: str) -> Optional[datetime]:
+    if _ISO.fullmatch(raw):
+        try:
+            return datetime.fromisoformat(raw)
+        except ValueError:
+            return None
+    for pattern in _FAST_FORMATS:
+        m = pattern.fullmatch(raw)
+        if m is None:
+            continue
+        month = m.group('month')
+        month = int(month) if month.isdigit() else _MONTHS.get(month.lower())
+        if month is None or month > 12:
+            return None
+        hour, minute, second = int(m.group('hour') or 0), int(m.group('minute') or 0), int(m.group('second') or 0)
+        ampm = (m.group('ampm') or '').lower()
+        if ampm:
+            if not 1 <= hour <= 12:
+                return None
+            hour = hour % 12 + (12 if ampm == 'pm' else 0)
+        try:
+            return datetime(int(m.group('year')), month, int(m.group('day')), hour, minute, second)
+        except ValueError:
+            return None
+    return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_cached(raw: str, today: date) -> Optional[datetime]:
+    dt = _fast_parse(raw)
+    if dt is not None:
+        return dt
+    try:
+        return parse_date(raw, default=datetime.combine(today, time.min))
+    except Exception:
+        return None
+
+
+def parse_datetime(raw: str) -> Optional[datetime]:
+    """The datetime raw describes, or None if it can't be parsed."""
+    return _parse_cached(raw, date.today())
+
+
+def cache_info():
+    return _parse_cached.cache_info()
@@ -0,0 +1,176 @@
+# extractors/dedup.py
+"""
+One booking per reservation, however many emails were sent about it.
+
+Airlines and hotels send a confirmation, then updates and reminders for the same
+reservation. Bookings are grouped on
+
+    (type, booking_reference, the day of the booking's date)
+
+where the date is departure_date / check_in_date / start_time (DEDUP_DATE_FIELDS),
+normalized to YYYY-MM-DD so "2025-12-25T14:30:00" and "Dec 25, 2025" agree. A
+booking whose email didn't state the date joins the group of the same reference if
+there is exactly one. Bookings without a reference are never merged.
+
+Groups are found through a dict keyed on that tuple, so merging is linear in the
+number of bookings. In a merged booking every field comes from the freshest email
+(received_at, Gmail's internalDate) that extracted a value for it; source_email_ids
+lists every email, oldest first, and id and title are the oldest email's (usually the
+confirmation). A stand-in value the extractor filled in for a missing field
+(PLACEHOLDER_FIELDS, e.g. "Unknown Hotel" with MISSING_NAME) is only used if no email
+had the real one, and a *_predicted guess is dropped once any email stated the field it
+guesses (PREDICTED_FIELDS). A warning (MISSING_DATE ...) is kept only if every email in
+the group had one.
+"""
+from typing import Dict, Optional, Tuple
+
+from extractors.dates import parse_datetime
+from formats.schemas import BookingAdapter
+
+DEDUP_DATE_FIELDS = {
+    "flight": "departure_date",
+    "hotel": "check_in_date",
+    "event": "start_time",
+}
+
+# Warning -> fields the extractor filled with a stand-in value when it raised it
+PLACEHOLDER_FIELDS = {
+    "MISSING_NAME": ("hotel_name",),
+}
+
+# NLP guess -> the extracted field it stands in for
+PREDICTED_FIELDS = {
+    "departure_city_predicted": "departure_airport",
+    "arrival_city_predicted": "arrival_airport",
+    "departure_date_raw": "departure_date",
+    "city_predicted": "address",
+    "venue_predicted": "venue",
+    "start_time_raw": "start_time",
+}
+
+
+def _normalize_date(value) -> Optional[str]:
+    if not value:
+        return None
+    dt = parse_datetime(str(value))
+    return dt.date().isoformat() if dt is not None else str(value).strip().lower()
+
+
+def dedup_key(booking) -> Optional[Tuple[str, str, Optional[str]]]:
+    """The key bookings are grouped on, or None if this booking can't be matched with others."""
+    reference = (booking.booking_reference or "").strip().upper()
+    if not reference:
+        return None
+    date_field = DEDUP_DATE_FIELDS.get(booking.type)
+    return booking.type, reference, _normalize_date(getattr(booking, date_field, None)) if date_field else None
+
+
+def _freshness(indexed_booking):
+    index, booking = indexed_booking
+    received_at = getattr(booking, "received_at", None)
+    return (received_at if received_at is not None else -1, index)
+
+
+def _placeholder_fields(booking) -> set:
+    """Fields of this booking that hold a stand-in value rather than what its email said."""
+    fields = set()
+    for code in (booking.warning or "").split(";"):
+        fields.update(PLACEHOLDER_FIELDS.get(code.strip(), ()))
+    return fields
+
+
+def merge_bookings(bookings: list):
+    """The booking for one reservation, from every booking extracted for it (in any order)."""
+    ordered = [booking for _, booking in sorted(enumerate(bookings), key=_freshness)]  # oldest first
+    if len(ordered) == 1:
+        return ordered[0]
+    merged, placeholders = {}, {}
+    for booking in ordered:  # later (fresher) values overwrite earlier ones
+        stand_ins = _placeholder_fields(booking)
+        for field, value in booking.model_dump().items():
+            if value is None:
+                continue
+            if field in stand_ins:
+                placeholders[field] = value
+            else:
+                merged[field] = value
+    for field, value in placeholders.items():
+        merged.setdefault(field, value)
+    for predicted, field in PREDICTED_FIELDS.items():
+        if merged.get(field) is not None:
+            merged.pop(predicted, None)
+    if any(booking.warning is None for booking in ordered):
+        merged.pop("warning", None)
+    source_ids = []
+    for booking in ordered:
+        for email_id in booking.source_email_ids or [booking.source_email_id or booking.id]:
+            if email_id and email_id not in source_ids:
+                source_ids.append(email_id)
+    merged["id"] = ordered[0].id
+    if getattr(ordered[0], "title", None) is not None:
+        merged["title"] = ordered[0].title
+    merged["source_email_id"] = ordered[-1].source_email_id
+    merged["source_email_ids"] = source_ids
+    return BookingAdapter.validate_python(merged)
+
+
+class BookingMerger:
+    """
+    Groups bookings as they are added: one batch at a time (dedup_bookings) or page
+    by page (/scan/stream). Groups are merged lazily, when merged() or results() asks.
+    """
+
+    def __init__(self):
+        self._groups: Dict[object, list] = {}
+        self._dates: Dict[Tuple[str, str], set] = {}  # (type, reference) -> the days seen for it
+        self._merged: Dict[object, object] = {}
+
+    def _group_key(self, booking):
+        key = dedup_key(booking)
+        if key is None:
+            return ("unmatched", len(self._groups))
+        type_and_ref, day = key[:2], key[2]
+        if day is None:
+            days = self._dates.get(type_and_ref, ())
+            if len(days) == 1:
+                return type_and_ref + (next(iter(days)),)
+        else:
+            self._dates.setdefault(type_and_ref, set()).add(day)
+        return key
+
+    def add(self, booking) -> Tuple[object, bool]:
+        """Returns (group key, True if this booking started a new group)."""
+        key = self._group_key(booking)
+        group = self._groups.get(key)
+        if group is None:
+            self._groups[key] = [booking]
+            self._merged[key] = booking
+            return key, True
+        group.append(booking)
+        self._merged.pop(key, None)
+        return key, False
+
+    def merged(self, key):
+        booking = self._merged.get(key)
+        if booking is None:
+            booking = self._merged[key] = merge_bookings(self._groups[key])
+        return booking
+
+
+def dedup_bookings(bookings: list) -> list:
+    """
+    Merges bookings for the same reservation. Dated bookings go in first, so an undated
+    reminder finds its group wherever it sits in the list; groups keep input order.
+    """
+    merger = BookingMerger()
+    keys = [None] * len(bookings)
+    undated = []
+    for i, booking in enumerate(bookings):
+        key = dedup_key(booking)
+        if key is not None and key[2] is None:
+            undated.append(i)
+        else:
+            keys[i] = merger.add(booking)[0]
+    for i in undated:
+        keys[i] = merger.add(bookings[i])[0]
+    return [merger.merged(key) for key in dict.fromkeys(keys)]
@@ -0,0 +1,207 @@
+# extractors/rules.py
+"""
+Declarative field-extraction rules (extractors/extraction_rules.json), compiled into
+one scanner per (booking type, sender domain).
+
+A rule captures one field with exactly one regex group. Two forms:
+
+    {"field": "airline", "labels": ["Airline:"], "value": "(.*?)\\n"}
+        -> (?:Airline:)\\s*(.*?)\\n, anchored on its labels
+    {"field": "price_usd", "pattern": "(?:total|price).{0,30}?...", "anchors": ["total", "price"]}
+        -> a free-form regex; every match must start with one of its anchors
+
+Options: "ignore_case" (default true), "transform" (default "strip"; see TRANSFORMS).
+
+Rules for a type are tried in priority order: the sender's domain rules (and its
+parent domains'), then the type's rules, then the "*" rules shared by every type.
+For each field the first rule, by priority, that matches anywhere in the body wins,
+and within a rule its leftmost match wins, exactly like running re.search per rule.
+
+How the body is scanned once, whatever the number of rules:
+- The body is lower-cased once and every rule's anchors are folded into a single
+  trie-shaped regex of literals, so re skips ahead on the first-character set and
+  the cost per position barely depends on how many anchors there are.
+- At each anchor hit, only the rules owning that anchor run their own regex there.
+- Rules that can no longer change the result (matched already, or a higher-priority
+  rule for the same field matched) leave the scanner; the narrowed scanners are cached.
+"""
+import hashlib
+import json
+import re
+from typing import Callable, Dict, List, Optional
+
+TRANSFORMS = {
+    "strip": str.strip,
+    "raw": lambda value: value,
+    "upper": lambda value: value.strip().upper(),
+    "float": lambda value: float(value.strip()),
+}
+
+_MAX_CACHED_SCANNERS = 512
+
+
+def trie_regex(words) -> str:
+    """Regex source matching any of `words` (literals), shaped as a prefix trie."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def _build(node):
+        branches = [re.escape(ch) + _build(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return _build(trie)
+
+
+class Rule:
+    def __init__(self, spec: dict, transforms: Dict[str, Callable]):
+        self.field = spec["field"]
+        ignore_case = spec.get("ignore_case", True)
+        self.labelled = "labels" in spec
+        if self.labelled:
+            labels = spec["labels"]
+            pattern = '(?:' + '|'.join(re.escape(label) for label in labels) + r')\s*' + spec["value"]
+            anchors = labels
+        else:
+            pattern = spec["pattern"]
+            anchors = spec.get("anchors") or []
+        if not anchors or not all(anchors):
+            raise ValueError(f"Rule for {self.field} needs non-empty labels or anchors: {spec}")
+
+        self.regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        if self.regex.groups != 1:
+            raise ValueError(f"Rule for {self.field} must have exactly one capture group: {pattern}")
+        self.anchors = tuple(anchor.lower() for anchor in anchors)
+        name = spec.get("transform", "strip")
+        if name not in transforms:
+            raise ValueError(f"Unknown transform {name!r} for {self.field}")
+        self.transform = transforms[name]
+
+
+class RuleSet:
+    """The rules that apply to one (type, domain), in priority order."""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self._by_first_char = {}
+        for i, rule in enumerate(rules):
+            for anchor in rule.anchors:
+                self._by_first_char.setdefault(anchor[0], []).append((anchor, i))
+        # Rules for the same field, best first: once rule i matched, later ones for that field are moot
+        self._lower_priority = {
+            i: frozenset(j for j in range(i + 1, len(rules)) if rules[j].field == rule.field)
+            for i, rule in enumerate(rules)
+        }
+        self._scanners = {}
+        self._all = frozenset(range(len(rules)))
+
+    def _scanner_for(self, pending: frozenset, ignore_case: bool):
+        key = (pending, ignore_case)
+        scanner = self._scanners.get(key)
+        if scanner is None:
+            anchors = {anchor for i in pending for anchor in self.rules[i].anchors}
+            scanner = re.compile(trie_regex(sorted(anchors)), re.IGNORECASE if ignore_case else 0)
+            if len(self._scanners) >= _MAX_CACHED_SCANNERS:
+                self._scanners.clear()
+            self._scanners[key] = scanner
+        return scanner
+
+    def extract(self, text: str) -> Dict[str, object]:
+        """Returns {field: transformed value} for every field some rule captured."""
+        lower = text.lower()
+        # str.lower() can change the length of a few non-ASCII strings; positions must line up with text
+        ignore_case = len(lower) != len(text)
+        scan_text = text if ignore_case else lower
+
+        pending = self._all
+        matched = {}
+        pos = 0
+        scanner = self._scanner_for(pending, ignore_case) if pending else None
+        while scanner is not None:
+            hit = scanner.search(scan_text, pos)
+            if hit is None:
+                break
+            start = hit.start()
+            resolved = set()
+            for anchor, i in self._by_first_char.get(scan_text[start].lower(), ()):
+                if i not in pending or i in resolved or scan_text[start:start + len(anchor)].lower() != anchor:
+                    continue
+                m = self.rules[i].regex.match(text, start)
+                if m:
+                    matched[i] = m.group(1)
+                    resolved.add(i)
+                    resolved |= self._lower_priority[i]
+            pos = start + 1
+            if resolved:
+                pending = pending - resolved
+                scanner = self._scanner_for(pending, ignore_case) if pending else None
+
+        results = {}
+        for i in sorted(matched):
+            rule = self.rules[i]
+            if rule.field in results:
+                continue
+            try:
+                results[rule.field] = rule.transform(matched[i])
+            except (TypeError, ValueError):
+                continue
+        return results
+
+
+class ExtractionRules:
+    def __init__(self, config: dict, transforms: Optional[Dict[str, Callable]] = None):
+        self.transforms = {**TRANSFORMS, **(transforms or {})}
+        self.types = {
+            email_type: [Rule(spec, self.transforms) for spec in specs]
+            for email_type, specs in config.get("types", {}).items()
+        }
+        self.domains = {
+            domain.lower(): {
+                email_type: [Rule(spec, self.transforms) for spec in specs]
+                for email_type, specs in by_type.items()
+            }
+            for domain, by_type in config.get("domains", {}).items()
+        }
+        # Goes into EXTRACTOR_VERSION, so editing the rules invalidates cached extractions
+        self.version = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        self._rulesets = {}
+
+    @classmethod
+    def from_file(cls, path: str, transforms: Optional[Dict[str, Callable]] = None) -> "ExtractionRules":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), transforms)
+
+    def _domains_for(self, sender: Optional[str]) -> List[str]:
+        """Configured domains for a sender address, most specific first (mail.united.com, united.com)."""
+        if not sender or '@' not in sender:
+            return []
+        host = sender.rsplit('@', 1)[1].strip().strip('>').lower()
+        parts = host.split('.')
+        return [d for d in ('.'.join(parts[i:]) for i in range(len(parts) - 1)) if d in self.domains]
+
+    def ruleset(self, email_type: str, sender: Optional[str] = None) -> RuleSet:
+        domains = tuple(self._domains_for(sender))
+        key = (email_type, domains)
+        ruleset = self._rulesets.get(key)
+        if ruleset is None:
+            rules = []
+            for domain in domains:
+                rules += self.domains[domain].get(email_type, []) + self.domains[domain].get("*", [])
+            rules += self.types.get(email_type, []) + self.types.get("*", [])
+            ruleset = self._rulesets[key] = RuleSet(rules)
+        return ruleset
+
+    def extract(self, text: str, email_type: str, sender: Optional[str] = None) -> Dict[str, object]:
+        return self.ruleset(email_type, sender).extract(text)
+
+    def anchors(self, labelled: bool) -> List[str]:
+        """Lower-cased anchors of every rule, of labelled rules ("Depart:") or of free-form ones ("total")."""
+        rules = [rule for rules in self.types.values() for rule in rules]
+        rules += [rule for by_type in self.domains.values() for rules in by_type.values() for rule in rules]
+        return sorted({anchor for rule in rules if rule.labelled == labelled for anchor in rule.anchors})
@@ -0,0 +1,194 @@
+# extractors/windowing.py
+"""
+Only the booking part of a long email goes through extraction.
+
+Booking details take a few hundred characters; marketing footers, legal text and
+quoted replies around them can be 50-100x that. For bodies of WINDOW_MIN_CHARS or
+more, window_body() keeps:
+
+- the unquoted part: everything from a reply header ("On ... wrote:",
+  "-----Original Message-----") on, and ">" lines, is dropped, unless the booking
+  is only in the quoted part (a reply to a confirmation);
+- nothing from the footer on: the first footer line (unsubscribe, privacy policy,
+  copyright ...) after the last anchor line;
+- the first WINDOW_HEAD_LINES lines (greeting, title) and, around every line with
+  an anchor of extractors/extraction_rules.json (a label, "Depart:", or a free-form
+  rule's word, "total") or a word of KEYWORD_PATTERNS, WINDOW_CONTEXT_LINES lines on
+  each side;
+- runs of spaces/tabs as one space and blank lines collapsed.
+
+A body without any anchor is kept whole: there is nothing to aim at.
+Window.spans are the (start, end) offsets in the original body of what was kept.
+
+The filter still reads the whole body: its spam patterns reject on "unsubscribe"
+anywhere in an email, footers included, and a window would change that verdict.
+benchmarks/bench_windowing.py checks extraction agrees with the whole body.
+"""
+import os
+import re
+from bisect import bisect_right
+from typing import List, NamedTuple, Optional, Tuple
+
+
+BODY_WINDOWING = os.getenv("BODY_WINDOWING", "True").lower() in ("1", "true", "yes")
+WINDOW_MIN_CHARS = int(os.getenv("WINDOW_MIN_CHARS", "4000"))
+WINDOW_HEAD_LINES = int(os.getenv("WINDOW_HEAD_LINES", "3"))
+WINDOW_CONTEXT_LINES = int(os.getenv("WINDOW_CONTEXT_LINES", "3"))
+
+_REPLY_MARKERS = ("wrote:", "original message")
+_REPLY_HEADER = re.compile(r'[ \t]*(?:on\b.{0,200}\bwrote:|-{3,}\s*original message\s*-{3,})[ \t]*$')
+_FOOTER = re.compile(
+    r'unsubscribe|privacy policy|all rights reserved|©|\(c\)\s*\d{4}|copyright\s+\d{4}'
+    r'|this (?:e-?mail|message) was sent|you are receiving this|manage (?:your )?(?:e-?mail )?preferences'
+)
+_WORD_GROUP = re.compile(r'^\\b\(([^()]*)\)\\b$')
+_LITERAL_WORD = re.compile(r'[\w ]+')
+_SPACES = re.compile(r'[ \t\xa0]+')
+_BLANK_LINES = re.compile(r'\n(?:[ \t]*\n)+')
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class Window(NamedTuple):
+    text: str
+    spans: List[Tuple[int, int]]
+
+
+class BodyWindower:
+    def __init__(self, anchors, keyword_patterns, min_chars=WINDOW_MIN_CHARS,
+                 head_lines=WINDOW_HEAD_LINES, context_lines=WINDOW_CONTEXT_LINES):
+        """anchors: lower-cased rule anchors; keyword_patterns: KEYWORD_PATTERNS-style {type: [regex, ...]}."""
+        self.min_chars = min_chars
+        self.head_lines = head_lines
+        self.context_lines = context_lines
+        anchors = sorted(set(anchors))
+        # Labels end in ":" ("Depart:") and free-form anchors ("total") are whole words:
+        # str.find on colons and on those few words beats any regex scan of the whole body
+        self._colon_labels = {}
+        for label in anchors:
+            if label.endswith(':'):
+                self._colon_labels.setdefault(len(label), set()).add(label)
+        self._anchor_words = [anchor for anchor in anchors if not anchor.endswith(':')]
+        # Only literal words of the groups \b(a|b|c)\b: ([A-Z]{3}) would hit every three-letter word of
+        # lower-cased text ("the", "and"), and check.in any "check" followed by "in"
+        words = sorted({word.lower() for patterns in keyword_patterns.values() for p in patterns
+                 for group in [_WORD_GROUP.match(p)] if group
+                 for word in group.group(1).split('|') if _LITERAL_WORD.fullmatch(word)})
+        self._keywords = re.compile(r'\b(?:' + '|'.join(words) + r')\b') if words else None
+
+    @staticmethod
+    def _lines_hit(regex, text, line_starts, pos=0, endpos=None) -> List[int]:
+        if regex is None:
+            return []
+        found = regex.finditer(text, pos, len(text) if endpos is None else endpos)
+        return sorted({bisect_right(line_starts, m.start()) - 1 for m in found})
+
+    def _anchor_lines(self, lower, line_starts) -> List[int]:
+        lines = set()
+        for word in self._anchor_words:
+            pos = lower.find(word)
+            while pos != -1:
+                end = pos + len(word)
+                if not (pos and _is_word_char(lower[pos - 1])) and not (end < len(lower) and _is_word_char(lower[end])):
+                    lines.add(bisect_right(line_starts, pos) - 1)
+                pos = lower.find(word, end)
+        pos = lower.find(':') if self._colon_labels else -1
+        while pos != -1:
+            end = pos + 1
+            if any(lower[end - size:end] in labels for size, labels in self._colon_labels.items()):
+                lines.add(bisect_right(line_starts, pos) - 1)
+            pos = lower.find(':', end)
+        return sorted(lines)
+
+    @staticmethod
+    def _reply_line(lower, line_starts, offset) -> Optional[int]:
+        """Index of the first reply-header line ("On ... wrote:"), if any."""
+        found = []
+        for marker in _REPLY_MARKERS:
+            pos = lower.find(marker)
+            while pos != -1:
+                line = bisect_right(line_starts, pos) - 1
+                if _REPLY_HEADER.match(lower, line_starts[line], offset(line + 1)):
+                    found.append(line)
+                    break
+                pos = lower.find(marker, pos + 1)
+        return min(found) if found else None
+
+    @staticmethod
+    def _quoted_lines(lower, line_starts, endpos) -> set:
+        lines = set()
+        pos = lower.find('>', 0, endpos)
+        while pos != -1:
+            line = bisect_right(line_starts, pos) - 1
+            if not lower[line_starts[line]:pos].strip(' \t'):
+                lines.add(line)
+            pos = lower.find('>', pos + 1, endpos)
+        return lines
+
+    def window(self, body: str) -> Window:
+        whole = Window(body, [(0, len(body))])
+        if len(body) < self.min_chars:
+            return whole
+
+        lower = body.lower()
+        line_starts = [0] + [m.end() for m in re.finditer('\n', body)]
+        n_lines = len(line_starts)
+        offset = lambda line: line_starts[line] if line < n_lines else len(body)  # noqa: E731
+        anchors = self._anchor_lines(lower, line_starts)
+        if not anchors:
+            return whole  # nothing to aim at
+
+        # Quoted thread: dropped only when the unquoted part has anchors of its own
+        reply = self._reply_line(lower, line_starts, offset)
+        end = reply if reply is not None else n_lines
+        quoted = self._quoted_lines(lower, line_starts, offset(end))
+        unquoted = [i for i in anchors if i < end and i not in quoted]
+        if unquoted:
+            anchors = unquoted
+        else:
+            end, quoted = n_lines, set()
+
+        # Footer: from the first footer line after the last anchor
+        if anchors[-1] + 1 < end:
+            footer = _FOOTER.search(lower, offset(anchors[-1] + 1), offset(end))
+            if footer:
+                end = bisect_right(line_starts, footer.start()) - 1
+
+        keywords = self._lines_hit(self._keywords, lower, line_starts, 0, offset(end))
+        keep = set(range(min(self.head_lines, end)))
+        for i in anchors + keywords:
+            keep.update(range(max(0, i - self.context_lines), min(end, i + self.context_lines + 1)))
+        keep -= quoted
+
+        spans = []
+        for i in sorted(keep):
+            start, stop = line_starts[i], offset(i + 1)
+            if spans and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], stop)
+            else:
+                spans.append((start, stop))
+        text = "\n".join(body[start:stop].rstrip("\n") for start, stop in spans)
+        text = _BLANK_LINES.sub("\n\n", _SPACES.sub(" ", text)).strip() + "\n"
+        return Window(text, spans)
+
+
+_windower = None
+
+
+def get_windower() -> BodyWindower:
+    global _windower
+    if _windower is None:
+        from extractors.booking_extractor import get_rules
+        from filters.email_filter import KEYWORD_PATTERNS
+        rules = get_rules()
+        _windower = BodyWindower(rules.anchors(labelled=True) + rules.anchors(labelled=False), KEYWORD_PATTERNS)
+    return _windower
+
+
+def window_body(body: str) -> Window:
+    """The part of body worth extracting from (the whole body when BODY_WINDOWING is off)."""
+    if not BODY_WINDOWING:
+        return Window(body, [(0, len(body))])
+    return get_windower().window(body)
@@ -85,20 +85,231 @@ def is_spam_or_promotion(email_text: str, subject: str) -> bool:
     return any(re.search(p, combined_text, re.IGNORECASE) 
                for p in SPAM_PATTERNS)
 
+class EmailClassifier:
+    """
+    Compiled form of TRUSTED_SENDERS / KEYWORD_PATTERNS / SPAM_PATTERNS.
+
+    Built once, then each email costs:
+    - one set lookup for the sender (exact address or domain),
+    - one forward regex pass over subject + body that finds spam and every keyword group.
+
+    How the single pass stays fast with Python's re:
+    - The text is lower-cased once and patterns are compiled lower-case, instead of re.IGNORECASE
+      (unless lower() changes the text's length, e.g. 'İ' -> 'i̇': then IGNORECASE copies are used).
+    - Keyword/spam patterns of the form \\b(a|b|c)\\b are folded into one word alternation;
+      each distinct matched word is mapped back to the groups it belongs to (memoised).
+    - Leading \\b is checked in Python, so the compiled scanner starts with literals and
+      re can use its first-character prefix scan.
+    - Each time new keyword groups are hit, scanning continues from the same position with a
+      (cached) regex that only contains the words that can still change the verdict.
+    Patterns starting with ^ are only tried at position 0. Anything else keyword-related
+    falls back to its own compiled search.
+    """
+    _WORD_GROUP = re.compile(r'^\\b\(([^()]*)\)\\b$')
+    _SENDER_DOMAIN = re.compile(r'^\.\*@((?:[\w-]|\\\.)+)\$$')
+    _SENDER_EXACT = re.compile(r'^((?:[\w+-]|\\\.)+@(?:[\w-]|\\\.)+)\$$')
+    _UPPERCASE_ESCAPE = re.compile(r'\\[A-Z]')
+    _WORD_CHAR = re.compile(r'\w')
+
+    def __init__(self, trusted_senders, keyword_patterns, spam_patterns):
+        # --- Senders ---
+        self.trusted_domains = set()
+        self.trusted_addresses = set()
+        self.sender_regexes = []
+        for pattern in trusted_senders:
+            domain = self._SENDER_DOMAIN.match(pattern)
+            exact = self._SENDER_EXACT.match(pattern)
+            if domain:
+                self.trusted_domains.add(domain.group(1).replace('\\.', '.').lower())
+            elif exact:
+                self.trusted_addresses.add(exact.group(1).replace('\\.', '.').lower())
+            else:
+                self.sender_regexes.append(re.compile(pattern, re.IGNORECASE))
+
+        # --- Text patterns ---
+        # Only the first 2 keyword groups per type are used (see contains_required_keywords)
+        self.keyword_groups = {
+            email_type: [f"{email_type}_{i}" for i in range(2)]
+            for email_type, patterns in keyword_patterns.items() if len(patterns) >= 2
+        }
+        text_patterns = [(f"spam_{i}", p) for i, p in enumerate(spam_patterns)]
+        for email_type, patterns in keyword_patterns.items():
+            if email_type in self.keyword_groups:
+                text_patterns += [(f"{email_type}_{i}", p) for i, p in enumerate(patterns[:2])]
+        self.spam_groups = frozenset(name for name, _ in text_patterns if name.startswith("spam_"))
+
+        # Lower-casing the text is only equivalent to IGNORECASE if no pattern uses \W, \S, \B ...
+        self._lower = not any(self._UPPERCASE_ESCAPE.search(p) for _, p in text_patterns)
+        flags = 0 if self._lower else re.IGNORECASE
+        norm = (lambda p: p.lower()) if self._lower else (lambda p: p)
+
+        self._group_regexes = {}   # word-form groups, used to map a matched word back to its groups
+        self._group_regexes_ic = {}
+        self._word_groups = {}     # word alternative -> groups it appears in
+        self._anchored = []        # ^-anchored spam patterns, tried once at position 0
+        self._anchored_ic = []
+        self._fallback = []        # non-word keyword groups, searched separately
+        self._needs_boundary = {"word"}
+        plain_branches, boundary_branches = [], []
+        for name, pattern in text_patterns:
+            word_group = self._WORD_GROUP.match(pattern)
+            if word_group:
+                self._group_regexes[name] = re.compile(norm(pattern), flags)
+                self._group_regexes_ic[name] = re.compile(norm(pattern), re.IGNORECASE)
+                for word in norm(word_group.group(1)).split('|'):
+                    self._word_groups.setdefault(word, set()).add(name)
+            elif name not in self.spam_groups:
+                self._fallback.append((name, re.compile(pattern, re.IGNORECASE)))
+            elif pattern.startswith('^'):
+                self._anchored.append((name, re.compile(norm(pattern), flags)))
+                self._anchored_ic.append((name, re.compile(norm(pattern), re.IGNORECASE)))
+            elif pattern.startswith(r'\b'):
+                self._needs_boundary.add(name)
+                boundary_branches.append(f"(?P<{name}>{norm(pattern[2:])})")
+            else:
+                plain_branches.append(f"(?P<{name}>{norm(pattern)})")
+
+        # Branches without a leading \b go first: if one matches at a position, it wins there.
+        self._spam_branches = plain_branches + boundary_branches
+        self._flags = flags
+        self._scanners = {}
+        self._word_cache = {}
+        self._word_cache_ic = {}
+        self._all_groups = frozenset(set().union(*self._word_groups.values()))
+
+    def _scanner_for(self, wanted: frozenset, ignore_case: bool = False):
+        """Compiled scanner for spam plus only the keyword words that can still change the verdict."""
+        scanner = self._scanners.get((wanted, ignore_case), False)
+        if scanner is False:
+            words = [w for w, groups in self._word_groups.items() if not groups.isdisjoint(wanted)]
+            branches = list(self._spam_branches)
+            if words:
+                branches.append(r'(?P<word>(?:' + '|'.join(words) + r')\b)')
+            flags = re.IGNORECASE if ignore_case else self._flags
+            scanner = re.compile('|'.join(branches), flags) if branches else None
+            self._scanners[(wanted, ignore_case)] = scanner
+        return scanner
+
+    def _wanted_groups(self, hits: set) -> frozenset:
+        """Groups whose match could still change the result, given what has been hit so far."""
+        wanted = set(self.spam_groups)
+        for groups in self.keyword_groups.values():
+            missing = [g for g in groups if g not in hits]
+            if not missing:
+                break  # this type wins unless an earlier type completes, so later types don't matter
+            wanted.update(missing)
+        return frozenset(wanted & self._all_groups)
+
+    def is_trusted_sender(self, sender_email: str) -> bool:
+        sender = sender_email.lower()
+        if sender in self.trusted_addresses:
+            return True
+        if '@' in sender and sender.rsplit('@', 1)[1] in self.trusted_domains:
+            return True
+        return any(p.match(sender_email) for p in self.sender_regexes)
+
+    def _groups_for_word(self, word: str, ignore_case: bool = False) -> frozenset:
+        cache, regexes = ((self._word_cache_ic, self._group_regexes_ic) if ignore_case
+                          else (self._word_cache, self._group_regexes))
+        groups = cache.get(word)
+        if groups is None:
+            groups = frozenset(name for name, p in regexes.items() if p.fullmatch(word))
+            cache[word] = groups
+        return groups
+
+    def scan(self, text: str) -> set:
+        """Single pass over text; returns the names of the groups that decided the result (stops early on spam)."""
+        ignore_case = False
+        if self._lower:
+            lower = text.lower()
+            # str.lower() can change the length of a few non-ASCII strings ('İ' -> 'i̇'), which
+            # would add word boundaries the text doesn't have; scan the text as is then
+            ignore_case = len(lower) != len(text)
+            if not ignore_case:
+                text = lower
+        hits = {name for name, p in (self._anchored_ic if ignore_case else self._anchored) if p.match(text)}
+        if hits:
+            return hits
+
+        scanner = self._scanner_for(self._wanted_groups(hits), ignore_case)
+        pos = 0
+        while scanner is not None:
+            m = scanner.search(text, pos)
+            if m is None:
+                break
+            name = m.lastgroup
+            start = m.start()
+            pos = max(m.end(), start + 1)
+            if name in self._needs_boundary and start > 0 and self._WORD_CHAR.match(text, start - 1):
+                pos = start + 1  # no \b before the match, retry from the next character
+                continue
+            if name != "word":
+                hits.add(name)
+                return hits  # non-word branches are all spam
+            new = self._groups_for_word(m.group(0), ignore_case) - hits
+            if new:
+                hits |= new
+                if not hits.isdisjoint(self.spam_groups):
+                    return hits
+                scanner = self._scanner_for(self._wanted_groups(hits), ignore_case)
+
+        for name, p in self._fallback:
+            if p.search(text):
+                hits.add(name)
+        return hits
+
+    def prefilter(self, sender: str, subject: str) -> tuple[bool, Optional[str]]:
+        """
+        Header-only subset of classify(): sender whitelist and spam in the subject.
+        Anything rejected here would also be rejected by classify() with the same reason.
+        """
+        if not self.is_trusted_sender(sender):
+            return False, f"Untrusted sender: {sender}"
+
+        if not self.scan(subject).isdisjoint(self.spam_groups):
+            return False, "Detected as promotional/spam"
+
+        return True, None
+
+    def classify(self, sender: str, subject: str, body: str) -> tuple[bool, Optional[str]]:
+        if not self.is_trusted_sender(sender):
+            return False, f"Untrusted sender: {sender}"
+
+        hits = self.scan(f"{subject}\n{body}")
+        if not hits.isdisjoint(self.spam_groups):
+            return False, "Detected as promotional/spam"
+
+        for email_type, groups in self.keyword_groups.items():
+            if all(g in hits for g in groups):
+                return True, email_type
+
+        return False, "No matching booking patterns found"
+
+_classifier = EmailClassifier(TRUSTED_SENDERS, KEYWORD_PATTERNS, SPAM_PATTERNS)
+
+def reload_classifier():
+    """Rebuild the compiled classifier after TRUSTED_SENDERS / *_PATTERNS change."""
+    global _classifier
+    _classifier = EmailClassifier(TRUSTED_SENDERS, KEYWORD_PATTERNS, SPAM_PATTERNS)
+    return _classifier
+
 def should_process_email(sender: str, subject: str, body: str) -> tuple[bool, Optional[str]]:
     """
     Returns: (should_process, reason_if_rejected or detected_type)
     """
-    combined_text = f"{subject}\n{body}"
-    
-    if not is_trusted_sender(sender):
-        return False, f"Untrusted sender: {sender}"
-    
-    if is_spam_or_promotion(body, subject):
-        return False, "Detected as promotional/spam"
-    
-    for email_type in KEYWORD_PATTERNS.keys():
-        if contains_required_keywords(combined_text, email_type):
-            return True, email_type
-    
-    return False, "No matching booking patterns found"
\ No newline at end of file
+    return _classifier.classify(sender, subject, body)
+
+def should_fetch_email(sender: str, subject: str) -> tuple[bool, Optional[str]]:
+    """
+    Pre-filter on headers only (before the body is downloaded).
+    Returns: (worth_fetching, reason_if_rejected)
+    """
+    return _classifier.prefilter(sender, subject)
+
+def rejection_code(reason: str) -> str:
+    """Low-cardinality label for a rejection reason (the untrusted-sender reason embeds the address)."""
+    if reason.startswith("Untrusted sender"):
+        return "untrusted_sender"
+    if reason.startswith("Detected as promotional"):
+        return "spam"
+    return "no_booking_pattern"
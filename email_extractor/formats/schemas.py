@@ -1,5 +1,5 @@
-from typing import Literal, Optional, List, Any, Union
-from pydantic import BaseModel, Field
+from typing import Annotated, Literal, Optional, List, Any, Union
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 # --- 1. The Base Model (Shared Fields) ---
 class BookingBase(BaseModel):
@@ -8,13 +8,14 @@ class BookingBase(BaseModel):
     booking_reference: Optional[str] = Field(None, description="PNR or Confirmation Code")
     price_usd: Optional[float] = Field(None, description="Total cost in USD")
     source_email_id: Optional[str] = Field(None, description="ID of the Gmail message")
+    source_email_ids: Optional[List[str]] = Field(None, description="Every message merged into this booking, oldest first")
+    received_at: Optional[int] = Field(None, description="Gmail internalDate (ms) of the freshest source message")
     
     # AI / Meta fields
     warning: Optional[str] = Field(None, description="Safety net flags like 'MISSING_DATE'")
     
     # Allow extra fields (so we don't crash if we add new AI tags later)
-    class Config:
-        extra = "allow"
+    model_config = ConfigDict(extra="allow")
 
 # --- 2. Specific Models ---
 
@@ -54,8 +55,16 @@ class UnknownBooking(BookingBase):
 
 # --- 3. The Response Container ---
 
-# This Union tells FastAPI: "The booking could be ANY of these types"
-BookingUnion = Union[FlightBooking, HotelBooking, EventBooking, UnknownBooking]
+# This Union tells FastAPI: "The booking could be ANY of these types".
+# Discriminated on "type", so a payload goes straight to its model instead of trying each one in turn.
+BookingUnion = Annotated[
+    Union[FlightBooking, HotelBooking, EventBooking, UnknownBooking],
+    Field(discriminator="type"),
+]
+
+# Built once: validate a whole batch of payloads in one call, serialize a list straight to JSON bytes
+BookingAdapter = TypeAdapter(BookingUnion)
+BookingListAdapter = TypeAdapter(List[BookingUnion])
 
 class EmailResponse(BaseModel):
     total_scanned: int
@@ -1,89 +1,700 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Union
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from google.auth.exceptions import RefreshError
+from typing import List, Optional, Union
+import asyncio
+import json
 import logging
+import os
+import random
+import time
+
+try:
+    import orjson
+except ImportError:  # optional: NDJSON events fall back to the json module
+    orjson = None
 
 # --- NEW IMPORTS ---
-from filters.email_filter import should_process_email
-from extractors.booking_extractor import extract_booking_data
-from services.gmail_service import fetch_recent_booking_emails
+from filters.email_filter import should_process_email, should_fetch_email, rejection_code
+from extractors.booking_extractor import extract_booking_batch, warm_up, get_nlp_status, NLP_MODE
+from extractors.dedup import BookingMerger, dedup_bookings
+from extractors.windowing import window_body
+from services.gmail_service import (
+    build_gmail_service, list_message_ids, iter_message_id_pages, fetch_messages, fetch_message_headers,
+    get_profile, sync_message_ids, http_status
+)
+from services.extraction_cache import get_extraction_cache, VERDICT_BOOKING, VERDICT_REJECTED
+from services.sync_state import get_sync_state_store
+from services.gmail_clients import credentials_key
+from services.gmail_quota import MeteredGmailService, get_quota_limiter
+from services.gmail_clients import get_client_pool
+from services.metrics import Counter, Gauge, Histogram, render_metrics
+from services.extraction_jobs import ExtractionJobQueue
+from services.offline_ingest import chunked, ingest_chunk, iter_message_refs
+from services.worker_pools import (
+    CPU_POOL_SIZE, run_io, run_cpu, admission, shutdown_pools, start_cpu_pool, set_cpu_initializer,
+    cpu_pool_started, pending_scans, OverloadedError
+)
 
 # Import schemas from formats folder
-from formats.schemas import FlightBooking, HotelBooking, EventBooking, UnknownBooking, BookingUnion
+from formats.schemas import (
+    FlightBooking, HotelBooking, EventBooking, UnknownBooking, BookingUnion, BookingAdapter, BookingListAdapter
+)
+
+# Two-stage fetch: From/Subject only (format=metadata) first, full bodies only for survivors
+GMAIL_METADATA_PREFILTER = os.getenv("GMAIL_METADATA_PREFILTER", "True").lower() in ("1", "true", "yes")
+
+# /scan/bulk: accounts scanned at the same time, and accounts accepted per request
+BULK_ACCOUNT_CONCURRENCY = int(os.getenv("BULK_ACCOUNT_CONCURRENCY", "8"))
+BULK_MAX_ACCOUNTS = int(os.getenv("BULK_MAX_ACCOUNTS", "1000"))
+
+# /ingest: archives are read from paths under this directory only ("" = /ingest is off)
+INGEST_ROOT = os.getenv("INGEST_ROOT", "")
+
+# /jobs/extract: emails accepted per job (services/extraction_jobs.py)
+JOB_MAX_EMAILS = int(os.getenv("JOB_MAX_EMAILS", "10000"))
+
+# Merge bookings for the same reservation (confirmation, update, reminder ...) into one, see extractors/dedup.py
+DEDUP_BOOKINGS = os.getenv("DEDUP_BOOKINGS", "True").lower() in ("1", "true", "yes")
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TrippExtractor")
 
-app = FastAPI(title="Tripp Email Extractor")
+# Per-email logs are DEBUG; instead, this fraction of emails gets one INFO "trace" line with its stage timings
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+
+# --- METRICS (served on /metrics) ---
+FILTER_SECONDS = Histogram("filter_duration_seconds", "should_process_email, per email")
+EXTRACT_BATCH_SECONDS = Histogram("extract_batch_duration_seconds", "extract_booking_batch (regex + NLP), per batch")
+VALIDATE_BATCH_SECONDS = Histogram("validate_batch_duration_seconds", "Bulk booking validation, per batch")
+EMAILS_ACCEPTED = Counter("emails_accepted", "Emails the filter accepted", ["email_type"])
+EMAILS_REJECTED = Counter("emails_rejected", "Emails the filter rejected", ["stage", "reason"])
+BOOKINGS_EXTRACTED = Counter("bookings_extracted", "Validated bookings", ["email_type"])
+BOOKINGS_MERGED = Counter("bookings_merged", "Bookings folded into another one for the same reservation")
+VALIDATION_FAILURES = Counter("validation_failures", "Extractions that failed validation", ["email_type"])
+WINDOW_CHARS = Counter("body_window_chars", "Body characters of accepted emails kept for extraction or dropped", ["part"])
+CACHE_LOOKUPS = Counter("extraction_cache_lookups", "Extraction cache lookups per message", ["result"])
+
+# CPU workers load and warm the model first, even in a pool a request created before start_cpu_pool()
+set_cpu_initializer(warm_up)
+
+def _warm_up_process():
+    """Model + extractor regexes + compiled filter, then fork the CPU workers from this warm process."""
+    warm_up()
+    should_process_email("warmup@united.com", "Flight confirmation", "Your flight booking: departure JFK")
+    start_cpu_pool()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # NLP_MODE=eager: warm up in the background; /health answers right away, /ready once the model is loaded
+    warmup = asyncio.create_task(asyncio.to_thread(_warm_up_process)) if NLP_MODE == "eager" else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    _extraction_jobs.cancel_all()
+    shutdown_pools()
+
+app = FastAPI(title="Tripp Email Extractor", lifespan=lifespan)
 
 # --- REQUEST MODELS ---
 class ScanRequest(BaseModel):
     credentials_dict: dict
+    max_results: int = Field(10, ge=1, le=500)
 
 class SearchRequest(BaseModel):
     credentials_dict: dict
     query: str 
+    max_results: int = Field(10, ge=1, le=500)
+
+class StreamScanRequest(BaseModel):
+    credentials_dict: dict
+    query: Optional[str] = None          # None = the default booking scan
+    max_results: Optional[int] = None    # None = everything the query matches
+    page_size: int = Field(100, ge=1, le=500)
+    cursor: Optional[str] = None         # "cursor" from a previous stream's page event, to resume
+
+class SyncRequest(BaseModel):
+    credentials_dict: dict
+    max_results: int = Field(10, ge=1, le=500)  # only used when sync falls back to a full scan
+
+class BulkAccount(BaseModel):
+    credentials_dict: dict
+    account_id: Optional[str] = None     # echoed back in this account's events; defaults to its index
+
+class BulkScanRequest(BaseModel):
+    accounts: List[BulkAccount] = Field(..., min_length=1, max_length=BULK_MAX_ACCOUNTS)
+    query: Optional[str] = None          # None = the default booking scan
+    max_results: int = Field(10, ge=1, le=500)
+
+class IngestRequest(BaseModel):
+    paths: List[str] = Field(..., min_length=1)   # mbox / Maildir / .eml / .zip, relative to INGEST_ROOT
+    limit: Optional[int] = Field(None, ge=1)      # stop after this many messages
+
+class JobEmail(BaseModel):
+    id: str
+    sender: str = Field(..., alias="from")   # sender address, as in a Gmail From header
+    subject: str = ""
+    body: str
+    received_at: Optional[int] = None        # ms since the epoch; the freshest email wins when bookings merge
+
+class ExtractJobRequest(BaseModel):
+    emails: List[JobEmail] = Field(..., min_length=1, max_length=JOB_MAX_EMAILS)
 
 # --- HELPER (DRY Principle) ---
-def _process_and_validate(emails: list) -> List[BookingUnion]:
-    validated_bookings = []
+BOOKING_MODELS = {
+    'flight': FlightBooking,
+    'hotel': HotelBooking,
+    'event': EventBooking,
+}
+
+def _process_emails(emails: list) -> list:
+    """
+    Filter -> extract -> validate.
+    Returns one (email_id, booking, rejection_reason) per email: booking is None when the
+    filter rejected the email, rejection_reason is None when it was accepted.
+    """
+    results = []
+    traces = {}
 
+    # 1. Filter (cheap) before any NLP work
+    to_extract = []
     for email in emails:
+        start = time.perf_counter()
         should_process, email_type = should_process_email(email['from'], email['subject'], email['body'])
-        
+        elapsed = time.perf_counter() - start
+        FILTER_SECONDS.observe(elapsed)
+
         if should_process:
-            logger.info(f"Processing {email['id']} as {email_type}")
+            logger.debug(f"Processing {email['id']} as {email_type}")
+            EMAILS_ACCEPTED.labels(email_type).inc()
+            to_extract.append((email, email_type))
+        else:
+            logger.debug(f"Skipping {email['id']}")
+            EMAILS_REJECTED.labels("body", rejection_code(email_type)).inc()
+            results.append((email['id'], None, email_type))
+
+        if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+            traces[email['id']] = {"email_id": email['id'], "body_chars": len(email['body']),
+                                   "filter_ms": round(elapsed * 1000, 3), "filter": email_type}
+
+    # 2. Extract the whole batch at once (spaCy nlp.pipe), each email from its booking window only
+    start = time.perf_counter()
+    items = []
+    for email, email_type in to_extract:
+        window = window_body(email['body']).text
+        WINDOW_CHARS.labels("kept").inc(len(window))
+        WINDOW_CHARS.labels("dropped").inc(max(0, len(email['body']) - len(window)))
+        items.append((window, email_type, email['from']))
+    extracted = extract_booking_batch(items)
+    extract_elapsed = time.perf_counter() - start
+    if to_extract:
+        EXTRACT_BATCH_SECONDS.observe(extract_elapsed)
+
+    # 3. Add Metadata (Frontend needs these)
+    payloads, failed = [], []
+    for (email, email_type), raw_data in zip(to_extract, extracted):
+        if isinstance(raw_data, Exception):
+            failed.append((email, email_type, raw_data))
+            continue
+        raw_data['id'] = email['id']  # Required for duplicate detection
+        raw_data['source_email_id'] = email['id']
+        raw_data['source_email_ids'] = [email['id']]
+        raw_data['title'] = email['subject']
+        raw_data['received_at'] = email.get('received_at')  # the freshest email wins when bookings are merged
+        raw_data.setdefault('type', email_type if email_type in BOOKING_MODELS else 'unknown')
+        payloads.append((email, email_type, raw_data))
+
+    # 4. Validation: the whole batch in one TypeAdapter call, routed to its model by "type".
+    # Only if something in it is invalid do we go one by one, to tell which email failed.
+    start = time.perf_counter()
+    try:
+        validated = BookingListAdapter.validate_python([raw_data for _, _, raw_data in payloads])
+    except ValidationError:
+        validated = []
+        for email, email_type, raw_data in payloads:
             try:
-                # 1. Extract
-                raw_data = extract_booking_data(email['body'], email_type)
-                
-                # 2. Add Metadata (Frontend needs these)
-                raw_data['id'] = email['id']  # Required for duplicate detection
-                raw_data['source_email_id'] = email['id']
-                raw_data['title'] = email['subject'] 
-
-                # 3. Validation
-                if email_type == 'flight':
-                    booking = FlightBooking(**raw_data)
-                elif email_type == 'hotel':
-                    booking = HotelBooking(**raw_data)
-                elif email_type == 'event':
-                    booking = EventBooking(**raw_data)
+                validated.append(BookingAdapter.validate_python(raw_data))
+            except ValidationError as e:
+                validated.append(e)
+    validate_elapsed = time.perf_counter() - start
+    if payloads:
+        VALIDATE_BATCH_SECONDS.observe(validate_elapsed)
+
+    for (email, email_type, _), booking in zip(payloads, validated):
+        if isinstance(booking, Exception):
+            failed.append((email, email_type, booking))
+            continue
+        results.append((email['id'], booking, None))
+        BOOKINGS_EXTRACTED.labels(email_type).inc()
+
+    for email, email_type, e in failed:
+        logger.error(f"Validation failed for {email['id']}: {e}")
+        VALIDATION_FAILURES.labels(email_type).inc()
+        results.append((email['id'], UnknownBooking(
+            type="unknown",
+            id=email['id'],
+            source_email_id=email['id'],
+            warning=f"Validation Error: {str(e)}"
+        ), None))
+
+    for email, _ in to_extract:
+        if email['id'] in traces:
+            traces[email['id']].update({"extract_batch_ms": round(extract_elapsed * 1000, 3),
+                                        "extract_batch_size": len(to_extract),
+                                        "validate_batch_ms": round(validate_elapsed * 1000, 3)})
+
+    for trace in traces.values():
+        logger.info(f"trace {json.dumps(trace)}")
+    return results
+
+def _process_and_validate(emails: list) -> List[BookingUnion]:
+    by_id = {email_id: booking for email_id, booking, _ in _process_emails(emails)}
+    return _dedup([by_id[email['id']] for email in emails if by_id.get(email['id']) is not None])
+
+def _dedup(bookings: List[BookingUnion]) -> List[BookingUnion]:
+    if not DEDUP_BOOKINGS:
+        return bookings
+    merged = dedup_bookings(bookings)
+    if len(merged) < len(bookings):
+        BOOKINGS_MERGED.inc(len(bookings) - len(merged))
+    return merged
+
+def _finish_extraction_job(emails: list, processed: list) -> dict:
+    by_id = {email_id: booking for email_id, booking, _ in processed}
+    bookings = [by_id[email['id']] for email in emails if by_id.get(email['id']) is not None]
+    return {"bookings": _dedup(bookings), "rejected": sum(1 for _, booking, _ in processed if booking is None)}
+
+# Chunks of every job run on the CPU pool, _process_emails in the workers
+_extraction_jobs = ExtractionJobQueue(_process_emails, _finish_extraction_job)
+
+def _booking_from_cache(entry) -> Union[BookingUnion, None]:
+    if entry.verdict != VERDICT_BOOKING:
+        return None
+    return BookingAdapter.validate_python(entry.payload)
+
+# --- ENDPOINTS ---
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up. Also reports model state (failed loads show up here)."""
+    return {"status": "ok", "nlp": get_nlp_status(), "pending_scans": pending_scans()}
+
+# Read only when /metrics is scraped
+Gauge("pending_scans", "Scans currently admitted", pending_scans)
+Gauge("nlp_model_ready", "1 once the spaCy model is loaded", lambda: int(get_nlp_status()["state"] == "ready"))
+Gauge("gmail_client_pool_size", "Cached per-account Gmail clients", lambda: get_client_pool().stats()["size"])
+Gauge("gmail_quota_units_granted", "Quota units spent by bulk scans", lambda: get_quota_limiter().stats()["units_granted"])
+Gauge("extraction_jobs_unfinished", "Extraction jobs queued or running", lambda: _extraction_jobs.unfinished())
+Gauge("extraction_cache_entries", "Rows in the extraction cache",
+      lambda: get_extraction_cache().stats()["entries"] if get_extraction_cache() else 0)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format. Stage latencies from CPU pool workers are merged in after every task."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+async def ready(response: Response):
+    """
+    Readiness: in eager mode, 503 until the model is loaded (and while it failed to load) and the
+    CPU workers were forked from the warm process.
+    """
+    nlp = get_nlp_status()
+    is_ready = nlp["mode"] != "eager" or (nlp["state"] == "ready" and cpu_pool_started())
+    if not is_ready:
+        response.status_code = 503
+    return {"ready": is_ready, "nlp": nlp, "cpu_pool_started": cpu_pool_started()}
+
+# Gmail I/O runs on a thread pool and extraction on a process pool (services/worker_pools.py),
+# so one slow scan never blocks the event loop for other users.
+
+def _new_fetch_stats() -> dict:
+    return {
+        "listed": 0, "cache_hits": 0,
+        "metadata_messages": 0, "skipped_untrusted_sender": 0, "skipped_spam_subject": 0,
+        "full_messages": 0,
+    }
+
+async def _run_pipeline(account: str, service, http_factory, msg_ids: list, stats: Optional[dict] = None,
+                        failed: Optional[list] = None) -> List[BookingUnion]:
+    """
+    Bookings of msg_ids, in order. account (credentials_key) scopes the extraction cache.
+    Ids that could not be downloaded are appended to failed, if given.
+    """
+    stats = stats if stats is not None else _new_fetch_stats()
+    stats["listed"] += len(msg_ids)
+
+    # Messages we already processed (services/extraction_cache.py) are neither downloaded nor extracted again
+    cache = get_extraction_cache()
+    cached = await run_io(cache.get_many, account, msg_ids) if cache else {}
+    misses = [msg_id for msg_id in msg_ids if msg_id not in cached]
+    stats["cache_hits"] += len(cached)
+    if cache:
+        CACHE_LOOKUPS.labels("hit").inc(len(cached))
+        CACHE_LOOKUPS.labels("miss").inc(len(misses))
+
+    # Stage 1: headers only. Untrusted senders and spam subjects never get their body downloaded.
+    rejected = []
+    if GMAIL_METADATA_PREFILTER and misses:
+        survivors = []
+        for header in await run_io(fetch_message_headers, service, misses, http_factory=http_factory, stats=stats,
+                                   failed=failed):
+            worth_fetching, reason = should_fetch_email(header['from'], header['subject'])
+            if worth_fetching:
+                survivors.append(header['id'])
+            else:
+                rejected.append((header['id'], None, reason))
+                stats["skipped_untrusted_sender" if reason.startswith("Untrusted") else "skipped_spam_subject"] += 1
+                EMAILS_REJECTED.labels("metadata", rejection_code(reason)).inc()
+        misses = survivors
+
+    # Stage 2: full bodies -> filter -> extract -> validate
+    emails = await run_io(fetch_messages, service, misses, http_factory=http_factory, stats=stats, failed=failed)
+    processed = await run_cpu(_process_emails, emails)
+
+    if cache:
+        bodies = {email['id']: email['body'] for email in emails}
+        await run_io(cache.put_many, account, [
+            (email_id, bodies.get(email_id), VERDICT_BOOKING, booking.model_dump()) if booking is not None
+            else (email_id, bodies.get(email_id), VERDICT_REJECTED, reason)
+            for email_id, booking, reason in processed + rejected
+        ])
+
+    bookings = {email_id: booking for email_id, booking, _ in processed}
+    bookings.update({msg_id: _booking_from_cache(entry) for msg_id, entry in cached.items()})
+    return [bookings[msg_id] for msg_id in msg_ids if bookings.get(msg_id) is not None]
+
+async def _interactive_service(credentials_dict: dict):
+    """
+    (service, http_factory) for /scan, /search, /sync and /scan/stream: rate-limited calls, batch
+    sub-requests included, are retried with backoff (services/gmail_quota.py) instead of silently
+    dropping messages. No limiter: only bulk scans spend from the shared quota budget.
+    """
+    service, http_factory = await run_io(build_gmail_service, credentials_dict)
+    return MeteredGmailService(service, None, credentials_key(credentials_dict)), http_factory
+
+async def _scan(credentials_dict: dict, custom_query, max_results: int = 10, stats: Optional[dict] = None):
+    async with admission():
+        service, http_factory = await _interactive_service(credentials_dict)
+        msg_ids = await run_io(list_message_ids, service, max_results=max_results, custom_query=custom_query)
+        return _dedup(await _run_pipeline(credentials_key(credentials_dict), service, http_factory, msg_ids, stats))
+
+def _ndjson(event: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(event, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(event, default=str) + "\n").encode("utf-8")
+
+def _bookings_response(bookings: List[BookingUnion], headers: dict) -> Response:
+    """
+    The bookings are validated models already: serialize them to JSON in one pass instead of letting
+    FastAPI validate them again against response_model (kept on the routes for the OpenAPI schema).
+    """
+    return Response(BookingListAdapter.dump_json(bookings), media_type="application/json", headers=headers)
+
+async def _stream_scan(request: StreamScanRequest):
+    """
+    Page through the mailbox and push each page through cache -> fetch -> filter -> extract -> validate,
+    yielding NDJSON events as soon as a page is done. Only one page is held in memory at a time.
+
+    Events:
+      {"event": "booking", "booking": {...}}
+      {"event": "booking", "booking": {...}, "replaces": "<id>"}
+          a later page had more emails for a booking already sent, so it is sent again, merged
+          (extractors/dedup.py). Same id: update it. "replaces": its id changed from that one.
+      {"event": "page", "scanned": n, "cursor": "<token or null>"}   (pass cursor back to resume)
+      {"event": "done", "scanned": n, "bookings": n, "fetch_stats": {...}}
+      {"event": "error", "detail": "..."}
+    """
+    scanned = found = 0
+    stats = _new_fetch_stats()
+    merger = BookingMerger() if DEDUP_BOOKINGS else None
+    sent = {}  # dedup group -> id of the booking last sent for it
+    try:
+        async with admission():
+            service, http_factory = await _interactive_service(request.credentials_dict)
+            account = credentials_key(request.credentials_dict)
+            pages = iter_message_id_pages(
+                service, request.query, page_size=request.page_size,
+                page_token=request.cursor, max_results=request.max_results
+            )
+            while True:
+                page = await run_io(next, pages, None)
+                if page is None:
+                    break
+                msg_ids, cursor = page
+                bookings = await _run_pipeline(account, service, http_factory, msg_ids, stats)
+                if merger is None:
+                    for booking in bookings:
+                        found += 1
+                        yield _ndjson({"event": "booking", "booking": booking.model_dump()})
                 else:
-                    booking = UnknownBooking(**raw_data)
-                
-                validated_bookings.append(booking)
+                    touched = {}
+                    for booking in bookings:
+                        key, is_new = merger.add(booking)
+                        touched[key] = None
+                        if not is_new:
+                            BOOKINGS_MERGED.inc()
+                    for key in touched:
+                        booking = merger.merged(key)
+                        event = {"event": "booking", "booking": booking.model_dump()}
+                        if key in sent and sent[key] != booking.id:
+                            event["replaces"] = sent[key]
+                        sent[key] = booking.id
+                        yield _ndjson(event)
+                    found = len(sent)
+                scanned += len(msg_ids)
+                yield _ndjson({"event": "page", "scanned": scanned, "cursor": cursor})
+        yield _ndjson({"event": "done", "scanned": scanned, "bookings": found, "fetch_stats": stats})
+    except Exception as e:
+        logger.error(f"Error in /scan/stream: {e}")
+        _forget_revoked_client(request.credentials_dict, e)
+        yield _ndjson({"event": "error", "detail": str(e)})
+
+async def _scan_account(account: BulkAccount, query: Optional[str], max_results: int):
+    """One account of a bulk scan. Every Gmail call spends from the shared quota budget."""
+    service, http_factory = await run_io(build_gmail_service, account.credentials_dict)
+    key = credentials_key(account.credentials_dict)
+    metered = MeteredGmailService(service, get_quota_limiter(), key)
+    stats = _new_fetch_stats()
+    msg_ids = await run_io(list_message_ids, metered, max_results=max_results, custom_query=query)
+    bookings = _dedup(await _run_pipeline(key, metered, http_factory, msg_ids, stats))
+    stats["retries"] = metered.retries
+    return bookings, stats
+
+async def _bulk_scan(request: BulkScanRequest):
+    """
+    Scan many accounts, BULK_ACCOUNT_CONCURRENCY at a time, under one Gmail quota budget
+    (services/gmail_quota.py). Events are yielded as each account finishes:
 
+      {"event": "account", "account_id": "...", "bookings": [...], "fetch_stats": {...}}
+      {"event": "account_error", "account_id": "...", "detail": "..."}
+      {"event": "done", "accounts": n, "succeeded": n, "failed": n, "bookings": n, "quota": {...}}
+      {"event": "error", "detail": "..."}
+    """
+    semaphore = asyncio.Semaphore(BULK_ACCOUNT_CONCURRENCY)
+
+    async def _one(index: int, account: BulkAccount) -> dict:
+        account_id = account.account_id or str(index)
+        async with semaphore:
+            try:
+                bookings, stats = await _scan_account(account, request.query, request.max_results)
             except Exception as e:
-                logger.error(f"Validation failed for {email['id']}: {e}")
-                validated_bookings.append(UnknownBooking(
-                    type="unknown",
-                    id=email['id'],
-                    source_email_id=email['id'], 
-                    warning=f"Validation Error: {str(e)}"
-                ))
-        else:
-            logger.debug(f"Skipping {email['id']}")
+                logger.error(f"Error in /scan/bulk for account {account_id}: {e}")
+                _forget_revoked_client(account.credentials_dict, e)
+                return {"event": "account_error", "account_id": account_id, "detail": str(e)}
+        return {
+            "event": "account", "account_id": account_id,
+            "bookings": [booking.model_dump() for booking in bookings], "fetch_stats": stats,
+        }
 
-    return validated_bookings
+    succeeded = failed = found = 0
+    try:
+        # One admission slot for the whole bulk scan; BULK_ACCOUNT_CONCURRENCY bounds it from there
+        async with admission():
+            tasks = [asyncio.create_task(_one(i, account)) for i, account in enumerate(request.accounts)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    event = await next_done
+                    if event["event"] == "account":
+                        succeeded += 1
+                        found += len(event["bookings"])
+                    else:
+                        failed += 1
+                    yield _ndjson(event)
+            finally:
+                for task in tasks:
+                    task.cancel()  # client went away: don't start the accounts still waiting
+        yield _ndjson({
+            "event": "done", "accounts": len(request.accounts), "succeeded": succeeded, "failed": failed,
+            "bookings": found, "quota": get_quota_limiter().stats(),
+        })
+    except Exception as e:
+        logger.error(f"Error in /scan/bulk: {e}")
+        yield _ndjson({"event": "error", "detail": str(e)})
 
-# --- ENDPOINTS ---
+async def _sync(credentials_dict: dict, max_results: int, stats: Optional[dict] = None):
+    """
+    Returns (bookings, mode, new_history_id). The historyId is only saved once processing succeeded,
+    with the messages that could not be downloaded: those are fetched again first on the next sync.
+    """
+    async with admission():
+        service, http_factory = await _interactive_service(credentials_dict)
+        profile = await run_io(get_profile, service)
+        account = profile['emailAddress']
+
+        store = get_sync_state_store()
+        last_history_id = await run_io(store.get_history_id, account)
+        msg_ids, new_history_id, mode = await run_io(
+            sync_message_ids, service, last_history_id, profile['historyId'], max_results
+        )
+        retry_ids = await run_io(store.get_retry_ids, account)
+        if retry_ids:
+            pending = set(retry_ids)
+            msg_ids = retry_ids + [msg_id for msg_id in msg_ids if msg_id not in pending]
+        logger.info(f"/sync for {account}: {mode}, {len(msg_ids)} messages ({len(retry_ids)} retried)")
+
+        failed = []
+        bookings = _dedup(await _run_pipeline(credentials_key(credentials_dict), service, http_factory, msg_ids,
+                                              stats, failed))
+        await run_io(store.set_history_id, account, new_history_id, failed)
+        return bookings, mode, new_history_id
+
+def _fetch_stats_headers(stats: dict) -> dict:
+    """Per-stage message counts (metadata pre-filter vs. full download) for the caller."""
+    return {"X-Fetch-Stats": json.dumps(stats)}
+
+def _forget_revoked_client(credentials_dict: dict, e: Exception):
+    """A refresh token that was revoked (or expired) keeps failing: drop its pooled Gmail client."""
+    if isinstance(e, RefreshError) or http_status(e) == 401:
+        get_client_pool().evict(credentials_dict)
+
+def _overloaded(e: OverloadedError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 @app.post("/scan", response_model=List[BookingUnion])
 async def scan_emails(request: ScanRequest):
     try:
-        emails = fetch_recent_booking_emails(request.credentials_dict, max_results=10, custom_query=None)
-        return _process_and_validate(emails)
+        stats = _new_fetch_stats()
+        bookings = await _scan(request.credentials_dict, custom_query=None, max_results=request.max_results, stats=stats)
+        return _bookings_response(bookings, _fetch_stats_headers(stats))
+    except OverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error in /scan: {e}")
+        _forget_revoked_client(request.credentials_dict, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/search", response_model=List[BookingUnion])
 async def search_emails(request: SearchRequest):
     try:
-        emails = fetch_recent_booking_emails(request.credentials_dict, max_results=10, custom_query=request.query)
-        return _process_and_validate(emails)
+        stats = _new_fetch_stats()
+        bookings = await _scan(request.credentials_dict, custom_query=request.query, max_results=request.max_results, stats=stats)
+        return _bookings_response(bookings, _fetch_stats_headers(stats))
+    except OverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error in /search: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        _forget_revoked_client(request.credentials_dict, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/sync", response_model=List[BookingUnion])
+async def sync_emails(request: SyncRequest):
+    """
+    Incremental scan: only messages added since the last /sync for this account
+    (Gmail historyId). The first call, or one after the history expired, runs a full scan.
+    """
+    try:
+        stats = _new_fetch_stats()
+        bookings, mode, history_id = await _sync(request.credentials_dict, request.max_results, stats)
+        headers = _fetch_stats_headers(stats)
+        headers["X-Sync-Mode"] = mode
+        headers["X-History-Id"] = str(history_id)
+        return _bookings_response(bookings, headers)
+    except OverloadedError as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Error in /sync: {e}")
+        _forget_revoked_client(request.credentials_dict, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scan/stream")
+async def stream_scan_emails(request: StreamScanRequest):
+    """Paginated scan over the whole query window, streamed back as NDJSON (see _stream_scan)."""
+    return StreamingResponse(_stream_scan(request), media_type="application/x-ndjson")
+
+@app.post("/jobs/extract", status_code=202)
+async def submit_extraction_job(request: ExtractJobRequest):
+    """
+    Queue emails you already have (id, from, subject, body) for filter -> extract -> validate on the
+    CPU worker processes. Returns the job id at once; poll GET /jobs/{job_id} for the bookings.
+    """
+    try:
+        async with admission():  # turned away like a scan while the server is saturated
+            job = _extraction_jobs.submit([email.model_dump(by_alias=True) for email in request.emails])
+    except OverloadedError as e:
+        raise _overloaded(e)
+    return job.status()
+
+@app.get("/jobs/{job_id}")
+async def get_extraction_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """Job state; "bookings" and "rejected" once it is done. wait=N holds the request up to N seconds for it to finish."""
+    job = _extraction_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job {job_id}")
+    job = await _extraction_jobs.wait(job, wait)
+    status = job.status()
+    if job.result is not None:
+        status["bookings"] = BookingListAdapter.dump_python(job.result["bookings"], mode="json")
+        status["rejected"] = job.result["rejected"]
+    return status
+
+def _ingest_paths(paths: List[str]) -> List[str]:
+    if not INGEST_ROOT:
+        raise HTTPException(status_code=403, detail="/ingest is disabled (set INGEST_ROOT)")
+    root = os.path.realpath(INGEST_ROOT)
+    resolved = []
+    for path in paths:
+        full = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full]) != root:
+            raise HTTPException(status_code=403, detail=f"{path} is outside INGEST_ROOT")
+        if not os.path.exists(full):
+            raise HTTPException(status_code=404, detail=f"{path} not found")
+        resolved.append(full)
+    return resolved
+
+async def _ingest(paths: List[str], limit: Optional[int]):
+    """
+    Run archives on this server through the CPU pool (services/offline_ingest.py), a few
+    chunks per worker in flight, and stream one booking per accepted email as NDJSON:
+
+      {"event": "booking", "booking": {...}}
+      {"event": "progress", "messages": n, "bookings": n}
+      {"event": "done", "messages": n, "unreadable": n, "rejected": n, "bookings": n, "seconds": s}
+      {"event": "error", "detail": "..."}
+    """
+    totals = {"messages": 0, "unreadable": 0, "rejected": 0, "bookings": 0}
+    start = time.perf_counter()
+    refs = iter_message_refs(paths)
+    if limit:
+        refs = (ref for _, ref in zip(range(limit), refs))
+    chunks = chunked(refs)
+    in_flight = set()
+    try:
+        async with admission():
+            while True:
+                while len(in_flight) < 2 * max(1, CPU_POOL_SIZE):
+                    chunk = await run_io(next, chunks, None)
+                    if chunk is None:
+                        break
+                    in_flight.add(asyncio.create_task(run_cpu(ingest_chunk, chunk, _process_emails)))
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    for booking in result["bookings"]:
+                        yield b'{"event":"booking","booking":' + booking.encode("utf-8") + b'}\n'
+                    for key in ("messages", "unreadable", "rejected"):
+                        totals[key] += result[key]
+                    totals["bookings"] += len(result["bookings"])
+                    yield _ndjson({"event": "progress", "messages": totals["messages"], "bookings": totals["bookings"]})
+        yield _ndjson({"event": "done", **totals, "seconds": round(time.perf_counter() - start, 3)})
+    except Exception as e:
+        logger.error(f"Error in /ingest: {e}")
+        yield _ndjson({"event": "error", "detail": str(e)})
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+@app.post("/ingest")
+async def ingest_archives(request: IngestRequest):
+    """Offline replay of mbox / Maildir / EML / Takeout archives under INGEST_ROOT, streamed as NDJSON (see _ingest)."""
+    return StreamingResponse(_ingest(_ingest_paths(request.paths), request.limit), media_type="application/x-ndjson")
+
+@app.post("/scan/bulk")
+async def bulk_scan_emails(request: BulkScanRequest):
+    """Scan many accounts under a shared Gmail quota budget, results streamed per account as NDJSON (see _bulk_scan)."""
+    return StreamingResponse(_bulk_scan(request), media_type="application/x-ndjson")
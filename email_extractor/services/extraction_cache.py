@@ -0,0 +1,217 @@
+# services/extraction_cache.py
+"""
+Persistent cache of extraction results, keyed by account and Gmail message ID.
+
+Gmail messages are immutable, so once a message has been filtered and extracted
+we never need to download or parse it again. Each row stores either the
+validated booking (as a JSON dict) or the filter's rejection reason, plus the
+EXTRACTOR_VERSION that produced it; rows from another version count as misses.
+Message IDs are only unique within a mailbox, so every lookup is scoped to the
+account (services.gmail_clients.credentials_key) that asked.
+
+Eviction (expired rows, old versions, least recently used above max_entries)
+runs every EXTRACTION_CACHE_EVICT_EVERY written rows, not on every write: the
+table may hold that many rows over max_entries in between.
+
+Storage is a single SQLite file (WAL mode), so it survives restarts and can be
+shared by the API process and the CPU pool workers.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from extractors.booking_extractor import EXTRACTOR_VERSION
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.sqlite3")
+EXTRACTION_CACHE_TTL_DAYS = float(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "45"))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "100000"))
+EXTRACTION_CACHE_EVICT_EVERY = int(os.getenv("EXTRACTION_CACHE_EVICT_EVERY", "1000"))
+
+VERDICT_BOOKING = "booking"
+VERDICT_REJECTED = "rejected"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    account           TEXT NOT NULL,
+    message_id        TEXT NOT NULL,
+    body_hash         TEXT,
+    extractor_version TEXT NOT NULL,
+    verdict           TEXT NOT NULL,
+    payload           TEXT,
+    created_at        REAL NOT NULL,
+    last_access       REAL NOT NULL,
+    PRIMARY KEY (account, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_access ON extraction_cache (last_access);
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_created_at ON extraction_cache (created_at);
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_version ON extraction_cache (extractor_version);
+"""
+
+
+def body_hash(body: str) -> str:
+    return hashlib.sha256((body or "").encode("utf-8")).hexdigest()
+
+
+class CachedResult:
+    """One cache row: a booking dict (verdict "booking") or a rejection reason (verdict "rejected")."""
+    __slots__ = ("message_id", "verdict", "payload")
+
+    def __init__(self, message_id: str, verdict: str, payload):
+        self.message_id = message_id
+        self.verdict = verdict
+        self.payload = payload
+
+
+class ExtractionCache:
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH, ttl_days: float = EXTRACTION_CACHE_TTL_DAYS,
+                 max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES, version: str = EXTRACTOR_VERSION,
+                 evict_every: int = EXTRACTION_CACHE_EVICT_EVERY):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+        self.version = version
+        self.evict_every = max(1, evict_every)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0, "evictions": 0}
+        self._writes_since_eviction = 0
+        conn = self._conn()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(extraction_cache)")]
+        if columns and "account" not in columns:
+            with conn:
+                conn.execute("DROP TABLE extraction_cache")  # keyed by message ID alone: not safe to keep
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so each I/O thread opens its own.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def get_many(self, account: str, message_ids: Iterable[str],
+                 body_hashes: Optional[Dict[str, str]] = None) -> Dict[str, CachedResult]:
+        """
+        Look up several messages of one account at once. Returns only the fresh hits.
+        If body_hashes is given, a row whose stored hash differs is treated as a miss.
+        """
+        ids = list(dict.fromkeys(message_ids))
+        if not ids:
+            return {}
+
+        now = time.time()
+        rows = []
+        conn = self._conn()
+        for start in range(0, len(ids), 500):  # stay under SQLite's bound-parameter limit
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows += conn.execute(
+                f"SELECT message_id, body_hash, extractor_version, verdict, payload, created_at "
+                f"FROM extraction_cache WHERE account = ? AND message_id IN ({placeholders})", [account] + chunk
+            ).fetchall()
+
+        hits = {}
+        stale = 0
+        for message_id, stored_hash, version, verdict, payload, created_at in rows:
+            if version != self.version or now - created_at > self.ttl_seconds:
+                stale += 1
+                continue
+            if body_hashes and message_id in body_hashes and stored_hash and stored_hash != body_hashes[message_id]:
+                stale += 1
+                continue
+            hits[message_id] = CachedResult(message_id, verdict, json.loads(payload) if payload else None)
+
+        if hits:
+            with conn:
+                conn.executemany("UPDATE extraction_cache SET last_access = ? WHERE account = ? AND message_id = ?",
+                                 [(now, account, message_id) for message_id in hits])
+        self._count("hits", len(hits))
+        self._count("misses", len(ids) - len(hits))
+        self._count("stale", stale)
+        return hits
+
+    def put_many(self, account: str, entries: Iterable[tuple]):
+        """
+        Store results of one account. Each entry is (message_id, body, verdict, payload) where payload
+        is the booking dict for VERDICT_BOOKING or the rejection reason for VERDICT_REJECTED.
+        """
+        now = time.time()
+        rows = [
+            (account, message_id, body_hash(body) if body is not None else None, self.version, verdict,
+             json.dumps(payload, default=str), now, now)
+            for message_id, body, verdict, payload in entries
+        ]
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO extraction_cache "
+                "(account, message_id, body_hash, extractor_version, verdict, payload, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        self._count("writes", len(rows))
+        with self._lock:
+            self._writes_since_eviction += len(rows)
+            due = self._writes_since_eviction >= self.evict_every
+            if due:
+                self._writes_since_eviction = 0
+        if due:
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired / old-version rows, then least-recently-used rows above max_entries."""
+        with conn:
+            # Range conditions, not "!=": each delete is an index range scan instead of a full table scan
+            removed = conn.execute("DELETE FROM extraction_cache WHERE created_at < ?",
+                                   (now - self.ttl_seconds,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM extraction_cache WHERE extractor_version < ? OR extractor_version > ?",
+                (self.version, self.version)
+            ).rowcount
+            overflow = conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                removed += conn.execute(
+                    "DELETE FROM extraction_cache WHERE rowid IN "
+                    "(SELECT rowid FROM extraction_cache ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                ).rowcount
+        if removed:
+            self._count("evictions", removed)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM extraction_cache")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = self._conn().execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+        return stats
+
+
+_cache = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Process-wide cache instance, or None when EXTRACTION_CACHE_ENABLED is off."""
+    global _cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
@@ -0,0 +1,157 @@
+# services/extraction_jobs.py
+"""
+Extraction jobs: submit emails, get a job id back at once, poll for the bookings.
+
+A job is split into chunks of JOB_CHUNK_SIZE emails for the CPU pool
+(services/worker_pools.py), so one large job keeps every worker process busy,
+each with its own loaded spaCy model, instead of a single core. At most
+JOB_MAX_INFLIGHT_CHUNKS chunks, of all jobs together, are in the pool at once
+(default: one per worker): the pool's queue is first in, first out, and a job
+handing it all its chunks would hold every interactive scan behind them. Chunks
+wait for a slot in submission order; a job is "queued" until one of its chunks
+has one. When a chunk fails, the job's other chunks are cancelled.
+
+Jobs live in memory, on the event loop thread only: no locks. Finished jobs are
+kept JOB_RESULT_TTL seconds for polling. At most MAX_QUEUED_JOBS jobs, holding
+MAX_QUEUED_JOB_EMAILS emails together, may be unfinished at once; submitting
+more raises OverloadedError (a 503, like scans).
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from services.worker_pools import CPU_POOL_SIZE, OverloadedError, run_cpu
+
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "64"))
+JOB_MAX_INFLIGHT_CHUNKS = int(os.getenv("JOB_MAX_INFLIGHT_CHUNKS", str(max(1, CPU_POOL_SIZE))))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "256"))
+MAX_QUEUED_JOB_EMAILS = int(os.getenv("MAX_QUEUED_JOB_EMAILS", "100000"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job:
+    def __init__(self, emails: list):
+        self.id = uuid.uuid4().hex
+        self.state = QUEUED
+        self.emails = emails
+        self.total = len(emails)
+        self.processed = 0
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.finished = asyncio.Event()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+    def status(self) -> dict:
+        return {
+            "job_id": self.id, "state": self.state, "emails": self.total, "processed": self.processed,
+            "submitted_at": self.submitted_at, "finished_at": self.finished_at, "error": self.error,
+        }
+
+
+class ExtractionJobQueue:
+    """
+    process_chunk(emails) runs in a worker process (module-level, picklable) and returns
+    a list; finish(emails, results of every chunk, concatenated) runs on the event loop
+    and returns the job's result.
+    """
+
+    def __init__(self, process_chunk: Callable[[list], list], finish: Callable[[list, list], object],
+                 chunk_size: int = JOB_CHUNK_SIZE, ttl: float = JOB_RESULT_TTL, max_jobs: int = MAX_QUEUED_JOBS,
+                 max_inflight_chunks: int = JOB_MAX_INFLIGHT_CHUNKS, max_emails: int = MAX_QUEUED_JOB_EMAILS):
+        self.process_chunk = process_chunk
+        self.finish = finish
+        self.chunk_size = max(1, chunk_size)
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_inflight_chunks = max(1, max_inflight_chunks)
+        self.max_emails = max_emails
+        self._jobs = OrderedDict()  # job id -> Job, in submission order
+        self._tasks = {}
+        self._slots = self._slots_loop = None  # chunk slots, an asyncio.Semaphore of the running loop
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.is_finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def unfinished(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def _unfinished_emails(self) -> int:
+        return sum(job.total for job in self._jobs.values() if not job.is_finished)
+
+    def submit(self, emails: list) -> Job:
+        """Queue a job for these email dicts; returns right away."""
+        self._evict()
+        if self.unfinished() >= self.max_jobs:
+            raise OverloadedError(f"Too many extraction jobs in progress ({self.max_jobs}), retry shortly")
+        if self._unfinished_emails() + len(emails) > self.max_emails:
+            raise OverloadedError(f"Too many emails queued for extraction (max {self.max_emails}), retry shortly")
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots, self._slots_loop = asyncio.Semaphore(self.max_inflight_chunks), loop
+        job = Job(emails)
+        self._jobs[job.id] = job
+        task = loop.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._evict()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        """Return once the job finished, or after timeout seconds, whichever comes first."""
+        if timeout > 0 and not job.is_finished:
+            try:
+                await asyncio.wait_for(job.finished.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def _run_chunk(self, job: Job, chunk: list) -> list:
+        async with self._slots:
+            if job.error is not None:
+                return []  # a sibling chunk failed while this one waited: the job is over
+            job.state = RUNNING
+            try:
+                results = await run_cpu(self.process_chunk, chunk)
+            except Exception as e:
+                job.error = str(e)
+                raise
+        job.processed += len(chunk)
+        return results
+
+    async def _run(self, job: Job):
+        chunk_tasks = []
+        try:
+            chunks = [job.emails[i:i + self.chunk_size] for i in range(0, job.total, self.chunk_size)]
+            chunk_tasks = [asyncio.ensure_future(self._run_chunk(job, chunk)) for chunk in chunks]
+            per_chunk: List[list] = await asyncio.gather(*chunk_tasks)
+            job.result = self.finish(job.emails, [item for results in per_chunk for item in results])
+            job.state = DONE
+        except Exception as e:
+            job.error = job.error or str(e)
+            job.state = FAILED
+        finally:
+            for task in chunk_tasks:
+                task.cancel()  # a failed (or cancelled) job gives its slots back at once
+            job.emails = None  # the bodies are the bulk of a job's memory; only the result is kept
+            job.finished_at = time.time()
+            job.finished.set()
+
+    def cancel_all(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
@@ -0,0 +1,231 @@
+# services/fake_gmail_service.py
+"""
+Offline stand-in for the Gmail discovery client returned by
+googleapiclient.discovery.build('gmail', 'v1').
+
+Only the calls our pipeline makes are implemented. Every execute() counts as one
+HTTP round trip and can sleep for `latency` seconds, so tests and benchmarks can
+see the difference between fetch modes without touching the network.
+"""
+import base64
+import threading
+import time
+
+_ATTACHMENTS = '_attachments'  # attachment id -> data, kept on the message; never returned by messages.get
+
+
+def make_message(msg_id, sender, subject, body, mime_type='text/plain', internal_date=None, as_attachment=False):
+    """
+    Build a Gmail message resource the way users.messages.get returns it.
+    as_attachment: the body only as an attachmentId, like Gmail does for large bodies
+    (messages.attachments.get returns it).
+    """
+    data = base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii')
+    part_body = {'size': len(body), 'data': data}
+    message = {
+        'id': msg_id,
+        'threadId': msg_id,
+        'payload': {
+            'mimeType': 'multipart/alternative',
+            'headers': [
+                {'name': 'From', 'value': sender},
+                {'name': 'Subject', 'value': subject},
+            ],
+            'parts': [
+                {'mimeType': mime_type, 'headers': [], 'body': part_body},
+            ],
+        },
+    }
+    if as_attachment:
+        part_body['attachmentId'] = attachment_id = f"att-{msg_id}"
+        message[_ATTACHMENTS] = {attachment_id: part_body.pop('data')}
+    if internal_date is not None:
+        message['internalDate'] = str(internal_date)  # ms since the epoch, as a string like Gmail's
+    return message
+
+
+class FakeHttpError(Exception):
+    """Mimics googleapiclient.errors.HttpError (fail_ids, expired historyId ...)."""
+
+    def __init__(self, status, what):
+        super().__init__(f"<HttpError {status} for {what}>")
+        self.status_code = status
+
+
+class _Request:
+    def __init__(self, service, fn):
+        self._service = service
+        self._fn = fn
+
+    def execute(self, http=None, num_retries=0):
+        self._service._round_trip()
+        self._service._throttle()
+        return self._fn()
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, http=None):
+        # One round trip for the whole batch; sub-requests run without extra latency.
+        self._service._round_trip()
+        for request_id, request, callback in self._requests:
+            try:
+                self._service._throttle()
+                response, exception = request._fn(), None
+            except Exception as e:
+                response, exception = None, e
+            callback(request_id, response, exception)
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', q=None, maxResults=100, pageToken=None, **kwargs):
+        def _list():
+            ids = self._service.message_ids
+            start = int(pageToken or 0)
+            end = start + maxResults
+            result = {
+                'messages': [{'id': i, 'threadId': i} for i in ids[start:end]],
+                'resultSizeEstimate': len(ids),
+            }
+            if end < len(ids):
+                result['nextPageToken'] = str(end)
+            return result
+        return _Request(self._service, _list)
+
+    def get(self, userId='me', id=None, format='full', metadataHeaders=None, **kwargs):
+        def _get():
+            if id in self._service.fail_ids:
+                raise FakeHttpError(500, f"message {id}")
+            message = self._service.messages[id]
+            if format == 'metadata':
+                wanted = set(metadataHeaders or [])
+                payload = message['payload']
+                return {
+                    'id': message['id'],
+                    'threadId': message['threadId'],
+                    **({'internalDate': message['internalDate']} if 'internalDate' in message else {}),
+                    'payload': {
+                        'mimeType': payload['mimeType'],
+                        'headers': [h for h in payload['headers'] if not wanted or h['name'] in wanted],
+                    },
+                }
+            return {k: v for k, v in message.items() if k != _ATTACHMENTS}
+        return _Request(self._service, _get)
+
+    def attachments(self):
+        return _Attachments(self._service)
+
+
+class _Attachments:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, userId='me', messageId=None, id=None, **kwargs):
+        def _get():
+            data = self._service.messages[messageId].get(_ATTACHMENTS, {}).get(id)
+            if data is None:
+                raise FakeHttpError(404, f"attachment {id} of message {messageId}")
+            return {'size': len(data), 'data': data}
+        return _Request(self._service, _get)
+
+
+class _History:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', startHistoryId=None, historyTypes=None, pageToken=None, maxResults=100, **kwargs):
+        def _list():
+            service = self._service
+            start = int(startHistoryId)
+            if start < service.oldest_history_id:
+                raise FakeHttpError(404, f"startHistoryId {startHistoryId}")
+            added = [(h, m) for h, m in service.added_history if h > start]
+            offset = int(pageToken or 0)
+            page = added[offset:offset + maxResults]
+            result = {'historyId': str(service.history_id)}
+            if page:
+                result['history'] = [
+                    {'id': str(h), 'messagesAdded': [{'message': {'id': m['id'], 'threadId': m['id'],
+                                                                  'labelIds': m.get('labelIds', ['INBOX'])}}]}
+                    for h, m in page
+                ]
+            if offset + maxResults < len(added):
+                result['nextPageToken'] = str(offset + maxResults)
+            return result
+        return _Request(self._service, _list)
+
+
+class _Users:
+    def __init__(self, service):
+        self._service = service
+
+    def messages(self):
+        return _Messages(self._service)
+
+    def history(self):
+        return _History(self._service)
+
+    def getProfile(self, userId='me'):
+        service = self._service
+        return _Request(service, lambda: {
+            'emailAddress': service.email_address,
+            'messagesTotal': len(service.message_ids),
+            'historyId': str(service.history_id),
+        })
+
+
+class FakeGmailService:
+    def __init__(self, messages, latency=0.0, fail_ids=(), email_address='traveler@example.com', throttled_calls=0):
+        self.messages = {m['id']: m for m in messages}
+        self.message_ids = [m['id'] for m in messages]
+        self.latency = latency
+        self.fail_ids = set(fail_ids)
+        self.email_address = email_address
+        self.round_trips = 0
+        self.throttled_calls = throttled_calls  # the next N requests (batch sub-requests included) get a 429
+        self._lock = threading.Lock()
+
+        # Mailbox history: every add_message() bumps history_id. Anything older than
+        # oldest_history_id has "expired" and history().list answers 404, like Gmail does.
+        self.history_id = 1000
+        self.oldest_history_id = 1000
+        self.added_history = []
+
+    def add_message(self, message):
+        """Deliver a new message (newest first in messages().list, recorded in history)."""
+        self.history_id += 1
+        self.messages[message['id']] = message
+        self.message_ids.insert(0, message['id'])
+        self.added_history.append((self.history_id, message))
+
+    def expire_history(self):
+        self.oldest_history_id = self.history_id
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _throttle(self):
+        with self._lock:
+            if self.throttled_calls <= 0:
+                return
+            self.throttled_calls -= 1
+        raise FakeHttpError(429, "rateLimitExceeded")
+
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
@@ -0,0 +1,109 @@
+# services/gmail_clients.py
+"""
+Per-account pool of Gmail API clients.
+
+Building a client used to cost, on every request: parsing the credentials,
+loading the discovery document, a new HTTP transport (fresh TLS handshakes)
+and often a token refresh. The pool keeps one client per account (LRU,
+GMAIL_CLIENT_POOL_SIZE entries) keyed by the credentials identity, loads the
+discovery document from the copy bundled with google-api-python-client
+(static_discovery) and lets google-auth reuse the access token until it
+actually expires.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+
+GMAIL_CLIENT_POOL_SIZE = int(os.getenv("GMAIL_CLIENT_POOL_SIZE", "256"))
+
+
+class ThreadLocalHttp:
+    """
+    Looks like a single AuthorizedHttp to googleapiclient, but each thread gets its
+    own transport, because httplib2 connections are not thread-safe. Every transport
+    keeps its keep-alive connections between requests, and all share one Credentials
+    object, so a refreshed token is seen by every thread.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._http(), name)
+
+
+def credentials_key(credentials_dict: dict) -> str:
+    """Identity of an authorized user: the OAuth client plus its refresh token (or access token)."""
+    identity = "|".join([
+        credentials_dict.get("client_id", ""),
+        credentials_dict.get("refresh_token") or credentials_dict.get("token", ""),
+    ])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+class GmailClientPool:
+    def __init__(self, max_size: int = GMAIL_CLIENT_POOL_SIZE):
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, credentials_dict: dict):
+        """Returns the Gmail service for these credentials, building it on first use."""
+        key = credentials_key(credentials_dict)
+        with self._lock:
+            service = self._clients.get(key)
+            if service is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return service
+            self.misses += 1
+
+        # Build outside the lock so one slow account doesn't hold up the others
+        creds = Credentials.from_authorized_user_info(credentials_dict)
+        service = build('gmail', 'v1', http=ThreadLocalHttp(creds), static_discovery=True, cache_discovery=False)
+
+        with self._lock:
+            service = self._clients.setdefault(key, service)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        return service
+
+    def evict(self, credentials_dict: dict):
+        """Forget a client, e.g. after its refresh token was revoked (main._forget_revoked_client)."""
+        with self._lock:
+            self._clients.pop(credentials_key(credentials_dict), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._clients), "hits": self.hits, "misses": self.misses}
+
+
+_pool = GmailClientPool()
+
+
+def get_gmail_client(credentials_dict: dict):
+    return _pool.get(credentials_dict)
+
+
+def get_client_pool() -> GmailClientPool:
+    return _pool
@@ -0,0 +1,260 @@
+# services/gmail_quota.py
+"""
+Shared Gmail quota budget for bulk (many-account) scans.
+
+Gmail meters API usage in quota units (messages.get / messages.list = 5,
+history.list = 2, getProfile = 1; every request inside an HTTP batch counts on
+its own) with a per-project and a per-user rate. QuotaLimiter is a token bucket
+for the project budget plus one bucket per user. Waiting users are served
+round-robin, so one mailbox with thousands of messages cannot starve the others.
+
+MeteredGmailService wraps a Gmail client for one user: every execute() (and
+every batch) first takes its units from the limiter, and 429 / 5xx / rate-limit
+403 answers are retried with exponential backoff and full jitter instead of
+being dropped. Interactive scans use it with no limiter: retries only, nothing
+spent from the bulk budget.
+
+GMAIL_QUOTA_UNITS_PER_SEC is what bulk scans may spend. Keep it below the
+project quota so interactive /scan calls still have headroom.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from services.gmail_service import http_status
+
+GMAIL_QUOTA_UNITS_PER_SEC = float(os.getenv("GMAIL_QUOTA_UNITS_PER_SEC", "15000"))
+GMAIL_USER_QUOTA_UNITS_PER_SEC = float(os.getenv("GMAIL_USER_QUOTA_UNITS_PER_SEC", "250"))
+GMAIL_MAX_RETRIES = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+GMAIL_BACKOFF_BASE = float(os.getenv("GMAIL_BACKOFF_BASE", "0.5"))
+GMAIL_BACKOFF_MAX = float(os.getenv("GMAIL_BACKOFF_MAX", "32"))
+
+QUOTA_UNITS = {
+    "users.messages.get": 5,
+    "users.messages.list": 5,
+    "users.messages.attachments.get": 5,
+    "users.history.list": 2,
+    "users.getProfile": 1,
+}
+DEFAULT_QUOTA_UNITS = 5
+
+
+class QuotaLimiter:
+    """
+    Thread-safe token bucket (rate units/sec, one second of burst) shared by all
+    users, with a per-user bucket on top. A request larger than a bucket's burst
+    (a 100-message batch is 500 units) is let through once the bucket is full and
+    leaves it in debt, so later requests wait it off.
+    """
+
+    def __init__(self, rate=GMAIL_QUOTA_UNITS_PER_SEC, per_user_rate=GMAIL_USER_QUOTA_UNITS_PER_SEC):
+        self.rate = rate
+        self.per_user_rate = per_user_rate
+        self._cond = threading.Condition()
+        self._tokens = rate
+        self._user_tokens = {}
+        self._updated = time.monotonic()
+        self._waiting = OrderedDict()   # user -> deque of tickets, in round-robin order
+        self._units = {}                # ticket -> units requested
+        self.units_granted = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.rate, self._tokens + elapsed * self.rate)
+        for user, tokens in list(self._user_tokens.items()):
+            tokens = min(self.per_user_rate, tokens + elapsed * self.per_user_rate)
+            if tokens >= self.per_user_rate and user not in self._waiting:
+                del self._user_tokens[user]  # full again: same as a user we never saw
+            else:
+                self._user_tokens[user] = tokens
+
+    def _user_ready(self, user, units):
+        return self._user_tokens.setdefault(user, self.per_user_rate) >= min(units, self.per_user_rate)
+
+    def _next_user(self):
+        """First waiting user, in round-robin order, whose own bucket can pay for its oldest request."""
+        for user in self._waiting:
+            if self._user_ready(user, self._units[self._waiting[user][0]]):
+                return user
+        return None
+
+    def acquire(self, user: str, units: int):
+        """Block until `units` may be spent on behalf of `user`."""
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self._waiting.setdefault(user, deque()).append(ticket)
+            self._units[ticket] = units
+            try:
+                while True:
+                    self._refill()
+                    if (self._next_user() == user and self._waiting[user][0] is ticket
+                            and self._tokens >= min(units, self.rate)):
+                        break
+                    deficit = max(min(units, self.rate) - self._tokens, 0) / self.rate
+                    if not self._user_ready(user, units):
+                        deficit = max(deficit, (min(units, self.per_user_rate) - self._user_tokens[user]) / self.per_user_rate)
+                    self._cond.wait(timeout=min(max(deficit, 0.005), 0.25))
+
+                self._tokens -= units
+                self._user_tokens[user] -= units
+                self.units_granted += units
+                self.wait_seconds += time.monotonic() - start
+            finally:
+                queue = self._waiting[user]
+                queue.remove(ticket)
+                del self._units[ticket]
+                # Served (or gave up): this user goes to the back of the round-robin
+                del self._waiting[user]
+                if queue:
+                    self._waiting[user] = queue
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "units_granted": self.units_granted,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "waiting_users": len(self._waiting),
+            }
+
+
+def is_retryable(error) -> bool:
+    """429, 5xx, and the 403 rateLimitExceeded / userRateLimitExceeded Gmail also uses for throttling."""
+    status = http_status(error)
+    if status == 429 or (status is not None and status >= 500):
+        return True
+    return status == 403 and "ratelimitexceeded" in str(error).lower()
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))."""
+    base = GMAIL_BACKOFF_BASE if base is None else base
+    cap = GMAIL_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class _MeteredRequest:
+    def __init__(self, owner, request, method):
+        self._owner = owner
+        self.request = request
+        self.units = QUOTA_UNITS.get(method, DEFAULT_QUOTA_UNITS)
+
+    def execute(self, *args, **kwargs):
+        owner = self._owner
+        attempt = 0
+        while True:
+            if owner.limiter is not None:
+                owner.limiter.acquire(owner.user, self.units)
+            try:
+                return self.request.execute(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= owner.max_retries:
+                    raise
+                owner.retries += 1
+                time.sleep(backoff_delay(attempt, owner.backoff_base))
+                attempt += 1
+
+
+class _MeteredBatch:
+    """
+    Collects metered requests and sends them as real batches. Sub-requests that come
+    back rate limited are sent again in a new batch after a backoff; everything else
+    reaches its callback once, as with a plain batch.
+    """
+
+    def __init__(self, owner, callback=None):
+        self._owner = owner
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, **kwargs):
+        owner = self._owner
+        pending = self._requests
+        attempt = 0
+        while pending:
+            retry = []
+            final_attempt = attempt >= owner.max_retries
+            entries = {request_id: (request_id, request, callback) for request_id, request, callback in pending}
+
+            def _on_response(request_id, response, exception):
+                entry = entries[request_id]
+                if exception is not None and is_retryable(exception) and not final_attempt:
+                    retry.append(entry)
+                else:
+                    entry[2](request_id, response, exception)
+
+            batch = owner.service.new_batch_http_request(callback=_on_response)
+            for request_id, request, _ in pending:
+                batch.add(request.request, request_id=request_id)
+
+            if owner.limiter is not None:
+                owner.limiter.acquire(owner.user, sum(request.units for _, request, _ in pending))
+            try:
+                batch.execute(**kwargs)
+            except Exception as e:
+                if not is_retryable(e) or final_attempt:
+                    raise
+                retry = pending
+
+            pending = retry
+            if pending:
+                owner.retries += len(pending)
+                time.sleep(backoff_delay(attempt, owner.backoff_base))
+                attempt += 1
+
+
+class _MeteredResource:
+    def __init__(self, owner, resource, path):
+        self._owner = owner
+        self._resource = resource
+        self._path = path
+
+    def __getattr__(self, name):
+        method = getattr(self._resource, name)
+        path = f"{self._path}.{name}"
+
+        def _call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _MeteredRequest(self._owner, result, path)
+            return _MeteredResource(self._owner, result, path)
+        return _call
+
+
+class MeteredGmailService:
+    """Drop-in wrapper around one user's Gmail client that spends from a shared QuotaLimiter (if any)."""
+
+    def __init__(self, service, limiter: Optional[QuotaLimiter], user: str,
+                 max_retries: int = GMAIL_MAX_RETRIES, backoff_base: float = None):
+        self.service = service
+        self.limiter = limiter
+        self.user = user
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.retries = 0
+
+    def users(self):
+        return _MeteredResource(self, self.service.users(), "users")
+
+    def new_batch_http_request(self, callback=None):
+        return _MeteredBatch(self, callback)
+
+
+_limiter = None
+
+
+def get_quota_limiter() -> QuotaLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = QuotaLimiter()
+    return _limiter
@@ -1,119 +1,418 @@
 # services/gmail_service.py
 import base64
+import codecs
+import logging
+import os
 import re
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from bs4 import BeautifulSoup # <-- NEW IMPORT
-
-def get_email_body(payload):
-    """
-    Recursively search for 'text/plain' and 'text/html' parts.
-    Prefers plain text, but falls back to HTML.
-    """
-    body = ""
-    html_body = ""
-
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain':
-                body_data = part['body'].get('data', '')
-                if body_data:
-                    # Found plain text, use it and stop.
-                    return base64.urlsafe_b64decode(body_data).decode('utf-8')
-            
-            if part['mimeType'] == 'text/html':
-                body_data = part['body'].get('data', '')
-                if body_data:
-                    html_body = base64.urlsafe_b64decode(body_data).decode('utf-8')
-            
-            # Recurse for multipart/alternative
-            # Fix: Check for payload in part *before* recursing
-            if 'payload' in part and 'parts' in part['payload']:
-                # This part might have the text, so check it
-                recursive_body = get_email_body(part['payload'])
-                if recursive_body: 
-                    return recursive_body
-
-    elif 'body' in payload:
-        body_data = payload['body'].get('data', '')
-        if body_data and payload['mimeType'] == 'text/plain':
-            return base64.urlsafe_b64decode(body_data).decode('utf-8')
-        if body_data and payload['mimeType'] == 'text/html':
-            html_body = base64.urlsafe_b64decode(body_data).decode('utf-8')
-
-    # If we are here, we only found an HTML body (or nothing)
-    if not body and html_body:
-        # We need html.parser, make sure 'pip install beautifulsoup4' is run
-        soup = BeautifulSoup(html_body, 'html.parser')
-        return soup.get_text(separator='\n') # Convert HTML to plain text
-
-    return body # Return plain text or empty string
-
-def fetch_recent_booking_emails(credentials_dict, max_results=10, custom_query=None):
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.gmail_clients import get_gmail_client
+from services.html_text import html_to_text
+from services.metrics import Counter, Histogram
+
+logger = logging.getLogger("GmailService")
+
+# One observation per API call; a fetch_* call covers a whole page/batch of messages.
+GMAIL_REQUEST_SECONDS = Histogram(
+    "gmail_request_duration_seconds", "Gmail API call latency", ["operation"]
+)
+GMAIL_MESSAGES_FETCHED = Counter("gmail_messages_fetched", "Messages downloaded from Gmail", ["format"])
+GMAIL_FETCH_FAILURES = Counter("gmail_fetch_failures", "Messages that could not be downloaded", ["format"])
+
+# --- FETCH SETTINGS ---
+# "batch"      -> Gmail HTTP batch requests (one round trip per GMAIL_BATCH_SIZE ids)
+# "threads"    -> bounded thread pool, one round trip per id but GMAIL_FETCH_CONCURRENCY in flight
+# "sequential" -> the old one-by-one loop
+GMAIL_FETCH_MODE = os.getenv("GMAIL_FETCH_MODE", "batch")
+GMAIL_FETCH_CONCURRENCY = int(os.getenv("GMAIL_FETCH_CONCURRENCY", "8"))
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))  # Gmail rejects batches > 100
+
+# Decoded bodies are cut to this many bytes before any parsing (HTML confirmations can be several MB)
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(512 * 1024)))
+
+GMAIL_MAX_PAGE_SIZE = 500  # messages.list maxResults limit
+
+# Messages added with these labels are never bookings we received
+HISTORY_SKIP_LABELS = {'DRAFT', 'SENT', 'SPAM', 'TRASH'}
+
+class HistoryExpiredError(Exception):
+    """The stored startHistoryId is too old for users.history.list (Gmail answers 404)."""
+
+# Body candidates, best first; any other text/* part (text/enriched ...) ranks after HTML
+_BODY_RANKS = {'text/plain': 0, 'text/html': 1}
+_OTHER_TEXT_RANK = 2
+_CHARSET = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+
+def _part_charset(part):
+    """The charset= of a part's Content-Type header (utf-8 when there is none)."""
+    for header in part.get('headers') or ():
+        if header['name'].lower() == 'content-type':
+            match = _CHARSET.search(header['value'])
+            if match:
+                return match.group(1)
+    return 'utf-8'
+
+def _decode_body(body_data, charset='utf-8'):
+    raw = base64.urlsafe_b64decode(body_data)
+    truncated = len(raw) > MAX_BODY_BYTES
+    if truncated:
+        raw = raw[:MAX_BODY_BYTES]
+    try:
+        decoder = codecs.getincrementaldecoder(charset)('replace')
+    except LookupError:  # unknown or misspelt charset name
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    # A cut can land inside a multi-byte character: decoding with final=False holds back
+    # only that trailing partial character; invalid bytes elsewhere are still replaced
+    return decoder.decode(raw, final=not truncated)
+
+def _best_body_part(payload, can_fetch=False):
     """
-    Fetch emails from Gmail using OAuth tokens.
+    Depth-first walk of the MIME tree, in document order, without recursion.
+    Returns (part, rank) of the first text/plain part with a body, else the first
+    text/html one, else the first other text/* one; (None, None) if there is none.
+    Attachments (parts with a filename) are never the body. Parts whose body is
+    only an attachmentId count when it can be fetched.
     """
-    try:
-        creds = Credentials.from_authorized_user_info(credentials_dict)
-        service = build('gmail', 'v1', credentials=creds)
-        
-        # --- THIS IS THE CORRECTED LOGIC ---
-        if custom_query:
-            query = custom_query
-            print(f"Executing CUSTOM Gmail query: {query}")
+    best, best_rank = None, None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+        if children:
+            stack.extend(reversed(children))
+            continue
+        if part.get('filename'):
+            continue
+        mime_type = part.get('mimeType', '')
+        rank = _BODY_RANKS.get(mime_type, _OTHER_TEXT_RANK if mime_type.startswith('text/') else None)
+        if rank is None or (best is not None and rank >= best_rank):
+            continue
+        body = part.get('body') or {}
+        if body.get('data') or (can_fetch and body.get('attachmentId')):
+            best, best_rank = part, rank
+            if rank == 0:
+                break
+    return best, best_rank
+
+def get_email_body(payload, fetch_attachment=None):
+    """
+    Text of the best body part (see _best_body_part): plain text as is, HTML converted
+    to text. Only that part is decoded, with its own charset. Gmail leaves large bodies
+    out of the message and gives an attachmentId instead; fetch_attachment(attachment_id)
+    -> base64url data downloads it, only when that part is the one picked.
+    """
+    part, rank = _best_body_part(payload, can_fetch=fetch_attachment is not None)
+    if part is None:
+        return ""
+    body_data = part['body'].get('data') or fetch_attachment(part['body']['attachmentId'])
+    if not body_data:
+        return ""
+    text = _decode_body(body_data, _part_charset(part))
+    if rank == _BODY_RANKS['text/html']:
+        return html_to_text(text)  # Convert HTML to plain text (services/html_text.py)
+    return text
+
+def _parse_headers(message):
+    """id / sender address / subject / received time of a Gmail message resource (full or metadata format)."""
+    headers = message['payload'].get('headers', [])
+
+    # Extract headers
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
+
+    email_match = re.search(r'<(.+?)>', sender)
+    sender_email = email_match.group(1) if email_match else sender
+
+    return {
+        'id': message['id'],
+        'from': sender_email,
+        'subject': subject,
+        'received_at': int(message['internalDate']) if message.get('internalDate') else None,
+    }
+
+def _parse_message(message, fetch_attachment=None):
+    """Turn a raw Gmail message resource into our email dict (None if malformed)."""
+    if 'payload' not in message:
+        logger.warning(f"Skipping malformed email {message.get('id')}: No payload found.")
+        return None
+
+    email = _parse_headers(message)
+    email['body'] = get_email_body(message['payload'], fetch_attachment) # <-- NO MORE [:2000] TRUNCATION
+    return email
+
+METADATA_HEADERS = ['From', 'Subject']
+
+def _get_request(service, msg_id, fmt='full'):
+    if fmt == 'metadata':
+        return service.users().messages().get(userId='me', id=msg_id, format='metadata', metadataHeaders=METADATA_HEADERS)
+    return service.users().messages().get(userId='me', id=msg_id)
+
+def _attachment_fetcher(service, msg_id):
+    """fetch_attachment for get_email_body: one users.messages.attachments.get call, None on failure."""
+    def _fetch(attachment_id):
+        try:
+            with GMAIL_REQUEST_SECONDS.labels("fetch_attachment").time():
+                attachment = service.users().messages().attachments().get(
+                    userId='me', messageId=msg_id, id=attachment_id).execute()
+        except Exception as e:
+            logger.warning(f"Failed to fetch body of email {msg_id}: {e}")
+            GMAIL_FETCH_FAILURES.labels('attachment').inc()
+            return None
+        return attachment.get('data')
+    return _fetch
+
+def _fetch_sequential(service, msg_ids, fmt='full'):
+    messages = {}
+    for msg_id in msg_ids:
+        try:
+            messages[msg_id] = _get_request(service, msg_id, fmt).execute()
+        except Exception as e:
+            logger.warning(f"Failed to fetch email {msg_id}: {e}")
+    return messages
+
+def _fetch_batch(service, msg_ids, batch_size, fmt='full'):
+    """Fetch messages with Gmail HTTP batch requests (one round trip per chunk)."""
+    messages = {}
+
+    def _on_response(request_id, response, exception):
+        if exception is not None:
+            logger.warning(f"Failed to fetch email {request_id}: {exception}")
         else:
-            # Automated Scan query
-            default_senders = [
-                'from:united.com', 'from:delta.com', 'from:marriott.com',
-                'from:booking.com', 'from:hilton.com', 'from:expedia.com',
-                'from:airbnb.com', 'from:eventbrite.com', 'from:ticketmaster.com',
-                'from:KantemirMuratov@gmail.com'
-            ]
-            sender_query = " OR ".join(default_senders)
-            query = f"newer_than:30d ({sender_query})"
-            print(f"Executing DEFAULT Gmail query: {query}")
-
-        # --- THIS 'results' CALL IS NOW *OUTSIDE* THE IF/ELSE ---
-        results = service.users().messages().list(
-            userId='me',
-            q=query,
-            maxResults=max_results
-        ).execute()
-        
-        emails = []
-        # Loop through each email ID
-        for msg in results.get('messages', []):
-            # Get the full email content
-            message = service.users().messages().get(
+            messages[request_id] = response
+
+    for start in range(0, len(msg_ids), batch_size):
+        batch = service.new_batch_http_request(callback=_on_response)
+        for msg_id in msg_ids[start:start + batch_size]:
+            batch.add(_get_request(service, msg_id, fmt), request_id=msg_id)
+        batch.execute()
+    return messages
+
+def _fetch_threaded(service, msg_ids, concurrency, http_factory=None, fmt='full'):
+    """
+    Fetch messages with a bounded thread pool.
+    httplib2 transports are not thread-safe, so each worker thread gets its own
+    HTTP object from http_factory (the fake service in tests needs none).
+    """
+    local = threading.local()
+
+    def _fetch_one(msg_id):
+        if http_factory is not None and not hasattr(local, 'http'):
+            local.http = http_factory()
+        try:
+            return msg_id, _get_request(service, msg_id, fmt).execute(http=getattr(local, 'http', None))
+        except Exception as e:
+            logger.warning(f"Failed to fetch email {msg_id}: {e}")
+            return msg_id, None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return {msg_id: msg for msg_id, msg in pool.map(_fetch_one, msg_ids) if msg is not None}
+
+def _fetch_raw(service, msg_ids, fetch_mode=None, concurrency=None, http_factory=None, fmt='full', stats=None,
+               failed=None):
+    fetch_mode = fetch_mode or GMAIL_FETCH_MODE
+    concurrency = concurrency or GMAIL_FETCH_CONCURRENCY
+
+    if fetch_mode not in ("batch", "threads", "sequential"):
+        raise ValueError(f"Unknown Gmail fetch mode: {fetch_mode}")
+
+    with GMAIL_REQUEST_SECONDS.labels(f"fetch_{fmt}").time():
+        if fetch_mode == "batch":
+            raw = _fetch_batch(service, msg_ids, GMAIL_BATCH_SIZE, fmt)
+        elif fetch_mode == "threads":
+            raw = _fetch_threaded(service, msg_ids, concurrency, http_factory, fmt)
+        else:
+            raw = _fetch_sequential(service, msg_ids, fmt)
+    GMAIL_MESSAGES_FETCHED.labels(fmt).inc(len(raw))
+    if len(raw) < len(msg_ids):
+        GMAIL_FETCH_FAILURES.labels(fmt).inc(len(msg_ids) - len(raw))
+        if failed is not None:
+            failed.extend(msg_id for msg_id in msg_ids if msg_id not in raw)
+
+    if stats is not None:
+        stats[f"{fmt}_messages"] = stats.get(f"{fmt}_messages", 0) + len(raw)
+    return raw
+
+def fetch_messages(service, msg_ids, fetch_mode=None, concurrency=None, http_factory=None, stats=None, failed=None):
+    """
+    Download full message resources for msg_ids using the configured fetch mode.
+    A failure on one message (download or parsing) is logged and skipped; it never aborts
+    the others. If a failed list is given, the ids of the skipped messages are appended to it.
+    Returns parsed email dicts in the same order as msg_ids. A body Gmail only sent as
+    an attachmentId (too large to inline) costs one more call, if it is the one used.
+    If a stats dict is given, full_messages is added to it.
+    """
+    raw = _fetch_raw(service, msg_ids, fetch_mode, concurrency, http_factory, 'full', stats, failed)
+
+    emails = []
+    for msg_id in msg_ids:
+        message = raw.get(msg_id)
+        if message is None:
+            continue
+        try:
+            email = _parse_message(message, _attachment_fetcher(service, msg_id))
+        except Exception as e:
+            # A body we cannot decode is one failed message, like a failed download
+            logger.warning(f"Failed to parse email {msg_id}: {e}")
+            GMAIL_FETCH_FAILURES.labels('parse').inc()
+            if failed is not None:
+                failed.append(msg_id)
+            continue
+        if email:
+            emails.append(email)
+    return emails
+
+def fetch_message_headers(service, msg_ids, fetch_mode=None, concurrency=None, http_factory=None, stats=None,
+                          failed=None):
+    """
+    Cheap first stage: format=metadata with only the From/Subject headers, no body.
+    Returns [{'id', 'from', 'subject'}] in the same order as msg_ids; ids that could not
+    be fetched are appended to failed, if given.
+    If a stats dict is given, metadata_messages is added to it.
+    """
+    raw = _fetch_raw(service, msg_ids, fetch_mode, concurrency, http_factory, 'metadata', stats, failed)
+
+    headers = []
+    for msg_id in msg_ids:
+        message = raw.get(msg_id)
+        if message is None or 'payload' not in message:
+            continue
+        headers.append(_parse_headers(message))
+    return headers
+
+def build_gmail_service(credentials_dict):
+    """
+    Returns (service, http_factory) for an account.
+    The service comes from the per-account client pool (services/gmail_clients.py) and
+    already gives each thread its own transport, so no http_factory is needed.
+    """
+    return get_gmail_client(credentials_dict), None
+
+def build_query(custom_query=None):
+    # --- THIS IS THE CORRECTED LOGIC ---
+    if custom_query:
+        query = custom_query
+        logger.debug(f"Executing CUSTOM Gmail query: {query}")
+    else:
+        # Automated Scan query
+        default_senders = [
+            'from:united.com', 'from:delta.com', 'from:marriott.com',
+            'from:booking.com', 'from:hilton.com', 'from:expedia.com',
+            'from:airbnb.com', 'from:eventbrite.com', 'from:ticketmaster.com',
+            'from:KantemirMuratov@gmail.com'
+        ]
+        sender_query = " OR ".join(default_senders)
+        query = f"newer_than:30d ({sender_query})"
+        logger.debug(f"Executing DEFAULT Gmail query: {query}")
+    return query
+
+def iter_message_id_pages(service, custom_query=None, page_size=100, page_token=None, max_results=None):
+    """
+    Page through the scan/search query with nextPageToken.
+    Yields (msg_ids, next_page_token) per page; next_page_token is None on the last page
+    and can be passed back as page_token to resume. Stops after max_results IDs if given.
+    """
+    query = build_query(custom_query)
+    remaining = max_results
+    while remaining is None or remaining > 0:
+        size = min(page_size, remaining) if remaining is not None else page_size
+        with GMAIL_REQUEST_SECONDS.labels("list").time():
+            results = service.users().messages().list(
                 userId='me',
-                id=msg['id']
+                q=query,
+                maxResults=min(size, GMAIL_MAX_PAGE_SIZE),
+                pageToken=page_token
             ).execute()
+        msg_ids = [msg['id'] for msg in results.get('messages', [])]
+        page_token = results.get('nextPageToken')
+        if remaining is not None:
+            remaining -= len(msg_ids)
+        yield msg_ids, page_token
+        if not page_token or not msg_ids:
+            break
+
+def list_message_ids(service, max_results=10, custom_query=None):
+    """Run the scan/search query and return up to max_results matching message IDs (newest first)."""
+    msg_ids = []
+    for page, _ in iter_message_id_pages(service, custom_query, page_size=GMAIL_MAX_PAGE_SIZE, max_results=max_results):
+        msg_ids.extend(page)
+    return msg_ids
+
+def get_profile(service):
+    """users.getProfile: emailAddress and the mailbox's current historyId."""
+    with GMAIL_REQUEST_SECONDS.labels("profile").time():
+        return service.users().getProfile(userId='me').execute()
+
+def http_status(error):
+    """HTTP status of a Gmail API error (googleapiclient HttpError or the fake service's), or None."""
+    status = getattr(error, 'status_code', None)
+    if status is None and getattr(error, 'resp', None) is not None:
+        status = getattr(error.resp, 'status', None)
+    return int(status) if status is not None else None
+
+def list_added_message_ids(service, start_history_id):
+    """
+    Message IDs added to the mailbox since start_history_id (newest first), and the
+    latest historyId Gmail reported. Raises HistoryExpiredError when the id is too old.
+    """
+    msg_ids = []
+    latest_history_id = start_history_id
+    page_token = None
+    while True:
+        try:
+            with GMAIL_REQUEST_SECONDS.labels("history").time():
+                response = service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    pageToken=page_token
+                ).execute()
+        except Exception as e:
+            if http_status(e) == 404:
+                raise HistoryExpiredError(f"historyId {start_history_id} has expired") from e
+            raise
+
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                if HISTORY_SKIP_LABELS.intersection(message.get('labelIds', [])):
+                    continue
+                msg_ids.append(message['id'])
+
+        latest_history_id = response.get('historyId', latest_history_id)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    # History is oldest first; callers expect newest first like messages().list
+    return list(dict.fromkeys(reversed(msg_ids))), latest_history_id
+
+def sync_message_ids(service, last_history_id, current_history_id, max_results=10):
+    """
+    Incremental sync. Returns (msg_ids, new_history_id, mode) where mode is:
+    - "incremental": only messages added since last_history_id
+    - "full": first sync for this account, or the history expired, so the normal query is run.
+      current_history_id must be read (getProfile) *before* this call so nothing slips in between.
+    """
+    if last_history_id:
+        try:
+            msg_ids, new_history_id = list_added_message_ids(service, last_history_id)
+            return msg_ids, new_history_id, "incremental"
+        except HistoryExpiredError as e:
+            logger.info(f"{e}, falling back to a full scan")
+
+    return list_message_ids(service, max_results), current_history_id, "full"
+
+def fetch_recent_booking_emails(credentials_dict, max_results=10, custom_query=None, fetch_mode=None, concurrency=None):
+    """
+    Fetch emails from Gmail using OAuth tokens.
+    """
+    try:
+        service, http_factory = build_gmail_service(credentials_dict)
+        msg_ids = list_message_ids(service, max_results, custom_query)
 
-            if 'payload' not in message:
-                print(f"Skipping malformed email {msg['id']}: No payload found.")
-                continue # Go to the next email
-
-            payload = message['payload']
-            headers = payload['headers']
-            
-            # Extract headers
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
-            
-            email_match = re.search(r'<(.+?)>', sender)
-            sender_email = email_match.group(1) if email_match else sender
-            body = get_email_body(payload)
-
-            emails.append({
-                'id': msg['id'],
-                'from': sender_email,
-                'subject': subject,
-                'body': body # <-- NO MORE [:2000] TRUNCATION
-            })
-        
         # Return the final list of clean emails
-        return emails
+        return fetch_messages(service, msg_ids, fetch_mode, concurrency, http_factory=http_factory)
         
     except Exception as e:
-        print(f"Gmail API error: {str(e)}")
-        raise e
\ No newline at end of file
+        logger.error(f"Gmail API error: {str(e)}")
+        raise e
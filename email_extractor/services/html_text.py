@@ -0,0 +1,177 @@
+# services/html_text.py
+"""
+HTML -> plain text for HTML-only emails.
+
+Airline/hotel confirmations are often 200KB+ of inline CSS, tracking pixels and
+layout tables, and BeautifulSoup's pure-Python html.parser is the slowest way to
+flatten them. Backends, fastest first:
+
+- "selectolax": lexbor C parser   (pip install selectolax)
+- "lxml":       libxml2 C parser  (pip install lxml)
+- "stream":     stdlib html.parser event stream, no tree is built
+- "bs4":        the original BeautifulSoup(html, 'html.parser') path
+
+HTML_TEXT_BACKEND=auto (default) picks the first one that is installed.
+Every backend drops <style>/<script>/<noscript>/<template>/<head> and elements
+hidden with the `hidden` attribute or an inline display:none / visibility:hidden,
+and joins text nodes with '\n' (the old get_text(separator='\n') behaviour the
+extractors' "Label: value\n" regexes rely on).
+"""
+import os
+import re
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+from services.metrics import Histogram
+
+HTML_TEXT_BACKEND = os.getenv("HTML_TEXT_BACKEND", "auto")
+
+SKIP_TAGS = {'style', 'script', 'noscript', 'template', 'head'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+_HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.IGNORECASE)
+
+
+def _is_hidden(attrs) -> bool:
+    """attrs: mapping or list of (name, value) pairs."""
+    items = attrs.items() if hasattr(attrs, 'items') else attrs
+    for name, value in items:
+        if name == 'hidden':
+            return True
+        if name == 'style' and value and _HIDDEN_STYLE.search(value):
+            return True
+    return False
+
+
+def _join(chunks) -> str:
+    return '\n'.join(chunk for chunk in chunks if chunk and not chunk.isspace())
+
+
+# --- Backends ---
+
+def _selectolax_text(html: str) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(SKIP_TAGS - {'head'}))
+    for node in tree.css('[hidden], [style]'):
+        if _is_hidden(node.attributes):
+            node.decompose()
+    if tree.body is None:
+        return ''
+    return _join(tree.body.text(separator='\n').split('\n'))
+
+
+def _lxml_text(html: str) -> str:
+    import lxml.etree
+    import lxml.html
+    try:
+        root = lxml.html.document_fromstring(html)
+    except lxml.etree.ParserError:
+        return ''  # "Document is empty": an empty, blank or comment-only part
+    chunks = []
+
+    def _walk(element):
+        if not isinstance(element.tag, str) or element.tag in SKIP_TAGS or _is_hidden(element.attrib):
+            return  # comments / processing instructions have a non-str tag
+        chunks.append(element.text)
+        for child in element:
+            _walk(child)
+            chunks.append(child.tail)
+
+    _walk(root)
+    return _join(chunks)
+
+
+class _StreamingTextParser(HTMLParser):
+    """Collects text nodes from the parser's event stream, skipping hidden subtrees."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._open = []      # stack of (tag, skipped)
+        self._skipping = 0   # number of skipped elements currently open
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        skipped = tag in SKIP_TAGS or _is_hidden(attrs)
+        self._open.append((tag, skipped))
+        self._skipping += skipped
+
+    def handle_startendtag(self, tag, attrs):
+        pass  # <img/>, <br/> ...
+
+    def handle_endtag(self, tag):
+        # Close up to the matching tag; unclosed <td>/<p> etc. are closed implicitly
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i][0] == tag:
+                for _, skipped in self._open[i:]:
+                    self._skipping -= skipped
+                del self._open[i:]
+                return
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.chunks.append(data)
+
+
+def _stream_text(html: str) -> str:
+    parser = _StreamingTextParser()
+    parser.feed(html)
+    parser.close()
+    return _join(parser.chunks)
+
+
+def _bs4_text(html: str) -> str:
+    # We need html.parser, make sure 'pip install beautifulsoup4' is run
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(list(SKIP_TAGS)):
+        element.decompose()
+    for element in soup.find_all(lambda tag: _is_hidden(tag.attrs)):
+        element.decompose()
+    return _join(soup.get_text(separator='\n').split('\n'))
+
+
+BACKENDS = {
+    'selectolax': _selectolax_text,
+    'lxml': _lxml_text,
+    'stream': _stream_text,
+    'bs4': _bs4_text,
+}
+
+
+def available_backends():
+    names = []
+    for name in BACKENDS:
+        try:
+            if name == 'selectolax':
+                import selectolax.lexbor  # noqa: F401
+            elif name == 'lxml':
+                import lxml.html  # noqa: F401
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def _resolve_backend(name: str):
+    if name == 'auto':
+        return BACKENDS[available_backends()[0]]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML_TEXT_BACKEND: {name}")
+    return BACKENDS[name]
+
+
+_html_to_text = _resolve_backend(HTML_TEXT_BACKEND)
+_default_backend = available_backends()[0] if HTML_TEXT_BACKEND == 'auto' else HTML_TEXT_BACKEND
+
+HTML_TO_TEXT_SECONDS = Histogram("html_to_text_duration_seconds", "HTML body to text conversion", ["backend"])
+
+
+def html_to_text(html: str, backend: str = None) -> str:
+    """Convert an HTML body to newline-separated text with the configured (or given) backend."""
+    if backend is not None:
+        with HTML_TO_TEXT_SECONDS.labels(backend).time():
+            return _resolve_backend(backend)(html)
+    with HTML_TO_TEXT_SECONDS.labels(_default_backend).time():
+        return _html_to_text(html)
@@ -0,0 +1,213 @@
+# services/metrics.py
+"""
+Counters and latency histograms, rendered in the Prometheus text format on /metrics.
+
+Recording is an in-memory add under a per-series lock; nothing is formatted
+until somebody scrapes, so an unscraped process pays almost nothing.
+
+Extraction runs in CPU pool worker processes, each with its own copy of the
+registry. After every task the worker drains what it recorded (drain()) and
+ships it back with the result; the parent merges it (merge()), so /metrics on
+the parent covers all workers. See services/worker_pools.run_cpu.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _CounterSeries:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def _drain(self):
+        with self._lock:
+            value, self.value = self.value, 0.0
+        return value
+
+    def _merge(self, value):
+        self.inc(value)
+
+
+class _HistogramSeries:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, not cumulative; last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _drain(self):
+        with self._lock:
+            state = (self.counts, self.sum)
+            self.counts, self.sum = [0] * (len(self.buckets) + 1), 0.0
+        return state
+
+    def _merge(self, state):
+        counts, total = state
+        with self._lock:
+            for i, count in enumerate(counts):
+                self.counts[i] += count
+            self.sum += total
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def values(self) -> dict:
+        """{label values tuple: count} of this process (CPU workers' counts included once merged)."""
+        return {key: series.value for key, series in list(self._series.items())}
+
+    def _render(self):
+        for key, series in list(self._series.items()):
+            yield f"{self.name}_total{self._label_text(key)} {series.value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render(self):
+        for key, series in list(self._series.items()):
+            with series._lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{self._label_text(key)} {total}"
+            yield f"{self.name}_count{self._label_text(key)} {cumulative}"
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback returning a number, or {label values tuple: number}."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn, labelnames=(), registry=None):
+        self.fn = fn
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _render(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield f"{self.name}{self._label_text(tuple(str(v) for v in key))} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            name = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric._render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> dict:
+        """Everything recorded since the last drain, as plain picklable data; the series restart from zero."""
+        delta = {}
+        for metric in self._metrics.values():
+            if metric.kind == "gauge":
+                continue
+            series = {key: s._drain() for key, s in list(metric._series.items())}
+            if series:
+                delta[metric.name] = series
+        return delta
+
+    def merge(self, delta: dict):
+        for name, series in delta.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            for key, state in series.items():
+                metric.labels(*key)._merge(state)
+
+
+REGISTRY = Registry()
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,314 @@
+# services/offline_ingest.py
+"""
+Offline replay: run mail archives through filter -> extract -> validate, without Gmail.
+
+Sources, found under every path given (files or directories, recursively):
+  *.mbox, mbox           one file per folder; Gmail Takeout exports are mbox ("All mail Including Spam and Trash.mbox")
+  Maildir                any directory with cur/ and new/, one file per message
+  *.eml                  one message per file
+  *.zip                  the above inside a zip, e.g. a Takeout archive as downloaded
+
+The parent only finds where messages are: mbox files are memory-mapped and split on
+their "From " lines without being read into Python. Workers get (path, member, start,
+end) references in chunks of INGEST_CHUNK_SIZE, read just those bytes (mmap again),
+parse them with the stdlib MIME parser, and turn each into the payload shape Gmail
+returns, so gmail_service._parse_message picks the body (plain over HTML) exactly
+as it does for live mail. The chunk then goes through main._process_emails, like a
+fetched page, and comes back as one JSON document per booking.
+
+CLI, from email_extractor/:
+    python -m services.offline_ingest ~/Takeout/Mail -o bookings.ndjson --workers 8
+The server exposes the same as POST /ingest (paths under INGEST_ROOT only).
+"""
+import argparse
+import base64
+import email
+import hashlib
+import logging
+import mmap
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from email.header import decode_header, make_header
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+from services.gmail_service import _parse_message
+
+logger = logging.getLogger("OfflineIngest")
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "200"))
+
+# (path, zip member or None, start, end); start/end None = the whole file or member.
+# Messages of an mbox inside a zip can't be mapped: those travel as their bytes instead.
+MessageRef = Union[Tuple[str, Optional[str], Optional[int], Optional[int]], bytes]
+
+_MBOX_SEPARATOR = b"\nFrom "
+
+
+# --- Finding messages (parent) ---
+
+def _mbox_offsets(data) -> Iterator[Tuple[int, int]]:
+    """(start, end) of every message in mbox bytes (or an mmap), "From " line excluded."""
+    pos = 0 if data[:5] == b"From " else data.find(_MBOX_SEPARATOR)
+    while pos != -1 and pos < len(data):
+        if data[pos:pos + 1] == b"\n":
+            pos += 1
+        header_end = data.find(b"\n", pos)
+        if header_end == -1:
+            return
+        nxt = data.find(_MBOX_SEPARATOR, header_end)
+        end = nxt if nxt != -1 else len(data)
+        if end > header_end + 1:
+            yield header_end + 1, end
+        pos = nxt
+
+
+def _is_mbox(name: str) -> bool:
+    base = os.path.basename(name).lower()
+    return base.endswith(".mbox") or base == "mbox"
+
+
+def _mbox_refs(path: str) -> Iterator[MessageRef]:
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start, end in _mbox_offsets(mm):
+            yield path, None, start, end
+
+
+def _mbox_stream(lines) -> Iterator[bytes]:
+    """Messages of an mbox read line by line (the same split as _mbox_offsets)."""
+    message = []
+    for line in lines:
+        if line.startswith(b"From "):
+            if message:
+                yield b"".join(message).rstrip(b"\n")
+            message = []
+        else:
+            message.append(line)
+    if message:
+        yield b"".join(message).rstrip(b"\n")
+
+
+def _zip_refs(path: str) -> Iterator[MessageRef]:
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.namelist():
+            if _is_mbox(member):
+                with archive.open(member) as f:
+                    yield from _mbox_stream(f)  # decompressed as it goes, one message in memory
+            elif member.lower().endswith(".eml"):
+                yield path, member, None, None
+
+
+def iter_message_refs(paths: List[str]) -> Iterator[MessageRef]:
+    """Every message under paths, in a stable order."""
+    for path in paths:
+        if os.path.isdir(path):
+            if os.path.isdir(os.path.join(path, "cur")) and os.path.isdir(os.path.join(path, "new")):
+                for sub in ("new", "cur"):
+                    folder = os.path.join(path, sub)
+                    for name in sorted(os.listdir(folder)):
+                        if not name.startswith("."):
+                            yield os.path.join(folder, name), None, None, None
+            for name in sorted(os.listdir(path)):
+                if name not in ("cur", "new", "tmp") and not name.startswith("."):
+                    yield from iter_message_refs([os.path.join(path, name)])
+        elif _is_mbox(path):
+            yield from _mbox_refs(path)
+        elif path.lower().endswith(".zip"):
+            yield from _zip_refs(path)
+        elif path.lower().endswith(".eml"):
+            yield path, None, None, None
+
+
+# --- Parsing (workers) ---
+
+class _Reader:
+    """Reads the messages of one chunk; files and zips stay open (mapped) for the chunk."""
+
+    def __init__(self):
+        self._maps = {}
+        self._archives = {}
+
+    def read(self, ref: MessageRef) -> bytes:
+        if isinstance(ref, bytes):
+            return ref
+        path, member, start, end = ref
+        if member is not None:
+            archive = self._archives.get(path) or self._archives.setdefault(path, zipfile.ZipFile(path))
+            with archive.open(member) as f:
+                return f.read()
+        if start is None:
+            with open(path, "rb") as f:
+                return f.read()
+        mm = self._maps.get(path)
+        if mm is None:
+            with open(path, "rb") as f:
+                mm = self._maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mm[start:end]
+
+    def close(self):
+        for handle in list(self._maps.values()) + list(self._archives.values()):
+            handle.close()
+
+
+def _header(message, name: str) -> str:
+    value = message.get(name)
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(str(value))))
+    except Exception:
+        return str(value)
+
+
+def _to_gmail_part(part) -> dict:
+    """
+    A MIME part in the shape of a Gmail payload: text bodies as their bytes in base64url
+    with the charset in a Content-Type header, so only the part get_email_body picks is
+    ever decoded to text.
+    """
+    gmail_part = {'mimeType': part.get_content_type(), 'filename': part.get_filename() or '',
+                  'headers': [], 'body': {'size': 0}}
+    if part.is_multipart():
+        gmail_part['parts'] = [_to_gmail_part(sub) for sub in part.get_payload()]
+    elif part.get_content_maintype() == 'text' and not gmail_part['filename']:
+        raw = part.get_payload(decode=True) or b""
+        charset = part.get_content_charset()
+        if charset:
+            gmail_part['headers'] = [{'name': 'Content-Type', 'value': f'{gmail_part["mimeType"]}; charset="{charset}"'}]
+        gmail_part['body'] = {'size': len(raw), 'data': base64.urlsafe_b64encode(raw).decode('ascii')}
+    return gmail_part
+
+
+def parse_message_bytes(raw: bytes, fallback_id: str) -> Optional[dict]:
+    """Raw RFC 822 bytes -> the email dict gmail_service._parse_message makes of a live message."""
+    message = email.message_from_bytes(raw)
+    msg_id = _header(message, 'Message-ID').strip().strip('<>') or fallback_id
+    payload = _to_gmail_part(message)
+    payload['headers'] += [{'name': 'From', 'value': _header(message, 'From')},
+                           {'name': 'Subject', 'value': _header(message, 'Subject') or 'No Subject'}]
+    resource = {'id': msg_id, 'threadId': msg_id, 'payload': payload}
+    try:
+        resource['internalDate'] = str(int(parsedate_to_datetime(message['Date']).timestamp() * 1000))
+    except Exception:
+        pass
+    return _parse_message(resource)
+
+
+def _ref_id(ref: MessageRef, raw: bytes) -> str:
+    """Id for a message without a Message-ID header: where it is, or what it is."""
+    return hashlib.sha1(raw if isinstance(ref, bytes) else repr(ref).encode('utf-8')).hexdigest()[:16]
+
+
+def ingest_chunk(refs: List[MessageRef], process: Callable[[list], list]) -> dict:
+    """
+    Read, parse and process one chunk (runs in a worker). Returns the bookings as JSON
+    strings plus counts, so nothing but text crosses back to the parent.
+    """
+    reader = _Reader()
+    emails, unreadable = [], 0
+    try:
+        for ref in refs:
+            try:
+                raw = reader.read(ref)
+                parsed = parse_message_bytes(raw, _ref_id(ref, raw))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable message {ref if not isinstance(ref, bytes) else 'in zip'}: {e}")
+                parsed = None
+            if parsed:
+                emails.append(parsed)
+            else:
+                unreadable += 1
+    finally:
+        reader.close()
+
+    processed = process(emails)
+    return {
+        "messages": len(refs),
+        "unreadable": unreadable,
+        "rejected": sum(1 for _, booking, _ in processed if booking is None),
+        "bookings": [booking.model_dump_json() for _, booking, _ in processed if booking is not None],
+    }
+
+
+def chunked(refs: Iterator[MessageRef], size: int = INGEST_CHUNK_SIZE) -> Iterator[List[MessageRef]]:
+    chunk = []
+    for ref in refs:
+        chunk.append(ref)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- CLI ---
+
+def _warm_up_worker():
+    logging.getLogger().setLevel(logging.WARNING)
+    from extractors.booking_extractor import warm_up
+    warm_up()
+
+
+def _process_emails(emails: list) -> list:
+    import main  # the app module: workers need its _process_emails, not its server
+    return main._process_emails(emails)
+
+
+def run(paths: List[str], output, workers: int, chunk_size: int = INGEST_CHUNK_SIZE,
+        limit: Optional[int] = None) -> dict:
+    """Ingest paths into output (a binary file), workers processes at a time. Returns the totals."""
+    totals = {"messages": 0, "unreadable": 0, "rejected": 0, "bookings": 0}
+    refs = iter_message_refs(paths)
+    if limit:
+        refs = (ref for i, ref in zip(range(limit), refs))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up_worker) as pool:
+        in_flight = set()
+        chunks = chunked(refs, chunk_size)
+        while True:
+            # At most 2 chunks per worker queued: memory stays flat on archives of any size
+            for chunk in chunks:
+                in_flight.add(pool.submit(ingest_chunk, chunk, _process_emails))
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result["bookings"]:
+                    output.write(("\n".join(result["bookings"]) + "\n").encode("utf-8"))
+                for key in ("messages", "unreadable", "rejected"):
+                    totals[key] += result[key]
+                totals["bookings"] += len(result["bookings"])
+    totals["seconds"] = round(time.perf_counter() - start, 3)
+    totals["messages_per_sec"] = round(totals["messages"] / totals["seconds"], 1) if totals["seconds"] else None
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="mbox / Maildir / .eml / .zip files or directories")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output, one booking per line (default stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many messages")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.output == "-":
+        totals = run(args.paths, sys.stdout.buffer, args.workers, args.chunk_size, args.limit)
+    else:
+        with open(args.output, "wb") as output:
+            totals = run(args.paths, output, args.workers, args.chunk_size, args.limit)
+    print(totals, file=sys.stderr)
+    return totals
+
+
+if __name__ == "__main__":
+    main()
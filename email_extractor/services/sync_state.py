@@ -0,0 +1,95 @@
+# services/sync_state.py
+"""
+Remembers the last Gmail historyId we fully processed for each account, so
+/sync can ask Gmail "what was added since then" instead of re-running the query.
+
+Messages a sync could not download are not behind the new historyId for good: they
+are kept in sync_retry and fetched first on the next sync, up to SYNC_MAX_RETRIES
+times (a message deleted in the meantime fails forever).
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger("SyncState")
+
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", "sync_state.sqlite3")
+SYNC_MAX_RETRIES = int(os.getenv("SYNC_MAX_RETRIES", "5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    account     TEXT PRIMARY KEY,
+    history_id  TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_retry (
+    account     TEXT NOT NULL,
+    msg_id      TEXT NOT NULL,
+    attempts    INTEGER NOT NULL,
+    PRIMARY KEY (account, msg_id)
+);
+"""
+
+
+class SyncStateStore:
+    def __init__(self, path: str = SYNC_STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_history_id(self, account: str) -> Optional[str]:
+        row = self._conn().execute("SELECT history_id FROM sync_state WHERE account = ?", (account,)).fetchone()
+        return row[0] if row else None
+
+    def get_retry_ids(self, account: str) -> List[str]:
+        """Messages earlier syncs failed to download, to fetch again before the new ones."""
+        rows = self._conn().execute("SELECT msg_id FROM sync_retry WHERE account = ? ORDER BY msg_id", (account,))
+        return [row[0] for row in rows]
+
+    def set_history_id(self, account: str, history_id: str, failed_ids: Iterable[str] = ()):
+        """
+        Save the new cursor. failed_ids (messages of this sync that could not be downloaded,
+        retries included) replace the retry list; every other retry went through.
+        """
+        conn = self._conn()
+        with conn:
+            attempts = dict(conn.execute("SELECT msg_id, attempts FROM sync_retry WHERE account = ?", (account,)))
+            conn.execute("DELETE FROM sync_retry WHERE account = ?", (account,))
+            for msg_id in set(failed_ids):
+                tries = attempts.get(msg_id, 0) + 1
+                if tries > SYNC_MAX_RETRIES:
+                    logger.warning(f"Giving up on message {msg_id} of {account} after {SYNC_MAX_RETRIES} retries")
+                    continue
+                conn.execute("INSERT INTO sync_retry (account, msg_id, attempts) VALUES (?, ?, ?)",
+                             (account, msg_id, tries))
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (account, history_id, updated_at) VALUES (?, ?, ?)",
+                (account, str(history_id), time.time())
+            )
+
+    def forget(self, account: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sync_state WHERE account = ?", (account,))
+            conn.execute("DELETE FROM sync_retry WHERE account = ?", (account,))
+
+
+_store = None
+
+
+def get_sync_state_store() -> SyncStateStore:
+    global _store
+    if _store is None:
+        _store = SyncStateStore()
+    return _store
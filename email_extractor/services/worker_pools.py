@@ -0,0 +1,153 @@
+# services/worker_pools.py
+"""
+Executors that keep blocking work off the FastAPI event loop.
+
+- Gmail network I/O runs on a thread pool (IO_POOL_SIZE threads).
+- spaCy / regex extraction runs on a process pool (CPU_POOL_SIZE processes),
+  so scans for different users can use more than one core.
+  CPU_POOL_SIZE=0 runs extraction on the I/O thread pool instead.
+  Metrics recorded in a worker process travel back with each result (services/metrics.py).
+- MAX_PENDING_SCANS caps how many scans may be admitted at once; anything over
+  that is rejected immediately instead of queueing without bound.
+"""
+import asyncio
+import functools
+import gc
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from services.metrics import REGISTRY
+
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(os.cpu_count() or 1)))
+MAX_PENDING_SCANS = int(os.getenv("MAX_PENDING_SCANS", "64"))
+
+_io_pool = None
+_cpu_pool = None
+_cpu_initializer = None
+_cpu_started = False
+_pool_lock = threading.Lock()  # pools are created from the event loop and from to_thread warm-up at once
+_pending = 0
+
+
+class OverloadedError(Exception):
+    """Raised when MAX_PENDING_SCANS scans are already in flight."""
+
+
+def get_io_pool():
+    global _io_pool
+    if _io_pool is None:
+        with _pool_lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="gmail-io")
+    return _io_pool
+
+
+def set_cpu_initializer(initializer):
+    """
+    What every CPU worker runs first (the model warm-up). Set it at import time: a pool
+    created by a request before start_cpu_pool() then still gets warm workers.
+    """
+    global _cpu_initializer
+    _cpu_initializer = initializer
+
+
+def get_cpu_pool():
+    global _cpu_pool
+    if CPU_POOL_SIZE <= 0:
+        return get_io_pool()
+    if _cpu_pool is None:
+        with _pool_lock:
+            if _cpu_pool is None:
+                _cpu_pool = ProcessPoolExecutor(max_workers=CPU_POOL_SIZE, initializer=_init_cpu_worker,
+                                                initargs=(_cpu_initializer,))
+    return _cpu_pool
+
+
+def _init_cpu_worker(initializer):
+    REGISTRY.drain()  # a forked worker starts with the parent's counts; only report its own
+    if initializer is not None:
+        initializer()
+
+
+def _call_and_drain_metrics(fn):
+    return fn(), REGISTRY.drain()
+
+
+def _noop(_):
+    return None
+
+
+def start_cpu_pool(initializer=None):
+    """
+    Create the CPU pool now and start all of its workers.
+
+    Call this after the parent process has loaded and warmed the model: on Linux the
+    workers are forked, so they share the parent's loaded model copy-on-write instead
+    of each loading their own. gc.freeze() keeps the garbage collector from touching
+    (and so copying) those shared pages. On spawn platforms (Windows, macOS) the
+    initializer loads the model once in every worker at startup instead.
+    cpu_pool_started() is true once every worker is up.
+    """
+    global _cpu_started
+    if initializer is not None and _cpu_pool is None:
+        set_cpu_initializer(initializer)
+    if CPU_POOL_SIZE > 0:
+        gc.freeze()
+        list(get_cpu_pool().map(_noop, range(CPU_POOL_SIZE)))
+    _cpu_started = True
+
+
+def cpu_pool_started() -> bool:
+    return _cpu_started
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking network call on the I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run CPU-bound extraction on the process pool (fn and args must be picklable)."""
+    loop = asyncio.get_running_loop()
+    pool = get_cpu_pool()
+    call = functools.partial(fn, *args, **kwargs)
+    if pool is _io_pool:
+        return await loop.run_in_executor(pool, call)
+    result, metrics = await loop.run_in_executor(pool, functools.partial(_call_and_drain_metrics, call))
+    REGISTRY.merge(metrics)
+    return result
+
+
+@asynccontextmanager
+async def admission():
+    """
+    Backpressure for scan endpoints. Only touched from the event loop thread,
+    so a plain counter is enough.
+    """
+    global _pending
+    if _pending >= MAX_PENDING_SCANS:
+        raise OverloadedError(f"Too many scans in progress ({_pending}/{MAX_PENDING_SCANS}), retry shortly")
+    _pending += 1
+    try:
+        yield
+    finally:
+        _pending -= 1
+
+
+def pending_scans() -> int:
+    return _pending
+
+
+def shutdown_pools():
+    global _io_pool, _cpu_pool, _cpu_started
+    _cpu_started = False
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
@@ -0,0 +1,33 @@
+# test_booking_extractor.py
+from types import SimpleNamespace
+from extractors import booking_extractor
+from extractors.booking_extractor import NLP_OUTCOMES, extract_booking_batch
+
+class _FakeNlp:
+    """Records what gets parsed; every doc finds one GPE pair and one date."""
+    def __init__(self):
+        self.parsed = []
+
+    def pipe(self, texts, **kwargs):
+        for text in texts:
+            self.parsed.append(text)
+            yield SimpleNamespace(ents=[SimpleNamespace(text="Paris", label_="GPE"),
+                                        SimpleNamespace(text="Rome", label_="GPE"),
+                                        SimpleNamespace(text="May 2", label_="DATE")])
+
+def test_nlp_runs_only_for_emails_regex_could_not_complete(monkeypatch):
+    nlp = _FakeNlp()
+    monkeypatch.setattr(booking_extractor, "get_nlp_model", lambda: nlp)
+    before = NLP_OUTCOMES.values()
+    complete = "Airline: United\nDepart: JFK\nArrive: LAX\nDeparture Date: December 25, 2025\nTotal: $99.00\n"
+    incomplete = "Your flight from Paris to Rome is booked.\n"
+
+    results = extract_booking_batch([(complete, "flight"), (incomplete, "flight")])
+
+    assert nlp.parsed == [incomplete]
+    assert results[0]["departure_airport"] == "JFK" and "warning" not in results[0]
+    assert results[1]["departure_city_predicted"] == "Paris"
+    after = NLP_OUTCOMES.values()
+    for outcome in ("nlp_avoided", "nlp_used"):
+        key = ("flight", outcome)
+        assert after[key] - before.get(key, 0) == 1
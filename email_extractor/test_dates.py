@@ -0,0 +1,23 @@
+# test_dates.py
+from dateutil.parser import parse as parse_date
+from extractors.dates import _fast_parse, parse_datetime
+from extractors.booking_extractor import extract_booking_data
+
+def test_fast_formats_agree_with_dateutil():
+    for raw in ["December 25, 2025", "Dec 25 2025", "Dec. 25th, 2025", "25 Dec 2025", "Thu, Dec 25, 2025",
+                "Thursday, December 25, 2025 at 2:30 PM", "March 3, 2026 8:00 PM", "12/25/2025 14:30",
+                "2025-12-25", "2025-12-25T14:30:00Z", "Jan 15, 2026 12:05 AM"]:
+        assert _fast_parse(raw) is not None, raw
+        assert _fast_parse(raw) == parse_date(raw), raw
+
+def test_other_strings_fall_back_to_dateutil():
+    assert _fast_parse("Dec 25") is None
+    assert parse_datetime("Dec 25") == parse_date("Dec 25")
+    assert _fast_parse("Feb 30, 2026") is None and parse_datetime("Feb 30, 2026") is None
+    assert parse_datetime("TBD") is None
+
+def test_hotel_nights_and_iso_output():
+    data = extract_booking_data("Hotel: Inn\nCheck-in: Jan 15, 2026\nCheck-out: 2026-01-18\n", "hotel")
+    assert data["check_in_date"] == "2026-01-15T00:00:00"
+    assert data["check_out_date"] == "2026-01-18T00:00:00"
+    assert data["nights"] == 3
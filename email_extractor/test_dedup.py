@@ -0,0 +1,62 @@
+# test_dedup.py
+from extractors.dedup import dedup_bookings
+from formats.schemas import BookingAdapter
+
+def _flight(email_id, received_at, **fields):
+    return BookingAdapter.validate_python({"type": "flight", "id": email_id, "source_email_id": email_id,
+                                           "received_at": received_at, **fields})
+
+def test_same_reservation_merges_freshest_field_wins():
+    confirmation = _flight("m1", 1000, booking_reference="ABC123", airline="Delta", price_usd=300,
+                           departure_date="2025-12-25T00:00:00")
+    reminder = _flight("m3", 2000, booking_reference="ABC123", warning="MISSING_DATE")  # no date: joins its group
+    update = _flight("m2", 3000, booking_reference="abc123", price_usd=350, departure_date="December 25, 2025 9:00 AM")
+
+    merged = dedup_bookings([update, reminder, confirmation])
+    assert len(merged) == 1
+    booking = merged[0]
+    assert booking.id == "m1" and booking.source_email_id == "m2"
+    assert booking.source_email_ids == ["m1", "m3", "m2"]
+    assert booking.price_usd == 350 and booking.airline == "Delta"
+    assert booking.warning is None
+
+def test_other_day_is_another_booking():
+    bookings = [_flight("m1", 1, booking_reference="ABC123", departure_date="2025-12-25"),
+                _flight("m2", 2, booking_reference="ABC123", departure_date="2025-12-26"),
+                _flight("m3", 3, booking_reference="ABC123")]  # can't tell which of the two
+    assert [b.id for b in dedup_bookings(bookings)] == ["m1", "m2", "m3"]
+
+def test_bookings_without_reference_are_kept():
+    bookings = [_flight("m1", 1, airline="Delta"), _flight("m2", 2, airline="Delta")]
+    assert [b.id for b in dedup_bookings(bookings)] == ["m1", "m2"]
+
+def test_sparse_reminder_does_not_overwrite_the_confirmation():
+    import main
+    confirmation = {"id": "m1", "from": "reservations@marriott.com", "subject": "Your reservation confirmation",
+                    "received_at": 1000, "body": "Thank you for your reservation.\nHotel: Marriott Downtown\n"
+                    "Check-in: January 15, 2026\nCheck-out: January 18, 2026\nAddress: 350 W Mart Center Dr, Chicago\n"
+                    "Confirmation Code: MC7821\nTotal: $687.50 USD\n"}
+    reminder = {"id": "m2", "from": "reservations@marriott.com", "subject": "Your stay is coming up",
+                "received_at": 2000, "body": "Reminder for your reservation.\nCheck-in: January 15, 2026\n"
+                "3 nights\nConfirmation Code: MC7821\n"}
+
+    [booking] = main._process_and_validate([confirmation, reminder])
+    assert booking.source_email_ids == ["m1", "m2"]
+    assert booking.hotel_name == "Marriott Downtown"  # not the reminder's "Unknown Hotel" stand-in
+    assert booking.title == "Your reservation confirmation"
+    assert booking.address == "350 W Mart Center Dr, Chicago" and booking.warning is None
+
+def test_predicted_guess_is_dropped_once_an_email_states_the_field():
+    confirmation = _flight("m1", 1000, booking_reference="ABC123", departure_airport="JFK",
+                           departure_date="2025-12-25")
+    reminder = _flight("m2", 2000, booking_reference="ABC123", departure_city_predicted="Boston",
+                       departure_date="2025-12-25")
+    [booking] = dedup_bookings([confirmation, reminder])
+    assert booking.departure_airport == "JFK" and booking.departure_city_predicted is None
+
+def test_placeholder_is_kept_when_no_email_has_the_real_value():
+    hotels = [BookingAdapter.validate_python({"type": "hotel", "id": f"m{i}", "received_at": i, "booking_reference": "X1",
+                                              "hotel_name": "Unknown Hotel", "warning": "MISSING_NAME"})
+              for i in range(2)]
+    [booking] = dedup_bookings(hotels)
+    assert booking.hotel_name == "Unknown Hotel" and booking.warning == "MISSING_NAME"
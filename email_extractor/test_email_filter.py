@@ -0,0 +1,57 @@
+# test_email_filter.py
+import pytest
+from benchmarks.bench_filter import legacy_should_process_email
+from benchmarks.corpus import generate_corpus
+from filters.email_filter import should_fetch_email, should_process_email
+from services.fake_gmail_service import FakeGmailService
+from services.gmail_service import fetch_messages
+
+# (sender, subject, body): cases where a faster scan could drift from the per-pattern re.search loop
+EDGE_CASES = [
+    ("noreply@united.com", "Your flight confirmation", "Depart: JFK\nArrive: LAX"),
+    ("NoReply@UNITED.com", "FLIGHT CONFIRMATION", "DEPARTURE 9:00"),                  # case-insensitive
+    ("reservations@marriott.com", "Hotel reservation", "Check-in: Jan 15\nCheck out: Jan 18"),
+    ("reservations@marriott.com", "Hotel", "checkXin tomorrow, reservation ready"),    # check.in matches any char
+    ("reservations@marriott.com", "Hotel", "rebooking of your room, nights: 2"),      # no \b inside "rebooking"
+    ("reservations@marriott.com", "Hotel", "re-booking of your room, 2 nights"),
+    ("tickets@ticketmaster.com", "Your tickets", "Event: concert at the venue"),
+    ("tickets@ticketmaster.com", "Your tickets", "Ticketed for the showcase"),         # prefixes only
+    ("noreply@united.com", "Your trip", "Flight confirmation\n" + "Seat 12A\n" * 500 + "unsubscribe"),
+    ("noreply@united.com", "Your trip", "Flight confirmation\nClick here to opt-out"),
+    ("noreply@united.com", "Your trip", "Flight confirmation\nclick here, then opt out"),
+    ("noreply@united.com", "Your trip", "Flight confirmation\nadvertisement"),
+    ("noreply@united.com", "Your trip", "Flight confirmation\nsales office"),           # "sale" needs \b on both sides
+    ("noreply@united.com", "[PROMO] Flight deals", "Flight confirmation"),
+    ("noreply@united.com", "Flight confirmation", "[PROMO] not at the start of the text"),
+    ("noreply@united.com", "Flight confirmation", "offer_code applies"),                # _ is a word character
+    ("noreply@airbnb.com", "Reservation confirmed", "Check-in Friday, 3 nights"),
+    ("host@airbnb.com", "Reservation confirmed", "Check-in Friday, 3 nights"),         # only noreply@ is trusted
+    ("KantemirMuratov@gmail.com", "Flight booking", "departure at noon"),
+    ("kantemirmuratov@gmail.com", "Flight booking", "departure at noon"),
+    ("United <noreply@united.com>", "Flight booking", "departure at noon"),             # display name is not stripped
+    ("noreply@united.com.evil.com", "Flight booking", "departure at noon"),
+    ("noreply@united.com", "", ""),
+    ("noreply@united.com", "Réservation: confirmation", "Départ: vol (flight) CDG → JFK, Ünïcödé"),
+    ("someone@example.com", "Flight confirmation", "departure JFK"),
+    ("noreply@united.com", "Flight confirmation", "departure İunsubscribe"),            # lower() adds a character
+    ("noreply@united.com", "Flight confirmation", "İ departure, unsubscribe"),
+    ("noreply@united.com", "FLİGHT BOOKİNG", "DEPARTURE İSTANBUL"),
+]
+
+@pytest.mark.parametrize("sender, subject, body", EDGE_CASES)
+def test_classifier_agrees_with_the_legacy_filter_on_edge_cases(sender, subject, body):
+    assert should_process_email(sender, subject, body) == legacy_should_process_email(sender, subject, body)
+
+def test_classifier_agrees_with_the_legacy_filter_on_the_corpus():
+    messages, _ = generate_corpus(600, seed=7, variants=20)
+    emails = fetch_messages(FakeGmailService(messages), [m['id'] for m in messages], fetch_mode="sequential")
+    assert len(emails) == len(messages)
+    for email in emails:
+        expected = legacy_should_process_email(email['from'], email['subject'], email['body'])
+        assert should_process_email(email['from'], email['subject'], email['body']) == expected, email['id']
+
+@pytest.mark.parametrize("sender, subject, body", EDGE_CASES)
+def test_header_prefilter_never_rejects_what_the_full_filter_accepts(sender, subject, body):
+    worth_fetching, reason = should_fetch_email(sender, subject)
+    if not worth_fetching:
+        assert should_process_email(sender, subject, body) == (False, reason)
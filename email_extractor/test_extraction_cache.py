@@ -0,0 +1,66 @@
+# test_extraction_cache.py
+import sqlite3
+from services.extraction_cache import ExtractionCache, VERDICT_BOOKING, VERDICT_REJECTED
+
+FLIGHT = {"type": "flight", "id": "m1", "departure_airport": "JFK", "arrival_airport": "LAX"}
+
+def test_results_survive_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ExtractionCache(path).put_many("a", [
+        ("m1", "body 1", VERDICT_BOOKING, FLIGHT),
+        ("m2", "body 2", VERDICT_REJECTED, "Detected as promotional/spam"),
+    ])
+
+    cache = ExtractionCache(path)
+    hits = cache.get_many("a", ["m1", "m2", "m3"])
+    assert hits["m1"].verdict == VERDICT_BOOKING and hits["m1"].payload == FLIGHT
+    assert hits["m2"].verdict == VERDICT_REJECTED
+    assert "m3" not in hits
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+def test_rows_are_scoped_to_their_account(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite3"))
+    cache.put_many("a", [("m1", "body 1", VERDICT_BOOKING, FLIGHT)])
+    cache.put_many("b", [("m1", "other body", VERDICT_REJECTED, "x")])
+    assert cache.get_many("a", ["m1"])["m1"].payload == FLIGHT
+    assert cache.get_many("b", ["m1"])["m1"].verdict == VERDICT_REJECTED
+    assert cache.get_many("c", ["m1"]) == {}
+
+def test_new_extractor_version_or_changed_body_is_a_miss(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ExtractionCache(path, version="1").put_many("a", [("m1", "body 1", VERDICT_BOOKING, FLIGHT)])
+
+    assert ExtractionCache(path, version="2").get_many("a", ["m1"]) == {}
+    cache = ExtractionCache(path, version="1")
+    assert cache.get_many("a", ["m1"], body_hashes={"m1": "not-the-same"}) == {}
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite3"), max_entries=2, evict_every=1)
+    cache.put_many("a", [("m1", "a", VERDICT_REJECTED, "x"), ("m2", "b", VERDICT_REJECTED, "x")])
+    cache.get_many("a", ["m1"])  # m2 is now the least recently used
+    cache.put_many("a", [("m3", "c", VERDICT_REJECTED, "x")])
+
+    assert set(cache.get_many("a", ["m1", "m2", "m3"])) == {"m1", "m3"}
+    assert cache.stats()["evictions"] == 1
+
+def test_eviction_runs_every_n_writes_only(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ExtractionCache(path, version="old").put_many("a", [("m0", "a", VERDICT_REJECTED, "x")])
+    cache = ExtractionCache(path, version="new", evict_every=3)
+    cache.put_many("a", [("m1", "a", VERDICT_REJECTED, "x"), ("m2", "b", VERDICT_REJECTED, "x")])
+    assert cache.stats()["entries"] == 3 and cache.stats()["evictions"] == 0
+    cache.put_many("a", [("m3", "c", VERDICT_REJECTED, "x")])
+    assert cache.stats()["entries"] == 3 and cache.stats()["evictions"] == 1  # the old-version row
+
+def test_cache_keyed_by_message_id_alone_is_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE extraction_cache (message_id TEXT PRIMARY KEY, body_hash TEXT, "
+                 "extractor_version TEXT, verdict TEXT, payload TEXT, created_at REAL, last_access REAL)")
+    conn.execute("INSERT INTO extraction_cache VALUES ('m1', NULL, 'v', 'rejected', '\"x\"', 0, 0)")
+    conn.commit()
+    conn.close()
+    cache = ExtractionCache(path, version="v")
+    assert cache.stats()["entries"] == 0
+    cache.put_many("a", [("m1", "a", VERDICT_REJECTED, "x")])
+    assert set(cache.get_many("a", ["m1"])) == {"m1"}
@@ -0,0 +1,68 @@
+# test_extraction_jobs.py
+import asyncio
+import time
+from services import worker_pools
+from services.extraction_jobs import DONE, FAILED, QUEUED, RUNNING, ExtractionJobQueue
+
+def _double(chunk):
+    if "boom" in chunk:
+        raise ValueError("boom")
+    return [n * 2 for n in chunk]
+
+def test_job_is_chunked_polled_and_finished(monkeypatch):
+    monkeypatch.setattr(worker_pools, "CPU_POOL_SIZE", 0)
+
+    async def scenario():
+        queue = ExtractionJobQueue(_double, lambda items, results: sum(results), chunk_size=3, max_jobs=1)
+        job = queue.submit(list(range(10)))
+        assert queue.get(job.id) is job and job.status()["emails"] == 10
+        try:
+            queue.submit([1])
+            assert False, "max_jobs not enforced"
+        except worker_pools.OverloadedError:
+            pass
+        await queue.wait(job, timeout=5)
+        assert (job.state, job.processed, job.result) == (DONE, 10, 90)
+
+        failed = await queue.wait(queue.submit([1, "boom"]), timeout=5)
+        assert failed.state == FAILED and failed.error == "boom"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        worker_pools.shutdown_pools()
+
+def test_chunks_in_flight_are_bounded_and_a_failure_cancels_the_rest(monkeypatch):
+    monkeypatch.setattr(worker_pools, "CPU_POOL_SIZE", 0)
+    started = []
+
+    def _slow(chunk):
+        started.append(chunk[0])
+        time.sleep(0.02)
+        if chunk[0] == "boom":
+            raise ValueError("boom")
+        return chunk
+
+    async def scenario():
+        queue = ExtractionJobQueue(_slow, lambda items, results: results, chunk_size=1,
+                                   max_inflight_chunks=1, max_emails=8)
+        first = queue.submit(["boom"] + list(range(4)))
+        second = queue.submit([10, 11])
+        await asyncio.sleep(0.01)
+        assert (first.state, second.state) == (RUNNING, QUEUED)  # second waits for a slot
+        try:
+            queue.submit(list(range(3)))
+            assert False, "max_emails not enforced"
+        except worker_pools.OverloadedError:
+            pass
+
+        await queue.wait(first, timeout=5)
+        await queue.wait(second, timeout=5)
+        assert first.state == FAILED and first.processed == 0
+        assert second.state == DONE and second.result == [10, 11]
+        assert started == ["boom", 10, 11]  # the failed job's other chunks never ran
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        worker_pools.shutdown_pools()
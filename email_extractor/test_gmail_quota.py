@@ -0,0 +1,60 @@
+# test_gmail_quota.py
+import threading
+import time
+from services.gmail_service import fetch_messages, list_message_ids
+from services.gmail_quota import QuotaLimiter, MeteredGmailService
+from services.fake_gmail_service import FakeGmailService, make_message
+
+def _inbox(n):
+    return [make_message(f"m{i}", "noreply@united.com", f"Flight {i}", "Booking reference: ABC123\n") for i in range(n)]
+
+def test_limiter_holds_the_rate():
+    limiter = QuotaLimiter(rate=100, per_user_rate=100)
+    start = time.perf_counter()
+    for _ in range(30):
+        limiter.acquire("a", 10)  # 300 units: one second of burst, then ~2s at 100/s
+    assert time.perf_counter() - start > 1.5
+    assert limiter.stats()["units_granted"] == 300
+
+def test_heavy_user_does_not_starve_a_light_one():
+    limiter = QuotaLimiter(rate=200, per_user_rate=1000)
+    limiter.acquire("heavy", 200)  # drain the shared bucket
+    order = []
+
+    def _spend(user, times):
+        for _ in range(times):
+            limiter.acquire(user, 20)
+            order.append(user)
+
+    heavy = threading.Thread(target=_spend, args=("heavy", 20))
+    heavy.start()
+    time.sleep(0.05)
+    light = threading.Thread(target=_spend, args=("light", 1))
+    light.start()
+    heavy.join()
+    light.join()
+    assert order.index("light") < 5
+
+def test_rate_limited_requests_are_retried_in_every_fetch_mode():
+    ids = [f"m{i}" for i in range(10)]
+    for mode in ("sequential", "batch", "threads"):
+        service = FakeGmailService(_inbox(10), throttled_calls=3)
+        metered = MeteredGmailService(service, QuotaLimiter(rate=10000, per_user_rate=10000), "u", backoff_base=0.001)
+        assert list_message_ids(metered, max_results=10) == ids
+        emails = fetch_messages(metered, ids, fetch_mode=mode, concurrency=4)
+        assert [e['id'] for e in emails] == ids
+        assert metered.retries == 3 and service.throttled_calls == 0
+
+def test_gives_up_after_max_retries():
+    service = FakeGmailService(_inbox(2), throttled_calls=100)
+    metered = MeteredGmailService(service, QuotaLimiter(), "u", max_retries=2, backoff_base=0.001)
+    assert fetch_messages(metered, ["m0", "m1"], fetch_mode="batch") == []
+    assert metered.retries == 4  # both messages, retried twice each
+
+def test_without_limiter_throttled_batch_requests_are_still_retried():
+    ids = [f"m{i}" for i in range(10)]
+    service = FakeGmailService(_inbox(10), throttled_calls=4)
+    metered = MeteredGmailService(service, None, "u", backoff_base=0.001)
+    emails = fetch_messages(metered, ids, fetch_mode="batch")
+    assert [e['id'] for e in emails] == ids
+    assert metered.retries == 4
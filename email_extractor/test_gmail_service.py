@@ -0,0 +1,122 @@
+# test_gmail_service.py
+import base64
+import time
+from services.gmail_service import fetch_messages, get_email_body, get_profile, sync_message_ids
+from services.fake_gmail_service import FakeGmailService, make_message
+
+def _inbox(n):
+    return [
+        make_message(f"m{i}", f"United <noreply{i}@united.com>", f"Flight {i}", f"Booking reference: ABC{i:03d}\n")
+        for i in range(n)
+    ]
+
+def test_fetch_modes_return_same_emails_in_order():
+    ids = [f"m{i}" for i in range(25)]
+    results = {}
+    for mode in ("sequential", "batch", "threads"):
+        service = FakeGmailService(_inbox(25))
+        results[mode] = fetch_messages(service, ids, fetch_mode=mode, concurrency=4)
+
+    assert [e['id'] for e in results["sequential"]] == ids
+    assert results["batch"] == results["sequential"]
+    assert results["threads"] == results["sequential"]
+    assert results["batch"][0]['from'] == "noreply0@united.com"
+
+def test_one_failed_message_does_not_abort_the_rest():
+    ids = [f"m{i}" for i in range(10)]
+    for mode in ("sequential", "batch", "threads"):
+        service = FakeGmailService(_inbox(10), fail_ids={"m3"})
+        emails = fetch_messages(service, ids, fetch_mode=mode)
+        assert [e['id'] for e in emails] == [i for i in ids if i != "m3"]
+
+def test_batch_and_threads_cut_wall_clock_time():
+    ids = [f"m{i}" for i in range(40)]
+
+    service = FakeGmailService(_inbox(40), latency=0.01)
+    start = time.perf_counter()
+    fetch_messages(service, ids, fetch_mode="sequential")
+    sequential = time.perf_counter() - start
+
+    service = FakeGmailService(_inbox(40), latency=0.01)
+    start = time.perf_counter()
+    fetch_messages(service, ids, fetch_mode="batch")
+    batch = time.perf_counter() - start
+    assert service.round_trips == 1
+
+    service = FakeGmailService(_inbox(40), latency=0.01)
+    start = time.perf_counter()
+    fetch_messages(service, ids, fetch_mode="threads", concurrency=8)
+    threads = time.perf_counter() - start
+
+    assert batch < sequential / 4
+    assert threads < sequential / 2
+
+def test_sync_only_returns_messages_added_since_last_history_id():
+    service = FakeGmailService(_inbox(5))
+    msg_ids, history_id, mode = sync_message_ids(service, None, get_profile(service)['historyId'], max_results=10)
+    assert mode == "full" and len(msg_ids) == 5
+
+    service.add_message(make_message("new1", "a@united.com", "Flight", "body"))
+    service.add_message(make_message("new2", "a@united.com", "Flight", "body"))
+    msg_ids, history_id, mode = sync_message_ids(service, history_id, get_profile(service)['historyId'])
+    assert mode == "incremental" and msg_ids == ["new2", "new1"]
+
+    msg_ids, _, mode = sync_message_ids(service, history_id, get_profile(service)['historyId'])
+    assert mode == "incremental" and msg_ids == []
+
+def test_sync_falls_back_to_full_scan_when_history_expired():
+    service = FakeGmailService(_inbox(3))
+    _, history_id, _ = sync_message_ids(service, None, get_profile(service)['historyId'])
+    service.add_message(make_message("new1", "a@united.com", "Flight", "body"))
+    service.expire_history()
+
+    msg_ids, new_history_id, mode = sync_message_ids(service, history_id, get_profile(service)['historyId'])
+    assert mode == "full" and msg_ids[0] == "new1" and len(msg_ids) == 4
+    assert int(new_history_id) > int(history_id)
+
+def _part(mime_type, text, charset=None, filename=''):
+    headers = [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}] if charset else []
+    data = base64.urlsafe_b64encode(text.encode(charset or 'utf-8')).decode('ascii')
+    return {'mimeType': mime_type, 'filename': filename, 'headers': headers, 'body': {'size': len(text), 'data': data}}
+
+def test_body_is_the_plain_part_at_any_depth_in_its_charset():
+    # mixed -> [related -> [alternative -> [html, plain], image], .txt attachment]
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        {'mimeType': 'multipart/related', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                _part('text/html', '<p>Vol confirmé</p>'),
+                _part('text/plain', 'Réservation confirmée', charset='iso-8859-1'),
+            ]},
+            {'mimeType': 'image/png', 'filename': 'logo.png', 'body': {'attachmentId': 'img'}},
+        ]},
+        _part('text/plain', 'terms and conditions', filename='terms.txt'),
+    ]}
+    assert get_email_body(payload) == 'Réservation confirmée'
+
+    payload['parts'][0]['parts'][0]['parts'].pop()  # no plain part left: the HTML one, as text
+    assert get_email_body(payload).strip() == 'Vol confirmé'
+
+def test_large_body_is_fetched_by_attachment_id():
+    service = FakeGmailService([make_message("big", "a@united.com", "Flight", "Booking reference: ABC123\n",
+                                             as_attachment=True)])
+    assert 'data' not in service.users().messages().get(id="big").execute()['payload']['parts'][0]['body']
+    email, = fetch_messages(service, ["big"], fetch_mode="sequential")
+    assert email['body'] == "Booking reference: ABC123\n"
+    assert service.round_trips == 1 + 2  # the get above, then the message and its body
+
+def test_one_unparseable_message_does_not_abort_the_rest():
+    inbox = _inbox(3)
+    inbox[1]['payload']['parts'][0]['body']['data'] = "not base64!"
+    failed = []
+    emails = fetch_messages(FakeGmailService(inbox), ["m0", "m1", "m2"], fetch_mode="batch", failed=failed)
+    assert [e['id'] for e in emails] == ["m0", "m2"]
+    assert failed == ["m1"]
+
+def test_body_cut_at_max_body_bytes_only_drops_the_partial_last_character(monkeypatch):
+    monkeypatch.setattr("services.gmail_service.MAX_BODY_BYTES", 8)
+    service = FakeGmailService([make_message("m0", "noreply@united.com", "Flight", "")])
+    message = service.messages["m0"]
+    raw = b"a\xffb" + "cé€".encode("utf-8")  # an invalid byte early, then the cut lands inside the euro sign
+    message['payload']['parts'][0]['body']['data'] = base64.urlsafe_b64encode(raw).decode("ascii")
+    [email] = fetch_messages(service, ["m0"], fetch_mode="sequential")
+    assert email['body'] == "a�bcé"
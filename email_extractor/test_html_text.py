@@ -0,0 +1,20 @@
+# test_html_text.py
+import pytest
+from benchmarks.html_fixtures import FIXTURES
+from services.html_text import available_backends, html_to_text
+
+EMPTY_PARTS = ["", "   \n", "<!-- tracking pixel -->", "<html><head><style>p {}</style></head></html>"]
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_agree_on_fixtures_and_empty_parts(backend):
+    for kind, make in FIXTURES.items():
+        html = make()
+        assert html_to_text(html, backend) == html_to_text(html, "bs4"), kind
+    for html in EMPTY_PARTS:
+        assert html_to_text(html, backend) == ""
+
+def test_hidden_and_script_content_is_dropped():
+    html = ('<p>Depart: JFK</p><div style="display: none">Preheader</div>'
+            '<script>var x = 1;</script><span hidden>Tracking</span><td>Arrive: LAX</td>')
+    for backend in available_backends():
+        assert html_to_text(html, backend) == "Depart: JFK\nArrive: LAX", backend
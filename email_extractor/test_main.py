@@ -0,0 +1,153 @@
+# test_main.py
+import json
+import pytest
+from fastapi.testclient import TestClient
+from google.auth.exceptions import RefreshError
+
+import main
+from extractors import booking_extractor
+from services import gmail_clients, gmail_service, worker_pools
+from services.fake_gmail_service import FakeGmailService, FakeHttpError, make_message
+from services.sync_state import SyncStateStore
+
+def _flight(msg_id, ref):
+    return make_message(msg_id, "United <noreply@united.com>", "Your flight confirmation",
+                        f"Thank you for booking with United.\nBooking reference: {ref}\nFlight UA 100\n"
+                        f"Depart: SFO\nArrive: JFK\nDate: Dec 12, 2025\nTotal: $350.00\n")
+
+def _inbox():
+    messages = [_flight(f"f{i}", f"REF{i:03d}") for i in range(3)]
+    messages.append(make_message("s0", "Friend <friend@example.com>", "Flight plans", "Still on for Thursday?"))
+    return messages
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """The app with the fake Gmail service, extraction on the I/O thread pool and no on-disk state."""
+    service = FakeGmailService(_inbox())
+    monkeypatch.setattr(worker_pools, "CPU_POOL_SIZE", 0)
+    monkeypatch.setattr(main, "NLP_MODE", "lazy")  # what the lifespan reads: no background warm-up
+    monkeypatch.setattr(booking_extractor, "NLP_MODE", "lazy")  # what get_nlp_status reports
+    monkeypatch.setattr(booking_extractor, "_nlp_model", None)
+    monkeypatch.setattr(booking_extractor, "_nlp_state", "not_loaded")
+    monkeypatch.setattr(booking_extractor, "_nlp_error", None)
+    monkeypatch.setattr(main, "build_gmail_service", lambda credentials: (service, None))
+    monkeypatch.setattr(main, "get_extraction_cache", lambda: None)
+    store = SyncStateStore(str(tmp_path / "sync.sqlite3"))
+    monkeypatch.setattr(main, "get_sync_state_store", lambda: store)
+    with TestClient(main.app) as client:
+        client.service = service
+        yield client
+    assert worker_pools._io_pool is None  # the lifespan shut the pools down
+
+def test_health_answers_before_anything_is_warm(client):
+    body = client.get("/health").json()
+    assert body["status"] == "ok" and body["pending_scans"] == 0
+    assert body["nlp"] == {"mode": "lazy", "state": "not_loaded", "error": None}
+
+def test_ready_waits_for_the_model_and_the_cpu_pool(client, monkeypatch):
+    monkeypatch.setattr(main, "get_nlp_status", lambda: {"mode": "eager", "state": "loading", "error": None})
+    assert client.get("/ready").status_code == 503
+
+    monkeypatch.setattr(main, "get_nlp_status", lambda: {"mode": "eager", "state": "ready", "error": None})
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["cpu_pool_started"] is False
+
+    worker_pools.start_cpu_pool()
+    response = client.get("/ready")
+    assert response.status_code == 200 and response.json()["ready"] is True
+
+    monkeypatch.setattr(main, "get_nlp_status", lambda: {"mode": "lazy", "state": "not_loaded", "error": None})
+    worker_pools.shutdown_pools()
+    assert client.get("/ready").status_code == 200
+
+def test_scan_runs_extraction_on_the_io_pool_when_cpu_pool_size_is_0(client):
+    response = client.post("/scan", json={"credentials_dict": {}, "max_results": 10})
+    assert response.status_code == 200
+    assert sorted(b["booking_reference"] for b in response.json()) == ["REF000", "REF001", "REF002"]
+    stats = json.loads(response.headers["X-Fetch-Stats"])
+    assert stats["listed"] == 4 and stats["full_messages"] == 3 and stats["skipped_untrusted_sender"] == 1
+    assert worker_pools.get_cpu_pool() is worker_pools._io_pool
+    assert worker_pools._cpu_pool is None
+
+def test_scan_is_rejected_when_max_pending_scans_are_in_flight(client, monkeypatch):
+    monkeypatch.setattr(worker_pools, "MAX_PENDING_SCANS", 0)
+    response = client.post("/scan", json={"credentials_dict": {}})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+def test_io_pool_size_setting_sizes_the_thread_pool(client, monkeypatch):
+    worker_pools.shutdown_pools()
+    monkeypatch.setattr(worker_pools, "IO_POOL_SIZE", 3)
+    assert worker_pools.get_io_pool()._max_workers == 3
+
+def _events(response):
+    return [json.loads(line) for line in response.iter_lines() if line]
+
+def test_scan_stream_pages_and_resumes_from_a_cursor(client):
+    response = client.post("/scan/stream", json={"credentials_dict": {}, "page_size": 2})
+    assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+    events = _events(response)
+    assert [e["event"] for e in events] == ["booking", "booking", "page", "booking", "page", "done"]
+    assert [e["scanned"] for e in events if e["event"] == "page"] == [2, 4]
+    assert events[-1]["bookings"] == 3 and events[-1]["fetch_stats"]["listed"] == 4
+
+    cursor = events[2]["cursor"]
+    resumed = _events(client.post("/scan/stream", json={"credentials_dict": {}, "page_size": 2, "cursor": cursor}))
+    assert [e["booking"]["booking_reference"] for e in resumed if e["event"] == "booking"] == ["REF002"]
+    assert (resumed[-1]["event"], resumed[-1]["scanned"], resumed[-1]["bookings"]) == ("done", 2, 1)
+
+def test_scan_stream_reports_errors_as_an_event(client, monkeypatch):
+    def _broken(credentials):
+        raise RuntimeError("token expired")
+    monkeypatch.setattr(main, "build_gmail_service", _broken)
+    events = _events(client.post("/scan/stream", json={"credentials_dict": {}}))
+    assert events == [{"event": "error", "detail": "token expired"}]
+
+def _pooled_clients(client, monkeypatch, max_size=1):
+    """Route the app through the real client pool, with the client build stubbed to the fake service."""
+    built = []
+    def _build(*args, **kwargs):
+        built.append(kwargs["http"])
+        return client.service
+    pool = gmail_clients.GmailClientPool(max_size=max_size)
+    monkeypatch.setattr(gmail_clients, "_pool", pool)
+    monkeypatch.setattr(gmail_clients, "build", _build)
+    monkeypatch.setattr(gmail_clients.Credentials, "from_authorized_user_info", staticmethod(lambda info: info))
+    monkeypatch.setattr(main, "build_gmail_service", gmail_service.build_gmail_service)
+    return pool, built
+
+def test_repeat_scans_reuse_the_pooled_gmail_client(client, monkeypatch):
+    pool, built = _pooled_clients(client, monkeypatch)
+
+    alice = {"client_id": "app", "refresh_token": "alice"}
+    for credentials in (alice, alice, {"client_id": "app", "refresh_token": "bob"}, alice):
+        assert client.post("/scan", json={"credentials_dict": credentials}).status_code == 200
+    assert pool.stats() == {"size": 1, "hits": 1, "misses": 3}  # GMAIL_CLIENT_POOL_SIZE=1 evicted alice for bob
+    assert built[0].credentials == alice
+
+@pytest.mark.parametrize("path, error", [
+    ("/scan", FakeHttpError(401, "invalid credentials")),
+    ("/search", RefreshError("invalid_grant: Token has been expired or revoked.")),
+    ("/sync", FakeHttpError(401, "invalid credentials")),
+])
+def test_revoked_credentials_drop_the_pooled_client(client, monkeypatch, path, error):
+    pool, _ = _pooled_clients(client, monkeypatch)
+    alice = {"client_id": "app", "refresh_token": "alice"}
+    request = {"credentials_dict": alice, "query": "from:united.com"}
+    assert client.post("/scan", json=request).status_code == 200
+    assert pool.stats()["size"] == 1
+
+    def _fail():
+        raise error
+    monkeypatch.setattr(client.service, "_throttle", _fail)
+    assert client.post(path, json=request).status_code == 500
+    assert pool.stats()["size"] == 0
+
+def test_other_errors_keep_the_pooled_client(client, monkeypatch):
+    pool, _ = _pooled_clients(client, monkeypatch)
+    alice = {"client_id": "app", "refresh_token": "alice"}
+    assert client.post("/scan", json={"credentials_dict": alice}).status_code == 200
+    def _fail():
+        raise FakeHttpError(404, "gone")
+    monkeypatch.setattr(client.service, "_throttle", _fail)
+    assert client.post("/scan", json={"credentials_dict": alice}).status_code == 500
+    assert pool.stats()["size"] == 1
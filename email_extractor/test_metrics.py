@@ -0,0 +1,33 @@
+# test_metrics.py
+from services.metrics import Counter, Histogram, Registry
+
+def test_render_prometheus_text():
+    registry = Registry()
+    counter = Counter("emails", "Emails seen", ["email_type"], registry=registry)
+    histogram = Histogram("stage_seconds", "Stage latency", buckets=(0.1, 1.0), registry=registry)
+    counter.labels("flight").inc()
+    counter.labels("flight").inc(2)
+    histogram.observe(0.05)
+    histogram.observe(5)
+
+    text = registry.render()
+    assert '# TYPE emails_total counter' in text
+    assert 'emails_total{email_type="flight"} 3.0' in text
+    assert 'stage_seconds_bucket{le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{le="1.0"} 1' in text
+    assert 'stage_seconds_bucket{le="+Inf"} 2' in text
+    assert 'stage_seconds_count 2' in text
+
+def test_worker_deltas_merge_into_the_parent():
+    parent, worker = Registry(), Registry()
+    for registry in (parent, worker):
+        Counter("emails", "Emails seen", ["email_type"], registry=registry)
+        Histogram("stage_seconds", "Stage latency", buckets=(0.1,), registry=registry)
+    worker._metrics["emails"].labels("hotel").inc(4)
+    worker._metrics["stage_seconds"].observe(0.01)
+
+    parent.merge(worker.drain())
+    parent.merge(worker.drain())  # drained: nothing is counted twice
+
+    assert 'emails_total{email_type="hotel"} 4.0' in parent.render()
+    assert 'stage_seconds_count 1' in parent.render()
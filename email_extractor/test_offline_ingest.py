@@ -0,0 +1,45 @@
+# test_offline_ingest.py
+import mailbox
+import zipfile
+from email.message import EmailMessage
+from services.offline_ingest import ingest_chunk, iter_message_refs, parse_message_bytes
+
+def _message(n, body="Confirmation number: ABC123", charset="utf-8"):
+    message = EmailMessage()
+    message["From"] = "bookings@united.com"
+    message["Subject"] = f"Your trip {n}"
+    message["Message-ID"] = f"<msg-{n}@example.com>"
+    message["Date"] = "Mon, 01 Dec 2025 09:00:00 +0000"
+    message.set_content(body, charset=charset)
+    return message
+
+def test_archives_are_found_and_parsed_like_gmail_messages(tmp_path):
+    box = mailbox.mbox(str(tmp_path / "Inbox.mbox"))
+    for n in range(3):
+        box.add(_message(n, body=f"From here on, trip {n}\nConfirmation number: ABC12{n}"))  # "From " inside a body is escaped
+    box.close()
+    maildir = mailbox.Maildir(str(tmp_path / "Maildir"))
+    maildir.add(_message(3))
+    maildir.close()
+    (tmp_path / "one.eml").write_bytes(_message(4, body="Réservation confirmée", charset="latin-1").as_bytes())
+    with zipfile.ZipFile(tmp_path / "takeout.zip", "w") as archive:
+        archive.writestr("Takeout/Mail/All mail.mbox", (tmp_path / "Inbox.mbox").read_bytes())
+        archive.writestr("Takeout/five.eml", _message(5).as_bytes())
+
+    refs = list(iter_message_refs([str(tmp_path)]))
+    assert len(refs) == 3 + 1 + 1 + 3 + 1
+
+    seen = []
+    result = ingest_chunk(refs, lambda emails: seen.extend(emails) or [(e, None, None) for e in emails])
+    assert (result["messages"], result["unreadable"], result["rejected"]) == (9, 0, 9)
+    assert sorted(e["id"] for e in seen)[:3] == ["msg-0@example.com", "msg-0@example.com", "msg-1@example.com"]
+    first = next(e for e in seen if e["id"] == "msg-0@example.com")
+    assert first["body"].strip() == ">From here on, trip 0\nConfirmation number: ABC120"  # mboxo escaping is kept
+    assert first["received_at"] == 1764579600000
+    latin = next(e for e in seen if e["id"] == "msg-4@example.com")
+    assert "Réservation confirmée" in latin["body"]
+
+def test_message_without_message_id_gets_a_stable_id():
+    raw = b"From: a@b.com\r\nSubject: Hi\r\n\r\nHello"
+    assert parse_message_bytes(raw, "fallback")["id"] == "fallback"
+    assert parse_message_bytes(raw, "fallback")["subject"] == "Hi"
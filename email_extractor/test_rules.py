@@ -0,0 +1,33 @@
+# test_rules.py
+from extractors.rules import ExtractionRules
+
+CONFIG = {
+    "types": {
+        "*": [{"field": "price_usd", "pattern": r"(?:total|price).{0,30}?\$?(\d{1,5}(?:\.\d{2})?)",
+               "anchors": ["total", "price"], "transform": "float"}],
+        "flight": [
+            {"field": "departure_airport", "labels": ["Depart:"], "value": "([A-Z]{3})", "ignore_case": False},
+            {"field": "airline", "labels": ["Airline:", "Carrier:"], "value": r"(.*?)\n"},
+        ],
+    },
+    "domains": {
+        "delta.com": {"flight": [{"field": "airline", "labels": ["Operated by"], "value": r"(.*?)\n"}]},
+    },
+}
+
+def test_each_field_takes_its_leftmost_match():
+    rules = ExtractionRules(CONFIG)
+    body = "DEPART: xyz\nDepart: JFK\nCarrier:  Delta \nAirline: United\nTotal: $450.00\nTotal: $1.00\n"
+    assert rules.extract(body, "flight") == {"departure_airport": "JFK", "airline": "Delta", "price_usd": 450.0}
+
+def test_domain_rules_win_over_type_rules():
+    rules = ExtractionRules(CONFIG)
+    body = "Airline: Delta\nOperated by KLM\n"
+    assert rules.extract(body, "flight", "noreply@t.delta.com") == {"airline": "KLM"}
+    assert rules.extract(body, "flight", "noreply@united.com") == {"airline": "Delta"}
+    assert rules.extract("Airline: Delta\n", "flight", "noreply@delta.com") == {"airline": "Delta"}
+
+def test_overlapping_matches_are_all_found():
+    # The price match swallows the span holding the departure airport; both must still be found
+    rules = ExtractionRules(CONFIG)
+    assert rules.extract("Price incl. Depart: LAX fee 99\n", "flight") == {"price_usd": 99.0, "departure_airport": "LAX"}
@@ -0,0 +1,16 @@
+# test_schemas.py
+import json
+from formats.schemas import BookingListAdapter, FlightBooking, HotelBooking, UnknownBooking
+
+def test_bulk_validation_routes_on_type():
+    bookings = BookingListAdapter.validate_python([
+        {"type": "hotel", "hotel_name": "Inn", "nights": 3},
+        {"type": "flight", "airline": "Delta", "title": "Your flight"},
+        {"type": "unknown", "id": "m3"},
+    ])
+    assert [type(b) for b in bookings] == [HotelBooking, FlightBooking, UnknownBooking]
+    assert bookings[0].nights == 3  # extra fields are kept
+
+def test_dump_json_matches_model_dump():
+    bookings = BookingListAdapter.validate_python([{"type": "flight", "price_usd": "120.5", "title": "Trip"}])
+    assert json.loads(BookingListAdapter.dump_json(bookings)) == [bookings[0].model_dump()]
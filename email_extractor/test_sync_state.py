@@ -0,0 +1,49 @@
+# test_sync_state.py
+import asyncio
+import main
+from services import worker_pools
+from services.fake_gmail_service import FakeGmailService, make_message
+from services.sync_state import SyncStateStore
+
+def _flight(msg_id, ref):
+    return make_message(msg_id, "United <noreply@united.com>", "Your flight confirmation",
+                        f"Thank you for booking with United.\nBooking reference: {ref}\nFlight UA 100\n"
+                        f"Depart: SFO\nArrive: JFK\nDate: Dec 12, 2025\nTotal: $350.00\n")
+
+def test_message_that_failed_to_download_is_retried_on_next_sync(tmp_path, monkeypatch):
+    service = FakeGmailService([_flight("m0", "AAA111")])
+    store = SyncStateStore(str(tmp_path / "sync.sqlite3"))
+    monkeypatch.setattr(worker_pools, "CPU_POOL_SIZE", 0)
+    monkeypatch.setattr(main, "build_gmail_service", lambda credentials: (service, None))
+    monkeypatch.setattr(main, "get_sync_state_store", lambda: store)
+    monkeypatch.setattr(main, "get_extraction_cache", lambda: None)
+    monkeypatch.setattr("services.gmail_quota.GMAIL_BACKOFF_BASE", 0.001)  # a 500 is retried before it counts as failed
+
+    async def sync():
+        bookings, mode, _ = await main._sync({}, max_results=10)
+        return sorted(b.booking_reference for b in bookings), mode
+
+    try:
+        assert asyncio.run(sync()) == (["AAA111"], "full")
+
+        service.add_message(_flight("m1", "BBB222"))
+        service.fail_ids.add("m1")
+        assert asyncio.run(sync()) == ([], "incremental")
+        assert store.get_retry_ids(service.email_address) == ["m1"]
+
+        service.fail_ids.clear()
+        service.add_message(_flight("m2", "CCC333"))
+        assert asyncio.run(sync()) == (["BBB222", "CCC333"], "incremental")
+        assert store.get_retry_ids(service.email_address) == []
+    finally:
+        worker_pools.shutdown_pools()
+
+def test_retries_are_given_up_after_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.sync_state.SYNC_MAX_RETRIES", 2)
+    store = SyncStateStore(str(tmp_path / "sync.sqlite3"))
+    for history_id in ("1", "2"):
+        store.set_history_id("a@example.com", history_id, ["gone"])
+        assert store.get_retry_ids("a@example.com") == ["gone"]
+    store.set_history_id("a@example.com", "3", ["gone"])
+    assert store.get_retry_ids("a@example.com") == []
+    assert store.get_history_id("a@example.com") == "3"
@@ -0,0 +1,34 @@
+# test_windowing.py
+from benchmarks.bench_windowing import FOOTER, compare, fixture_emails
+from extractors.windowing import BodyWindower, get_windower
+
+def test_extraction_on_windows_matches_whole_bodies():
+    mismatches, chars_in, chars_kept, *_ = compare(fixture_emails(messages=200))
+    assert mismatches == []
+    assert chars_kept < chars_in / 10
+
+def test_drops_quoted_reply_and_footer():
+    booking = "Your flight confirmation\nAirline:   United\nDepart: JFK\nArrive: LAX\n"
+    body = ("Booking below\n" + booking + "\n\n\n" + FOOTER
+            + "On Mon, Dec 1, 2025 Bob <bob@example.com> wrote:\n> Airline: Delta\n")
+    window = get_windower().window(body)
+    assert window.text.startswith("Booking below\nYour flight confirmation\nAirline: United\n")
+    assert "Delta" not in window.text and "Lorem" not in window.text
+    assert window.spans == [(0, len("Booking below\n" + booking + "\n\n\n"))]  # blank context lines
+
+def test_short_or_unlabelled_bodies_are_kept_whole():
+    windower = BodyWindower(["depart:"], {}, min_chars=100)
+    assert windower.window("Depart: JFK\n").text == "Depart: JFK\n"
+    assert windower.window("lorem ipsum\n" * 50).spans == [(0, 600)]
+
+def test_ordinary_prose_between_anchors_is_dropped():
+    prose = "Thank you for choosing us, and we hope you had a nice day with all the family.\n" * 80
+    body = "Your trip\n\n" + prose + "Depart: JFK\n" + prose + "Arrive: LAX\n" + prose
+    window = get_windower().window(body)
+    assert "Depart: JFK" in window.text and "Arrive: LAX" in window.text
+    assert len(window.text) < len(body) / 10
+
+def test_free_form_anchors_aim_the_window_too():
+    prose = "We look forward to welcoming you on board.\n" * 80
+    body = "Your trip\n\nDepart: JFK\nArrive: LAX\n" + prose + "Total: $412.50\n" + prose
+    assert "Total: $412.50" in get_windower().window(body).text
@@ -0,0 +1,26 @@
+# test_worker_pools.py
+import threading
+from services import worker_pools
+
+def test_concurrent_callers_share_one_cpu_pool(monkeypatch):
+    monkeypatch.setattr(worker_pools, "CPU_POOL_SIZE", 1)
+    pools = []
+    barrier = threading.Barrier(8)
+
+    def _get():
+        barrier.wait()
+        pools.append(worker_pools.get_cpu_pool())
+
+    threads = [threading.Thread(target=_get) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(pool) for pool in pools}) == 1
+        assert not worker_pools.cpu_pool_started()
+        worker_pools.start_cpu_pool()
+        assert worker_pools.cpu_pool_started()
+    finally:
+        worker_pools.shutdown_pools()
+    assert not worker_pools.cpu_pool_started()